@@ -0,0 +1,401 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import argparse
+import contextlib
+import hashlib
+import http.server
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_DIR = ".binary_mirror"
+
+ALLOWED_HOSTS = ["github.com"]
+
+CHUNK_SIZE = 1024 * 1024
+
+SHA256_PATTERN = re.compile("^[0-9a-f]{64}$")
+
+
+class BinaryMirror:
+    """
+    Cache of the JDK binaries addressed by their sha256. A binary is downloaded from its upstream url on the first
+    request, checked against the sha256 and then served from the cache. The least recently used binaries are evicted
+    once the cache grows over its maximum size.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=10 * 1024 ** 3, allowed_hosts=None, timeout=300):
+        """
+        :param cache_dir: String - Directory the binaries are stored in
+        :param max_bytes: Integer - Maximum size of the cache in bytes
+        :param allowed_hosts: List - Hosts binaries can be downloaded from, any host if empty
+        :param timeout: Integer - Timeout of an upstream request in seconds
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.allowed_hosts = allowed_hosts or []
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.fill_locks = {}
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "fill_failures": 0,
+            "evictions": 0,
+            "bytes_served": 0,
+            "bytes_fetched": 0,
+            "bytes_evicted": 0
+        }
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_path(self, sha256):
+        """
+        Get the path of a binary in the cache
+        :param sha256: String - sha256sum of the binary
+        :return: String - Path of the binary
+        """
+        return os.path.join(self.cache_dir, sha256[:2], sha256)
+
+    def count(self, metric, value=1):
+        """
+        Add to a metric
+        :param metric: String - Name of the metric
+        :param value: Integer - Value to add
+        :return: None
+        """
+        with self.lock:
+            self.metrics[metric] += value
+
+    @contextlib.contextmanager
+    def fill_lock(self, sha256):
+        """
+        Hold the lock that makes concurrent requests for the same binary wait for a single download. The lock is
+        dropped once no request uses it, so the locks do not grow with the number of binaries served
+        :param sha256: String - sha256sum of the binary
+        :return: None
+        """
+        with self.lock:
+            entry = self.fill_locks.setdefault(sha256, {"lock": threading.Lock(), "users": 0})
+            entry["users"] += 1
+        try:
+            with entry["lock"]:
+                yield
+        finally:
+            with self.lock:
+                entry["users"] -= 1
+                if not entry["users"]:
+                    del self.fill_locks[sha256]
+
+    def fill(self, sha256, url):
+        """
+        Download a binary into the cache, it is only stored if it matches the sha256
+        :param sha256: String - sha256sum of the binary
+        :param url: String - Upstream url of the binary
+        :return: File object of the binary
+        """
+        host = urlparse(url).netloc
+        if self.allowed_hosts and host not in self.allowed_hosts:
+            LOGGER.error("{host} is not an allowed upstream host".format(host=host))
+            raise ValueError("{host} is not an allowed upstream host".format(host=host))
+
+        path = self.get_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".fill.")
+        checksum = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(file_descriptor, "wb") as tmp_file, urllib.request.urlopen(url, timeout=self.timeout) as response:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                    checksum.update(chunk)
+                    tmp_file.write(chunk)
+                    size += len(chunk)
+            self.count("bytes_fetched", size)
+            if checksum.hexdigest() != sha256:
+                LOGGER.error("sha256 of {url} is {actual}, expected {expected}".format(url=url, actual=checksum.hexdigest(), expected=sha256))
+                raise ValueError("sha256 of {url} is {actual}, expected {expected}".format(url=url, actual=checksum.hexdigest(), expected=sha256))
+            os.replace(tmp_path, path)
+            # Opened before the eviction, so the binary stays readable if a concurrent fill evicts it
+            binary = open(path, "rb")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        LOGGER.info("Stored {sha256} ({size} bytes) from {url}".format(sha256=sha256, size=size, url=url))
+        self.evict(keep=sha256)
+        return binary
+
+    def open(self, sha256, url=None):
+        """
+        Open a binary, downloading it first if it is not in the cache
+        :param sha256: String - sha256sum of the binary
+        :param url: String - Upstream url of the binary, only binaries in the cache are served if not set
+        :return: File object of the binary, None if it is not in the cache and has no url
+        """
+        if not SHA256_PATTERN.match(sha256):
+            LOGGER.error("{sha256} is not a sha256sum".format(sha256=sha256))
+            raise ValueError("{sha256} is not a sha256sum".format(sha256=sha256))
+
+        path = self.get_path(sha256)
+        with self.fill_lock(sha256):
+            # A binary that is evicted while it is served stays readable through the open file
+            try:
+                binary = open(path, "rb")
+            except FileNotFoundError:
+                binary = None
+            if binary is not None:
+                self.count("hits")
+                # The modification time orders the binaries for the eviction
+                os.utime(binary.fileno())
+                return binary
+            if url is None:
+                return None
+
+            self.count("misses")
+            try:
+                return self.fill(sha256, url)
+            except (ValueError, urllib.error.URLError, OSError):
+                self.count("fill_failures")
+                raise
+
+    def get_entries(self):
+        """
+        Get the binaries in the cache
+        :return: List of dicts with sha256, size and mtime, least recently used first
+        """
+        entries = []
+        for directory, _, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                if not SHA256_PATTERN.match(file_name):
+                    continue
+                stat = os.stat(os.path.join(directory, file_name))
+                entries.append({"sha256": file_name, "size": stat.st_size, "mtime": stat.st_mtime})
+
+        return sorted(entries, key=lambda entry: entry["mtime"])
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used binaries until the cache fits in its maximum size
+        :param keep: String - sha256sum of a binary that is never evicted, eg. the one just downloaded
+        :return: Integer - Number of evicted binaries
+        """
+        with self.lock:
+            entries = self.get_entries()
+            total = sum(entry["size"] for entry in entries)
+            evicted = 0
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                if entry["sha256"] == keep:
+                    continue
+                os.remove(self.get_path(entry["sha256"]))
+                total -= entry["size"]
+                evicted += 1
+                self.metrics["evictions"] += 1
+                self.metrics["bytes_evicted"] += entry["size"]
+                LOGGER.info("Evicted {sha256} ({size} bytes)".format(sha256=entry["sha256"], size=entry["size"]))
+
+        return evicted
+
+    def get_metrics(self):
+        """
+        Get the hit / miss counters and the size of the cache
+        :return: Dict - Metrics
+        """
+        entries = self.get_entries()
+        with self.lock:
+            metrics = dict(self.metrics)
+        requests = metrics["hits"] + metrics["misses"]
+        metrics["hit_ratio"] = round(metrics["hits"] / requests, 3) if requests else 0.0
+        metrics["entries"] = len(entries)
+        metrics["cache_bytes"] = sum(entry["size"] for entry in entries)
+        metrics["max_bytes"] = self.max_bytes
+        return metrics
+
+
+class MirrorRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves GET /sha256/<sha256>/<upstream url> from the mirror of the server and the metrics on GET /metrics
+    """
+
+    def send_text(self, status_code, text, content_type="text/plain"):
+        """
+        Send a small response
+        :param status_code: Integer - HTTP status code
+        :param text: String - Body of the response
+        :param content_type: String - Content type of the body
+        :return: None
+        """
+        body = text.encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """
+        Handle a GET request
+        :return: None
+        """
+        mirror = self.server.mirror
+        if self.path == "/metrics":
+            self.send_text(200, json.dumps(mirror.get_metrics(), indent=2) + "\n", "application/json")
+            return
+
+        # The upstream url is kept as is, including its own "//"
+        parts = self.path.split("/", 3)
+        if len(parts) < 3 or parts[1] != "sha256":
+            self.send_text(404, "Unknown path {path}\n".format(path=self.path))
+            return
+        sha256 = parts[2]
+        url = parts[3] if len(parts) == 4 and parts[3] else None
+
+        try:
+            binary = mirror.open(sha256, url)
+        except ValueError as error:
+            # An invalid sha256 is a bad request, a disallowed host or a checksum mismatch is an upstream problem
+            self.send_text(400 if not SHA256_PATTERN.match(sha256) else 502, "{error}\n".format(error=error))
+            return
+        except (urllib.error.URLError, OSError) as error:
+            LOGGER.error("ERROR: Failed to fetch {url}: {error}".format(url=url, error=error))
+            self.send_text(502, "Failed to fetch {url}: {error}\n".format(url=url, error=error))
+            return
+        if binary is None:
+            self.send_text(404, "{sha256} is not in the mirror\n".format(sha256=sha256))
+            return
+
+        with binary:
+            size = os.fstat(binary.fileno()).st_size
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            shutil.copyfileobj(binary, self.wfile, CHUNK_SIZE)
+        mirror.count("bytes_served", size)
+
+    def log_message(self, format, *args):
+        """
+        Log the requests through the module logger instead of stderr
+        :return: None
+        """
+        LOGGER.debug(format % args)
+
+
+def serve(mirror, bind, port):
+    """
+    Serve the mirror until interrupted
+    :param mirror: BinaryMirror
+    :param bind: String - Address to listen on
+    :param port: Integer - Port to listen on
+    :return: None
+    """
+    server = http.server.ThreadingHTTPServer((bind, port), MirrorRequestHandler)
+    server.mirror = mirror
+    LOGGER.info("Serving {cache_dir} on http://{bind}:{port}".format(cache_dir=mirror.cache_dir, bind=bind, port=server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_size(size):
+    """
+    Parse a cache size
+    :param size: String - Size in bytes or with a K/M/G/T suffix, eg. 20G
+    :return: Integer - Size in bytes
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    size = size.strip().upper().rstrip("B")
+    try:
+        if size and size[-1] in units:
+            return int(float(size[:-1]) * units[size[-1]])
+        return int(size)
+    except ValueError:
+        raise argparse.ArgumentTypeError("{size} is not a size, eg. 20G".format(size=size))
+
+
+def get_args():
+    """
+    Processes and handles command line arguments
+    :return: Dict of command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Local mirror of the JDK binaries addressed by their sha256, used by the Dockerfiles generated with binary_mirror set")
+    parser.add_argument("--cache-dir",
+                        help="Directory the binaries are stored in",
+                        type=str,
+                        default=CACHE_DIR)
+    parser.add_argument("--max-size",
+                        help="Maximum size of the cache, the least recently used binaries are evicted above it",
+                        type=parse_size,
+                        default="10G")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Serve the binaries and download the missing ones")
+    serve_parser.add_argument("--bind", help="Address to listen on", type=str, default="127.0.0.1")
+    serve_parser.add_argument("--port", help="Port to listen on", type=int, default=8080)
+    serve_parser.add_argument("--allowed-host",
+                              help="Upstream host binaries can be downloaded from, can be repeated. Defaults to github.com",
+                              type=str,
+                              action="append",
+                              dest="allowed_hosts")
+    serve_parser.add_argument("--any-host", help="Download binaries from any upstream host", action="store_true")
+
+    subparsers.add_parser("evict", help="Evict the least recently used binaries down to the maximum size")
+    subparsers.add_parser("status", help="Print the binaries in the cache and its size")
+
+    return vars(parser.parse_args())
+
+
+def run(parsed_args):
+    """
+    Main function that takes in arguments and processes them
+    :param parsed_args: Dict of command line arguments
+    :return: None
+    """
+    command = parsed_args["command"]
+    if command == "serve":
+        allowed_hosts = [] if parsed_args["any_host"] else parsed_args["allowed_hosts"] or ALLOWED_HOSTS
+        serve(BinaryMirror(parsed_args["cache_dir"], parsed_args["max_size"], allowed_hosts), parsed_args["bind"], parsed_args["port"])
+        return
+
+    mirror = BinaryMirror(parsed_args["cache_dir"], parsed_args["max_size"])
+    if command == "evict":
+        print("Evicted {evicted} binaries".format(evicted=mirror.evict()))
+    elif command == "status":
+        metrics = mirror.get_metrics()
+        print(json.dumps({"entries": mirror.get_entries(), "cache_bytes": metrics["cache_bytes"], "max_bytes": metrics["max_bytes"]}, indent=2))
+
+
+if __name__ == "__main__":
+    # Parse the arguments passed in
+    args = get_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
+
+    LOGGER.debug("Parsed arguments: " + str(args))
+    run(parsed_args=args)
@@ -52,6 +52,16 @@ fi
 # Create summary table file
 create_summary_table_file
 
+# Trace where the time goes, summarized with pipeline_trace.py at the end
+export trace_file="${trace_file:-${root_dir}/pipeline_trace.json}"
+trace_init
+
+# The push commands of every iteration, the pushed images are verified once at the end
+pushed_commands_file="${root_dir}/pushed_commands.sh"
+rm -f "${pushed_commands_file}"
+# Set when a push failed or the pushed images are not live, the script then exits with 1
+push_err=0
+
 for ver in ${supported_versions}
 do
 	for vm in ${all_jvms}
@@ -63,16 +73,19 @@ do
 			cleanup_manifest
 
 			# Remove any temporary files
-			rm -f hotspot_*_latest.sh openj9_*_latest.sh push_commands.sh
+			rm -f hotspot_*_latest.sh openj9_*_latest.sh build_metadata.json tag_matrix.json tag_matrix.sh push_commands.sh
 
+			trace_begin build_all version="${ver}" vm="${vm}" package="${package}"
 			echo "=========================================================================================="
 			echo "                                                                                          "
 			echo "  $(date +%T) :    Building Docker Images for Version ${ver} ${vm} ${package} ${runtype}  "
 			echo "                                                                                          "
 			echo "=========================================================================================="
+			trace_begin build version="${ver}" vm="${vm}" package="${package}"
 			./build_latest.sh "${ver}" "${vm}" "${package}" "${runtype}"
 
 			err=$?
+			trace_end status="${err}"
 			if [ ${err} != 0 ] ||  [ ! -f ./push_commands.sh ]; then
 				echo "###############################################################"
 				echo
@@ -92,10 +105,18 @@ do
 			echo "                                                                               "
 			echo "==============================================================================="
 			cat push_commands.sh
-			./push_commands.sh
+
+			# Collect the pushed images, they are verified once everything is pushed
+			trace_begin push version="${ver}" vm="${vm}" package="${package}"
+			if [ -f ./push_commands.sh ] && ! run_push_commands push_commands.sh "${pushed_commands_file}"; then
+				push_err=1
+				trace_end status=failure
+			else
+				trace_end status=success
+			fi
 
 			# Remove any temporary files
-			rm -f hotspot_*_latest.sh openj9_*_latest.sh push_commands.sh
+			rm -f hotspot_*_latest.sh openj9_*_latest.sh build_metadata.json tag_matrix.json tag_matrix.sh push_commands.sh
 
 			# Now test the images from hub.docker.com
 			echo "==============================================================================="
@@ -106,14 +127,31 @@ do
 			# Only test the individual docker image tags and not the aliases
 			# as the aliases are not created yet.
 			echo "test_tags" > ${test_image_types_file}
+			trace_begin test version="${ver}" vm="${vm}" package="${package}"
 			./test_multiarch.sh "${ver}" "${vm}" "${package}"
+			trace_end
+			trace_end
 		done
 	done
 done
 
+# Confirm just the pushed images are live on hub.docker.com
+if [ -s "${pushed_commands_file}" ]; then
+	trace_begin verify_push
+	if ! python3 tests/scanner/scanner.py post-push --push-commands "${pushed_commands_file}" --deadline 10; then
+		echo "ERROR: Not all pushed images are live on hub.docker.com"
+		push_err=1
+	fi
+	trace_end
+fi
+rm -f "${pushed_commands_file}"
+
 # Print the sumamry information of the docker images build
 print_summary_table
 
+# Print the critical path and the slowest stages of the run
+python3 ./pipeline_trace.py summary "${trace_file}"
+
 # Remove summary table temporary file
 remove_summary_table_file
 
@@ -121,3 +159,5 @@ remove_summary_table_file
 cleanup_images
 cleanup_manifest
 clear_build_cache
+
+exit ${push_err}
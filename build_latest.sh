@@ -59,10 +59,8 @@ function get_image_build_time() {
 		return;
 	fi
 
-	# shellcheck disable=SC2154,SC1083
-	btime=$(btarray=$1[${osfamily}_${current_arch}]; eval btarch=\${"$btarray"}; echo "${btarch}");
-
-	echo "${btime}"
+	local -n btime_ref=$1
+	echo "${btime_ref[${osfamily}_${current_arch}]}"
 }
 
 # Check if the adopt image is available, if not need to build it.
@@ -234,9 +232,23 @@ function build_image() {
 	printf -v expanded_tags "%s ${repo}:%s " "-t" "${tag}" # concatenate to single string : -t repo:tag -t repo:tag2
 	expanded_tags=${expanded_tags%?} # remove trailing space
 
+	# The shared JDK stage of multi-stage Dockerfiles is pinned by the shasums and can be reused
+	# across builds, the OS stages are always rebuilt to pick up the OS updates.
+	build_opts="--no-cache"
+	if [ -n "${multistage}" ]; then
+		export DOCKER_BUILDKIT=1
+		if [ -n "${no_cache_filter}" ]; then
+			build_opts=$(awk '/^FROM .* AS / && $NF != "openjdk" { printf "--no-cache-filter %s ", $NF }' "${dockerfile}")
+		fi
+	fi
+	# Dockerfiles generated with binary_mirror set download the binaries from the mirror on the host
+	if [ -n "${binary_mirror}" ]; then
+		build_opts="${build_opts} --network host"
+	fi
+
 	echo "docker push ${image_name}" >> "${push_cmdfile}"
 	echo "#####################################################"
-	echo "INFO: docker build --no-cache ${expanded_tags} -f ${dockerfile} ."
+	echo "INFO: docker build ${build_opts} ${expanded_tags} -f ${dockerfile} ."
 	echo "#####################################################"
 	if [ ! -z "$TARGET_ARCHITECTURE" ]; then
 		echo "using a buildx environment"
@@ -244,8 +256,10 @@ function build_image() {
 		docker buildx create --name mbuilder
 		docker buildx use mbuilder
 		docker buildx inspect --bootstrap
+		trace_begin docker_build image="${image_name}" os="${osfamily}" dockerfile="${dockerfile}"
 		# shellcheck disable=SC2086 # ignoring ${tags} due to whitespace problem
-		if ! docker buildx build --platform "$TARGET_ARCHITECTURE" --pull --no-cache ${expanded_tags} -f "${dockerfile}" . ; then
+		if ! docker buildx build --platform "$TARGET_ARCHITECTURE" --pull ${build_opts} ${expanded_tags} -f "${dockerfile}" . ; then
+			trace_end status=failure
 			echo "#############################################"
 			echo
 			echo "ERROR: Docker build of image: ${expanded_tags} from ${dockerfile} failed."
@@ -259,12 +273,15 @@ function build_image() {
 				exit 1
 			fi
 		else
+			trace_end status=success
 			if ((SNYK_ENABLED)); then
 			echo "#####################################################"
 			echo "        Scanning with snyk for vulnerabilities       "
 			echo "#####################################################"
 				echo "...scanning ${image_name}"
+				trace_begin snyk image="${image_name}"
 				snyk test --docker "${image_name}" --file="${dockerfile}"
+				trace_end
 			fi
 			echo "| ${image_name:0:80}${auto_space_line:0:$((76 - ${#image_name}))} | success  |" >> ${summary_table_file}
 			echo "+------------------------------------------------------------------------------+----------+" >> ${summary_table_file}
@@ -272,8 +289,10 @@ function build_image() {
 
 		docker buildx rm mbuilder
 	else
+		trace_begin docker_build image="${image_name}" os="${osfamily}" dockerfile="${dockerfile}"
 		# shellcheck disable=SC2086 # ignoring ${tags} due to whitespace problem
-		if ! docker build --pull --no-cache ${expanded_tags} -f "${dockerfile}" . ; then
+		if ! docker build --pull ${build_opts} ${expanded_tags} -f "${dockerfile}" . ; then
+			trace_end status=failure
 			echo "#############################################"
 			echo
 			echo "ERROR: Docker build of image: ${expanded_tags} from ${dockerfile} failed."
@@ -287,12 +306,15 @@ function build_image() {
 				exit 1
 			fi
 		else
+			trace_end status=success
 		  if ((SNYK_ENABLED)); then
 			echo "#####################################################"
 			echo "        Scanning with snyk for vulnerabilities       "
 			echo "#####################################################"
 				echo "...scanning ${image_name}"
+				trace_begin snyk image="${image_name}"
 				snyk test --docker "${image_name}" --file="${dockerfile}"
+				trace_end
 			fi
 			echo "| ${image_name:0:80}${auto_space_line:0:$((76 - ${#image_name}))} | success  |" >> ${summary_table_file}
 			echo "+------------------------------------------------------------------------------+----------+" >> ${summary_table_file}
@@ -359,6 +381,29 @@ function build_dockerfile {
 	popd >/dev/null || return
 }
 
+# Dockerfiles generated with binary_mirror set reach the mirror through the host network, which a buildx
+# builder does not have, its 127.0.0.1 is the builder container and not the host running the mirror.
+if [ -n "${binary_mirror}" ] && [ -n "${TARGET_ARCHITECTURE}" ]; then
+	echo "ERROR: binary_mirror cannot be used with TARGET_ARCHITECTURE (buildx), unset one of them"
+	exit 1
+fi
+
+# The multi-stage builds only disable the cache of the OS stages with --no-cache-filter, which needs a docker CLI
+# that builds with buildx (Docker 23+ / BuildKit 0.10+). Older ones fail on the unknown flag, so they use --no-cache.
+no_cache_filter=""
+if [ -n "${multistage}" ]; then
+	if [ -n "${TARGET_ARCHITECTURE}" ]; then
+		build_help=$(docker buildx build --help 2>/dev/null)
+	else
+		build_help=$(DOCKER_BUILDKIT=1 docker build --help 2>/dev/null)
+	fi
+	if [[ "${build_help}" == *--no-cache-filter* ]]; then
+		no_cache_filter=1
+	else
+		echo "WARNING: docker build does not support --no-cache-filter, it needs Docker 23 or later with buildx. Building without the cache of the JDK stage"
+	fi
+fi
+
 # Set the OSes that will be built on based on the current arch
 set_arch_os
 
@@ -392,7 +437,9 @@ do
 	for build in ${builds}
 	do
 		echo "Getting latest shasum info for [ ${version} ${vm} ${package} ${build} ]"
+		trace_begin shasums version="${version}" vm="${vm}" package="${package}" build="${build}"
 		get_shasums "${version}" "${vm}" "${package}" "${build}"
+		trace_end
 		# Source the generated shasums file to access the array
 		if [ -f "${vm}"_shasums_latest.sh ]; then
 			# shellcheck disable=SC1090
@@ -413,7 +460,9 @@ do
 		for btype in ${btypes}
 		do
 			file="${dir}/Dockerfile.${vm}.${build}.${btype}"
+			trace_begin dockerfile file="${file}"
 			generate_dockerfile "${file}" "${package}" "${build}" "${btype}" "${osfamily}" "${os}"
+			trace_end
 			if [ ! -f "${file}" ]; then
 				continue;
 			fi
@@ -0,0 +1,311 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+
+
+LOGGER = logging.getLogger(__name__)
+
+METADATA_FILE = "build_metadata.json"
+
+
+def build_key(version, vm, package, build):
+    """
+    Get the index key of a build
+    :param version: String - Java version - (8/11/16)
+    :param vm: String - Name of JVM - (hotspot/openj9)
+    :param package: String - Name of package - (jdk/jre)
+    :param build: String - Name of build - (releases/nightly)
+    :return: String - Key, eg. 11/hotspot/jdk/releases
+    """
+    return "/".join([version, vm, package, build])
+
+
+def arch_key(os_family, arch):
+    """
+    Get the index key of an arch inside a build
+    :param os_family: String - Name of OS family - (linux/alpine-linux/windows)
+    :param arch: String - Name of arch - (x86_64/aarch64/windows-amd/...)
+    :return: String - Key, eg. linux/x86_64
+    """
+    return "/".join([os_family, arch])
+
+
+def load_metadata(file_path=METADATA_FILE):
+    """
+    Load the metadata document, an empty document is returned if the file does not exist
+    :param file_path: String - Path of the metadata file
+    :return: Dict - Metadata document
+    """
+    if not os.path.exists(file_path):
+        return {"builds": {}}
+
+    with open(file_path) as metadata_file:
+        return json.load(metadata_file)
+
+
+def save_metadata(metadata, file_path=METADATA_FILE):
+    """
+    Atomically write the metadata document
+    :param metadata: Dict - Metadata document
+    :param file_path: String - Path of the metadata file
+    :return: None
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=directory, prefix=".build_metadata.")
+    with os.fdopen(file_descriptor, "w") as tmp_file:
+        json.dump(metadata, tmp_file, indent=2)
+        tmp_file.write("\n")
+    os.replace(tmp_path, file_path)
+
+
+def get_build(metadata, version, vm, package, build):
+    """
+    Get the metadata of a build
+    :param metadata: Dict - Metadata document
+    :param version: String - Java version
+    :param vm: String - Name of JVM
+    :param package: String - Name of package
+    :param build: String - Name of build
+    :return: Dict - Build metadata or None if the build is unknown
+    """
+    return metadata["builds"].get(build_key(version, vm, package, build))
+
+
+def set_build(metadata, version, vm, package, build, full_version):
+    """
+    Create or reset a build with the full version resolved from the adoptopenjdk api
+    :param metadata: Dict - Metadata document
+    :param version: String - Java version
+    :param vm: String - Name of JVM
+    :param package: String - Name of package
+    :param build: String - Name of build
+    :param full_version: String - Full version, eg. jdk-11.0.11+9
+    :return: Dict - Metadata document
+    """
+    metadata["builds"][build_key(version, vm, package, build)] = {
+        "version": version,
+        "vm": vm,
+        "package": package,
+        "build": build,
+        "full_version": full_version,
+        "arches": {}
+    }
+    return metadata
+
+
+def add_arch(metadata, version, vm, package, build, os_family, arch, sha256, build_time, arch_version):
+    """
+    Record the resolved shasum and build time of an arch
+    :param metadata: Dict - Metadata document
+    :param version: String - Java version
+    :param vm: String - Name of JVM
+    :param package: String - Name of package
+    :param build: String - Name of build
+    :param os_family: String - Name of OS family
+    :param arch: String - Name of arch
+    :param sha256: String - sha256sum of the binary
+    :param build_time: String - Last build time of the binary in seconds since 1-1-1970
+    :param arch_version: String - Version of the binary for this arch
+    :return: Dict - Metadata document
+    """
+    build_metadata = get_build(metadata, version, vm, package, build)
+    if build_metadata is None:
+        LOGGER.error("Build {key} does not exist, set the build first".format(key=build_key(version, vm, package, build)))
+        raise ValueError("Build {key} does not exist, set the build first".format(key=build_key(version, vm, package, build)))
+
+    build_metadata["arches"][arch_key(os_family, arch)] = {
+        "os_family": os_family,
+        "arch": arch,
+        "sha256": sha256,
+        "build_time": build_time,
+        "version": arch_version
+    }
+    return metadata
+
+
+def get_arches(metadata, version, vm, package, build, os_family=None):
+    """
+    Get the arches that have a binary available for a build
+    :param metadata: Dict - Metadata document
+    :param version: String - Java version
+    :param vm: String - Name of JVM
+    :param package: String - Name of package
+    :param build: String - Name of build
+    :param os_family: String - Only return arches of this OS family if set
+    :return: List - Sorted unique list of arches
+    """
+    build_metadata = get_build(metadata, version, vm, package, build)
+    if build_metadata is None:
+        return []
+
+    arches = set()
+    for entry in build_metadata["arches"].values():
+        # Arch is supported only if the shasum is not empty
+        if entry["sha256"] and (os_family is None or entry["os_family"] == os_family):
+            arches.add(entry["arch"])
+
+    return sorted(arches)
+
+
+def get_field(metadata, version, vm, package, build, field, os_family=None, arch=None):
+    """
+    Get a single field of a build or of one of its arches
+    :param metadata: Dict - Metadata document
+    :param version: String - Java version
+    :param vm: String - Name of JVM
+    :param package: String - Name of package
+    :param build: String - Name of build
+    :param field: String - Name of field - (full_version/sha256/build_time/version)
+    :param os_family: String - Name of OS family, required for arch fields
+    :param arch: String - Name of arch, required for arch fields
+    :return: String - Value of the field, empty if unknown
+    """
+    build_metadata = get_build(metadata, version, vm, package, build)
+    if build_metadata is None:
+        return ""
+
+    if arch is None:
+        return build_metadata.get(field, "")
+
+    entry = build_metadata["arches"].get(arch_key(os_family, arch))
+    if entry is None:
+        return ""
+    return entry.get(field, "")
+
+
+def generate_bash_arrays(metadata, vm, field, suffix):
+    """
+    Generate the legacy bash associative arrays for a VM
+    :param metadata: Dict - Metadata document
+    :param vm: String - Name of JVM
+    :param field: String - Arch field stored in the array - (sha256/build_time)
+    :param suffix: String - Suffix of the array name - (sums/build_time)
+    :return: String - Bash script declaring one array per build
+    """
+    lines = []
+    for build_metadata in metadata["builds"].values():
+        if build_metadata["vm"] != vm:
+            continue
+        lines.append("declare -A {pkg}_{vm}_{ver}_{build}_{suffix}=(".format(pkg=build_metadata["package"], vm=vm, ver=build_metadata["version"], build=build_metadata["build"], suffix=suffix))
+        lines.append("\t[version]=\"{version}\"".format(version=build_metadata["full_version"]))
+        for entry in build_metadata["arches"].values():
+            name = "{os_family}_{arch}".format(os_family=entry["os_family"], arch=entry["arch"])
+            lines.append("\t[version-{name}]=\"{version}\"".format(name=name, version=entry["version"]))
+            lines.append("\t[{name}]=\"{value}\"".format(name=name, value=entry[field]))
+        lines.append(")")
+
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def export_bash(metadata, vm, sums_file, build_time_file):
+    """
+    Write the ${vm}_shasums_latest.sh and ${vm}_build_time_latest.sh compatibility files
+    :param metadata: Dict - Metadata document
+    :param vm: String - Name of JVM
+    :param sums_file: String - Path of the shasums file
+    :param build_time_file: String - Path of the build time file
+    :return: None
+    """
+    for file_path, field, suffix in ((sums_file, "sha256", "sums"), (build_time_file, "build_time", "build_time")):
+        with open(file_path, "w") as bash_file:
+            bash_file.write(generate_bash_arrays(metadata, vm, field, suffix))
+        os.chmod(file_path, 0o755)
+
+
+def get_args():
+    """
+    Processes and handles command line arguments
+    :return: Dict of command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Stores and looks up the resolved shasums and build times of the AdoptOpenJDK binaries")
+    parser.add_argument("--file",
+                        help="Path to the metadata file",
+                        type=str,
+                        default=METADATA_FILE)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_build_arguments(subparser):
+        subparser.add_argument("version", help="Java Version", type=str)
+        subparser.add_argument("vm", help="Name of the JVM", type=str, choices=["hotspot", "openj9"])
+        subparser.add_argument("package", help="Name of the Package", type=str, choices=["jdk", "jre"])
+        subparser.add_argument("build", help="Name of the Build", type=str, choices=["releases", "nightly"])
+
+    set_build_parser = subparsers.add_parser("set-build", help="Create or reset a build")
+    add_build_arguments(set_build_parser)
+    set_build_parser.add_argument("full_version", help="Full version of the build", type=str)
+
+    add_arch_parser = subparsers.add_parser("add-arch", help="Record the shasum and build time of an arch")
+    add_build_arguments(add_arch_parser)
+    add_arch_parser.add_argument("os_family", help="Name of the OS family", type=str)
+    add_arch_parser.add_argument("arch", help="Name of the arch", type=str)
+    add_arch_parser.add_argument("--sha256", help="sha256sum of the binary", type=str, required=True)
+    add_arch_parser.add_argument("--build-time", help="Build time in seconds since 1-1-1970", type=str, default="")
+    add_arch_parser.add_argument("--arch-version", help="Version of the binary for this arch", type=str, default="")
+
+    arches_parser = subparsers.add_parser("arches", help="Print the space separated arches available for a build")
+    add_build_arguments(arches_parser)
+    arches_parser.add_argument("--os-family", help="Only print arches of this OS family", type=str, default=None)
+
+    get_parser = subparsers.add_parser("get", help="Print a field of a build or of one of its arches")
+    add_build_arguments(get_parser)
+    get_parser.add_argument("field", help="Name of the field", type=str, choices=["full_version", "sha256", "build_time", "version"])
+    get_parser.add_argument("--os-family", help="Name of the OS family", type=str, default="linux")
+    get_parser.add_argument("--arch", help="Name of the arch", type=str, default=None)
+
+    export_parser = subparsers.add_parser("export-bash", help="Write the legacy bash shasums and build time files for a VM")
+    export_parser.add_argument("vm", help="Name of the JVM", type=str, choices=["hotspot", "openj9"])
+    export_parser.add_argument("--sums-file", help="Path of the shasums file", type=str, default=None)
+    export_parser.add_argument("--build-time-file", help="Path of the build time file", type=str, default=None)
+
+    return vars(parser.parse_args())
+
+
+def run(parsed_args):
+    """
+    Main function that takes in arguments and processes them
+    :param parsed_args: Dict of command line arguments
+    :return: None
+    """
+    metadata = load_metadata(parsed_args["file"])
+    command = parsed_args["command"]
+
+    if command == "set-build":
+        set_build(metadata, parsed_args["version"], parsed_args["vm"], parsed_args["package"], parsed_args["build"], parsed_args["full_version"])
+        save_metadata(metadata, parsed_args["file"])
+    elif command == "add-arch":
+        add_arch(metadata, parsed_args["version"], parsed_args["vm"], parsed_args["package"], parsed_args["build"], parsed_args["os_family"], parsed_args["arch"], parsed_args["sha256"], parsed_args["build_time"], parsed_args["arch_version"])
+        save_metadata(metadata, parsed_args["file"])
+    elif command == "arches":
+        print(" ".join(get_arches(metadata, parsed_args["version"], parsed_args["vm"], parsed_args["package"], parsed_args["build"], parsed_args["os_family"])))
+    elif command == "get":
+        print(get_field(metadata, parsed_args["version"], parsed_args["vm"], parsed_args["package"], parsed_args["build"], parsed_args["field"], parsed_args["os_family"], parsed_args["arch"]))
+    elif command == "export-bash":
+        vm = parsed_args["vm"]
+        export_bash(metadata, vm, parsed_args["sums_file"] or "{vm}_shasums_latest.sh".format(vm=vm), parsed_args["build_time_file"] or "{vm}_build_time_latest.sh".format(vm=vm))
+
+
+if __name__ == "__main__":
+    # Parse the arguments passed in
+    args = get_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
+
+    LOGGER.debug("Parsed arguments: " + str(args))
+    run(parsed_args=args)
@@ -20,6 +20,12 @@ openj9_config_file="config/openj9.config"
 # shellcheck disable=SC2034
 hotspot_config_file="config/hotspot.config"
 
+# Resolved shasums and build times of the binaries, see build_metadata.py
+metadata_file="build_metadata.json"
+
+# Shared state of the per host rate limiter used for the adoptopenjdk.net and github requests
+rate_limiter_state_file=".rate_limiter_state.json"
+
 # Test lists
 # shellcheck disable=SC2034
 test_image_types_file="config/test_image_types.list"
@@ -170,9 +176,106 @@ function get_shasum() {
 	if ! declare -p "$1" >/dev/null 2>/dev/null; then
 		return;
 	fi
-	# shellcheck disable=SC2154,SC1083
-	local shasum=$(sarray=$1[${os_family}_${arch}]; eval esum=\${"$sarray"}; echo "${esum}");
-	echo "${shasum}"
+	local -n sums_ref=$1
+	echo "${sums_ref[${os_family}_${arch}]}"
+}
+
+# Store and look up the resolved shasums and build times in the metadata file.
+# The ${vm}_shasums_latest.sh and ${vm}_build_time_latest.sh files are generated from it.
+function build_metadata() {
+	python3 ./build_metadata.py --file "${metadata_file}" "$@"
+}
+
+# Fetch a url through the adaptive rate limiter, like "curl -Ls url" or "curl -Lso file url".
+# The request rate of each host grows while requests succeed and backs off on HTTP 429/503 and Retry-After.
+function fetch_url() {
+	local url=$1
+	local output=$2
+
+	if [ -n "${output}" ]; then
+		python3 ./rate_limiter.py --state-file "${rate_limiter_state_file}" fetch "${url}" --output "${output}"
+	else
+		python3 ./rate_limiter.py --state-file "${rate_limiter_state_file}" fetch "${url}"
+	fi
+}
+
+# Print a response header of a url, fetched through the adaptive rate limiter.
+# $1 = url
+# $2 = header, eg. Last-Modified
+function fetch_url_header() {
+	python3 ./rate_limiter.py --state-file "${rate_limiter_state_file}" fetch "$1" --header "$2"
+}
+
+# Pipeline tracing, see pipeline_trace.py. Spans are only recorded when the
+# trace_file variable is set, eg. by build_all.sh
+trace_names=()
+trace_starts=()
+trace_attrs=()
+
+# Current time in microseconds since 1-1-1970
+function trace_now() {
+	if [ -n "${EPOCHREALTIME}" ]; then
+		echo "${EPOCHREALTIME/[.,]/}"
+	else
+		date +%s%6N
+	fi
+}
+
+# Convert key=value arguments to the members of a JSON object
+function trace_json_args() {
+	local json=""
+	local kv
+	local value
+
+	for kv in "$@"
+	do
+		value=${kv#*=}
+		value=${value//\\/\\\\}
+		value=${value//\"/\\\"}
+		json="${json:+${json},}\"${kv%%=*}\":\"${value}\""
+	done
+	echo "${json}"
+}
+
+# Start a new trace file in the Chrome trace event format
+function trace_init() {
+	if [ -z "${trace_file}" ]; then
+		return;
+	fi
+	echo "[" > "${trace_file}"
+	echo '{"name":"process_name","ph":"M","pid":1,"tid":1,"args":{"name":"build_all.sh"}},' >> "${trace_file}"
+}
+
+# Start a span, eg. trace_begin docker_build image=adoptopenjdk/openjdk11:x86_64-ubuntu-jdk-11.0.11_9
+function trace_begin() {
+	if [ -z "${trace_file}" ]; then
+		return;
+	fi
+	local name=$1; shift
+
+	trace_names+=("${name}")
+	trace_starts+=("$(trace_now)")
+	trace_attrs+=("$(trace_json_args "$@")")
+}
+
+# End the last started span, optionally adding more attributes, eg. trace_end status=failure
+function trace_end() {
+	if [ -z "${trace_file}" ] || [ ${#trace_names[@]} -eq 0 ]; then
+		return;
+	fi
+	local last=$(( ${#trace_names[@]} - 1 ))
+	local end
+	local attrs
+
+	end=$(trace_now)
+	attrs="${trace_attrs[${last}]}"
+	if [ $# -gt 0 ]; then
+		attrs="${attrs:+${attrs},}$(trace_json_args "$@")"
+	fi
+	# Complete events nest by time, so spans of the child scripts end up inside the spans of their parent
+	printf '{"name":"%s","cat":"pipeline","ph":"X","ts":%s,"dur":%s,"pid":1,"tid":1,"args":{%s}},\n' \
+		"${trace_names[${last}]}" "${trace_starts[${last}]}" "$(( end - trace_starts[last] ))" "${attrs}" >> "${trace_file}"
+	unset "trace_names[${last}]" "trace_starts[${last}]" "trace_attrs[${last}]"
 }
 
 # Get the supported architectures for a given VM (Hotspot, OpenJ9).
@@ -185,24 +288,43 @@ function get_arches() {
 	if ! declare -p "$1" >/dev/null 2>/dev/null; then
 		return;
 	fi
-	local archsums="$(declare -p "$1")";
-	eval "declare -A sums=""${archsums#*=}";
+	local -n sums_ref=$1
 	local arch=""
-	for arch in "${!sums[@]}";
+	local arch_val=""
+	for arch in "${!sums_ref[@]}";
 	do
 		if [[ "${arch}" == version* ]] ; then
 			continue;
 		fi
 		# Arch is supported only if the shasum is not empty !
-		# shellcheck disable=SC2154,SC1083
-		local shasum=$(sarray=$1[${arch}]; eval esum=\${"$sarray"}; echo "${esum}");
-		if [ -n "${shasum}" ]; then
-			local arch_val=$(echo ${arch} | sed 's/alpine-linux_//; s/linux_//; s/windows_//')
+		if [ -n "${sums_ref[${arch}]}" ]; then
+			arch_val=${arch#alpine-linux_}
+			arch_val=${arch_val#linux_}
+			arch_val=${arch_val#windows_}
 			echo "${arch_val} "
 		fi
 	done
 }
 
+# Get the arches supported for the given VM and OS.
+# This is based on the hotspot_shasums_latest.sh/openj9_shasums_latest.sh
+# along with arches present in config/${vm}.config
+function vm_supported_arches_config() {
+	local vm=$1
+	local sums=$2
+	local version=$3
+	local pkg=$4
+	local os=$5
+
+	# First get the arches for which the builds are available as per shasums file
+	local sup_arches_for_build=$(get_arches "${sums}" | sort | uniq)
+	# Next, check the arches that are supported for the underlying OS as per config file
+	local sup_arches_for_os=$(parse_vm_entry "${vm}" "${version}" "${pkg}" "${os}" "Architectures:")
+	# Now the actual arches are the intersection of the above two
+	local merge_arches="${sup_arches_for_build} ${sup_arches_for_os}"
+	echo ${merge_arches} | tr ' ' '\n' | sort | uniq -d
+}
+
 # Check if the given VM is supported on the current architecture.
 # This is based on the hotspot_shasums_latest.sh/openj9_shasums_latest.sh
 # along with arches present in config/${vm}.config
@@ -220,13 +342,7 @@ function vm_supported_onarch_config() {
 		test_arch=$(uname -m)
 	fi
 
-	# First get the arches for which the builds are available as per shasums file
-	local sup_arches_for_build=$(get_arches "${sums}" | sort | uniq)
-	# Next, check the arches that are supported for the underlying OS as per config file
-	local sup_arches_for_os=$(parse_vm_entry "${vm}" "${version}" "${pkg}" "${os}" "Architectures:")
-	# Now the actual arches are the intersection of the above two
-	local merge_arches="${sup_arches_for_build} ${sup_arches_for_os}"
-	local supported_arches=$(echo ${merge_arches} | tr ' ' '\n' | sort | uniq -d)
+	local supported_arches=$(vm_supported_arches_config "${vm}" "${sums}" "${version}" "${pkg}" "${os}")
 
 	local sup=$(echo "${supported_arches}" | grep "${test_arch}")
 	echo "${sup}"
@@ -294,6 +410,14 @@ function parse_os_entry() {
 	echo "${entry}"
 }
 
+# Parse the openj9.config / hotspot.config file for the OSes that generate a
+# HotSpot Class Data Sharing (CDS) archive at image build time
+# $1 = VM
+function parse_cds_entry() {
+	entry=$( < config/"$1".config grep "^CDS:" | sed "s/CDS: //")
+	echo "${entry}"
+}
+
 # Read the tags file and parse the specific tag.
 # $1 = OS
 # $2 = Package
@@ -328,6 +452,42 @@ function check_manifest_tool() {
 	fi
 }
 
+# Run the commands of a push_commands.sh or manifest_commands.sh file one at a time and append the commands
+# of every image or manifest that got pushed to the pushed file, so that post-push only waits for those.
+# The commands of an image or manifest end with its push command.
+function run_push_commands() {
+	local commands_file=$1
+	local pushed_file=$2
+	local commands=""
+	local failed=0
+	local err=0
+	local command
+
+	while IFS= read -r command <&3
+	do
+		if [ -z "${command}" ] || [[ "${command}" == "#"* ]]; then
+			continue
+		fi
+		# The manifest commands quote the path of the manifest tool
+		if ! eval "${command}"; then
+			echo "ERROR: Failed: ${command}"
+			failed=1
+		fi
+		commands+="${command}"$'\n'
+		if [[ "${command}" == *" push "* ]]; then
+			if [ ${failed} == 0 ]; then
+				printf '%s\n' "${commands}" >> "${pushed_file}"
+			else
+				echo "WARNING: Not verifying ${command##* } as it was not pushed"
+				err=1
+			fi
+			commands=""
+			failed=0
+		fi
+	done 3< "${commands_file}"
+	return ${err}
+}
+
 # Build valid image tags using the tags.config file as the base
 function build_tags() {
 	local vm=$1; shift
@@ -345,6 +505,9 @@ function build_tags() {
 	fi
 	# Get the list of supported arches for this vm / ver /os combo
 	local arches=$(parse_vm_entry "${vm}" "${ver}" "${pkg}" "${os}" "Architectures:")
+	# Get the arches that also have a build available, once for all the tags
+	# shellcheck disable=SC2154 #declared externally
+	local supported_arches=$(vm_supported_arches_config "${vm}" "${shasums}" "${ver}" "${pkg}" "${os}")
 	# Replace the proper version string in the tags
 	local rtags=$(echo "${rawtags}" | sed "s/{{ JDK_${build}_VER }}/${rel}/gI; s/{{ OS }}/${os}/gI;");
 	echo "${rtags}" | sed "s/{{ *ARCH *}}/{{ARCH}}/" |
@@ -380,9 +543,7 @@ function build_tags() {
 				arch="x86_64"
 			fi
 			# Check if all the supported arches are available for this build.
-			# shellcheck disable=SC2154 #declared externally
-			supported=$(vm_supported_onarch_config "${vm}" "${shasums}" "${ver}" "${pkg}" "${os}" "${arch}")
-			if [ -z "${supported}" ]; then
+			if [[ "${supported_arches}" != *"${arch}"* ]]; then
 				continue;
 			fi
 			# shellcheck disable=SC2001
@@ -393,6 +554,31 @@ function build_tags() {
 	rm -f ${tmpfile}
 }
 
+# Expand the tags of every vm / ver / pkg / os / build / type combination
+# available in the metadata file in one pass and load them.
+# Arguments are passed on to tag_matrix.py, eg. --vms hotspot --arch x86_64
+function load_tag_matrix() {
+	python3 ./tag_matrix.py generate --metadata-file "${metadata_file}" "$@"
+	# shellcheck disable=SC1091
+	source ./tag_matrix.sh
+}
+
+# Set arch_tags and tag_aliases from the tag matrix, same as build_tags.
+# $1 = VM
+# $2 = Version
+# $3 = Package
+# $4 = OS
+# $5 = Build (releases / nightly)
+# $6 = Type (full / slim)
+function matrix_tags() {
+	local key="$1/$2/$3/$4/$5/$6"
+
+	# shellcheck disable=SC2154 #declared in tag_matrix.sh
+	arch_tags="${matrix_arch_tags[${key}]}"
+	# shellcheck disable=SC2034,SC2154 # used externally
+	tag_aliases="${matrix_tag_aliases[${key}]}"
+}
+
 # Build the URL using adoptopenjdk.net v2 api based on the given parameters
 # request_type = info / binary
 # release_type = releases / nightly
@@ -431,7 +617,7 @@ function get_v2_binary_url() {
 	local v2_url=$1
 	local info_file=/tmp/info_$$.json
 
-	if ! curl -Lso ${info_file} "${v2_url}" || [ ! -s ${info_file} ]; then
+	if ! fetch_url "${v2_url}" "${info_file}" || [ ! -s ${info_file} ]; then
 		rm -f ${info_file}
 		return;
 	fi
@@ -444,7 +630,7 @@ function get_v2_installer_url() {
 	local v2_url=$1
 	local info_file=/tmp/info_$$.json
 
-	if ! curl -Lso ${info_file} "${v2_url}" || [ ! -s ${info_file} ]; then
+	if ! fetch_url "${v2_url}" "${info_file}" || [ ! -s ${info_file} ]; then
 		rm -f ${info_file}
 		return;
 	fi
@@ -501,7 +687,7 @@ function get_v3_binary_url() {
 	local v3_url=$1
 	local info_file=/tmp/info_$$.json
 
-	if ! curl -Lso ${info_file} "${v3_url}" || [ ! -s ${info_file} ]; then
+	if ! fetch_url "${v3_url}" "${info_file}" || [ ! -s ${info_file} ]; then
 		rm -f ${info_file}
 		return;
 	fi
@@ -514,7 +700,7 @@ function get_v3_installer_url() {
 	local v3_url=$1
 	local info_file=/tmp/info_$$.json
 
-	if ! curl -Lso "${info_file}" "${v3_url}" || [ ! -s ${info_file} ]; then
+	if ! fetch_url "${v3_url}" "${info_file}" || [ ! -s ${info_file} ]; then
 		rm -f ${info_file}
 		return;
 	fi
@@ -582,8 +768,8 @@ function get_sums_for_build_arch() {
 	while :
 	do
 		shasum_file="${arch}_${build}_latest"
-		# Bad builds cause the latest url to return an empty file or sometimes curl fails
-		if ! curl -Lso "${shasum_file}" "${LATEST_URL}" || [ ! -s "${shasum_file}" ]; then
+		# Bad builds cause the latest url to return an empty file or sometimes the request fails
+		if ! fetch_url "${LATEST_URL}" "${shasum_file}" || [ ! -s "${shasum_file}" ]; then
 			echo "Latest url not available at url: ${LATEST_URL}"
 			break;
 		fi
@@ -600,7 +786,7 @@ function get_sums_for_build_arch() {
 			else
 				shasums_url=$(python3 -c "import sys, json; print(json.load(sys.stdin)[0]['binaries'][0]['package']['checksum_link'])" < "${shasum_file}")
 			fi
-			shasum=$(curl -Ls "${shasums_url}" | sed -e 's/<[^>]*>//g' | awk '{ print $1 }');
+			shasum=$(fetch_url "${shasums_url}" | sed -e 's/<[^>]*>//g' | awk '{ print $1 }');
 			# Sometimes shasum files are missing, check for error and do not print on error.
 			shasum_available=$(echo "${shasum}" | grep -e "No" -e "Not");
 			if [ -n "${shasum_available}" ]; then
@@ -625,15 +811,13 @@ function get_sums_for_build_arch() {
 				break;
 			fi
 			# Get the build date for this arch tarball
-			arch_last_build_date="$(curl -Lv "${shasums_url}" 2>&1 | grep "Last-Modified" | sed 's/< Last-Modified: //')"
+			arch_last_build_date="$(fetch_url_header "${shasums_url}" Last-Modified)"
 			# Convert to time since 1-1-1970
 			arch_last_build_time="$(date --date "${arch_last_build_date}" +%s)"
-			# Only print the entry if the shasum is not empty
+			# Only record the entry if the shasum is not empty
 			if [ -n "${shasum}" ]; then
-				printf "\t[version-%s]=\"%s\"\n" "${os_family}_${arch}" "${arch_build_version}" >> "${ofile_sums}"
-				printf "\t[version-%s]=\"%s\"\n" "${os_family}_${arch}" "${arch_build_version}" >> "${ofile_build_time}"
-				printf "\t[%s]=\"%s\"\n" "${os_family}_${arch}" "${shasum}" >> "${ofile_sums}"
-				printf "\t[%s]=\"%s\"\n" "${os_family}_${arch}" "${arch_last_build_time}" >> "${ofile_build_time}"
+				build_metadata add-arch "${ver}" "${vm}" "${pkg}" "${build}" "${os_family}" "${arch}" \
+					--sha256 "${shasum}" --build-time "${arch_last_build_time}" --arch-version "${arch_build_version}"
 			fi
 		fi
 		break;
@@ -650,22 +834,17 @@ function get_sums_for_build() {
 	local build=$4
 
 	info_url=$(get_v3_url feature_releases "${build}" "${vm}" "${pkg}");
-	# Repeated requests from a script triggers a error threshold on adoptopenjdk.net
-	sleep 1;
-	info=$(curl -Ls "${info_url}")
+	# Repeated requests from a script triggers a error threshold on adoptopenjdk.net,
+	# the rate limiter keeps the requests under it instead of a fixed sleep.
+	info=$(fetch_url "${info_url}")
 	err=$(echo "${info}" | grep -e "Error" -e "No matches" -e "Not found")
 	if [ -n "${err}" ]; then
 		return;
 	fi
 	full_version=$(echo "${info}" | python3 -c "import sys, json; print(json.load(sys.stdin)[0]['release_name'])")
 	full_version=$(get_nightly_short_version "${build}" "${full_version}")
-	# Declare the array with the proper name for shasums and write to the vm output file.
-	printf "declare -A %s_%s_%s_%s_sums=(\n" "${pkg}" "${vm}" "${ver}" "${build}" >> "${ofile_sums}"
-	# We have another array for storing the last build time for each arch
-	printf "declare -A %s_%s_%s_%s_build_time=(\n" "${pkg}" "${vm}" "${ver}" "${build}" >> "${ofile_build_time}"
-	# Capture the full version according to adoptopenjdk
-	printf "\t[version]=\"%s\"\n" "${full_version}" >> "${ofile_sums}"
-	printf "\t[version]=\"%s\"\n" "${full_version}" >> "${ofile_build_time}"
+	# Capture the full version according to adoptopenjdk in the metadata file.
+	build_metadata set-build "${ver}" "${vm}" "${pkg}" "${build}" "${full_version}"
 	# Need to get shasums for each of the OS Families
 	# families = alpine-linux, linux and windows
 	for os_fam in ${os_families}
@@ -679,8 +858,8 @@ function get_sums_for_build() {
 			get_sums_for_build_arch "${ver}" "${vm}" "${pkg}" "${build}" "${arch}" "${os_fam}"
 		done
 	done
-	printf ")\n" >> "${ofile_sums}"
-	printf ")\n" >> "${ofile_build_time}"
+	# Regenerate the bash arrays for the shasums and the last build time for each arch
+	build_metadata export-bash "${vm}" --sums-file "${ofile_sums}" --build-time-file "${ofile_build_time}"
 
 	echo
 	echo "sha256sums for the version ${full_version} for build type \"${build}\" is now available in ${ofile_sums}"
@@ -697,15 +876,13 @@ function get_shasums() {
 	local ofile_sums="${vm}_shasums_latest.sh"
 	local ofile_build_time="${vm}_build_time_latest.sh"
 
-	# Dont build the shasums array it already exists for the Ver/VM/Pkg/Build combination
-	if [ -f "${ofile_sums}" ]; then
-		# shellcheck disable=SC1090
-		source ./"${vm}"_shasums_latest.sh
-		local sums="${pkg}_${vm}_${ver}_${build}_sums"
-		# File exists, which means shasums for the VM exists.
-		# Now check for the specific Ver/VM/Pg/Build combo
-		local suparches=$(get_arches "${sums}")
+	# Dont fetch the shasums if they already exist for the Ver/VM/Pkg/Build combination
+	if [ -f "${metadata_file}" ] && [ -n "${build}" ]; then
+		local suparches=$(build_metadata arches "${ver}" "${vm}" "${pkg}" "${build}")
 		if [ -n "${suparches}" ]; then
+			if [ ! -f "${ofile_sums}" ]; then
+				build_metadata export-bash "${vm}" --sums-file "${ofile_sums}" --build-time-file "${ofile_build_time}"
+			fi
 			return;
 		fi
 	fi
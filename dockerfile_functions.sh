@@ -333,7 +333,24 @@ ENV JAVA_VERSION ${jver}
 EOI
 }
 
+# Get the github link of a binary. If binary_mirror is set, the link points at the local
+# binary mirror instead, which downloads the binary from github on the first request, see binary_mirror.py
+get_binary_url() {
+	local java_url=$1
+	local arch=$2
+	local osfamily=$3
+	local binary_url=$(get_v3_binary_url "${java_url}")
+	local esum=$(get_shasum "${shasums}" "${arch}" "${osfamily}")
+
+	if [ -n "${binary_mirror}" ] && [ -n "${binary_url}" ] && [ -n "${esum}" ]; then
+		binary_url="${binary_mirror%/}/sha256/${esum}/${binary_url}"
+	fi
+	echo "${binary_url}"
+}
+
 # OS independent portion (Works for both Alpine and Ubuntu)
+# Without an OS, the arches are all the arches with a binary for the OS family.
+# This is used for the shared JDK stage of multi-stage Dockerfiles, see print_java_fetch_stage.
 print_java_install_pre() {
 	local pkg=$2
 	local bld=$3
@@ -352,6 +369,15 @@ print_java_install_pre() {
 	# Now the actual arches are the intersection of the above two
 	local merge_arches="${sup_arches_for_build} ${sup_arches_for_os}"
 	local supported_arches=$(echo ${merge_arches} | tr ' ' '\n' | sort | uniq -d)
+	if [ -z "${os}" ]; then
+		supported_arches=""
+		for sarch in ${sup_arches_for_build}
+		do
+			if [ -n "$(get_shasum "${shasums}" "${sarch}" "${osfamily}")" ]; then
+				supported_arches="${supported_arches} ${sarch}"
+			fi
+		done
+	fi
 	for sarch in ${supported_arches}
 	do
 		if [ "${sarch}" == "aarch64" ]; then
@@ -359,7 +385,7 @@ print_java_install_pre() {
 			cat >> "$1" <<-EOI
        aarch64|arm64) \\
          ESUM='$(get_shasum "${shasums}" aarch64 "${osfamily}")'; \\
-         BINARY_URL='$(get_v3_binary_url "${JAVA_URL}")'; \\
+         BINARY_URL='$(get_binary_url "${JAVA_URL}" aarch64 "${osfamily}")'; \\
          ;; \\
 		EOI
 		elif [ "${sarch}" == "armv7l" ]; then
@@ -367,7 +393,7 @@ print_java_install_pre() {
 			cat >> "$1" <<-EOI
        armhf|armv7l) \\
          ESUM='$(get_shasum "${shasums}" armv7l "${osfamily}")'; \\
-         BINARY_URL='$(get_v3_binary_url "${JAVA_URL}")'; \\
+         BINARY_URL='$(get_binary_url "${JAVA_URL}" armv7l "${osfamily}")'; \\
          ;; \\
 		EOI
 		elif [ "${sarch}" == "ppc64le" ]; then
@@ -375,7 +401,7 @@ print_java_install_pre() {
 			cat >> "$1" <<-EOI
        ppc64el|ppc64le) \\
          ESUM='$(get_shasum "${shasums}" ppc64le "${osfamily}")'; \\
-         BINARY_URL='$(get_v3_binary_url "${JAVA_URL}")'; \\
+         BINARY_URL='$(get_binary_url "${JAVA_URL}" ppc64le "${osfamily}")'; \\
          ;; \\
 		EOI
 		elif [ "${sarch}" == "s390x" ]; then
@@ -383,20 +409,13 @@ print_java_install_pre() {
 			cat >> "$1" <<-EOI
        s390x) \\
          ESUM='$(get_shasum "${shasums}" s390x "${osfamily}")'; \\
-         BINARY_URL='$(get_v3_binary_url "${JAVA_URL}")'; \\
+         BINARY_URL='$(get_binary_url "${JAVA_URL}" s390x "${osfamily}")'; \\
 		EOI
 			# Ubuntu 20.04 has a newer version of libffi (libffi7)
 			# whereas hotspot has been built on libffi6 and fails if that is not avaialble
 			# Workaround is to install libffi6 on ubuntu / hotspot / s390x
 			if [ "${version}" == "8" ] && [ "${vm}" == "hotspot" ] && [ "${os}" == "ubuntu" ]; then
-				cat >> "$1" <<'EOI'
-         LIBFFI_SUM='05e456a2e8ad9f20db846ccb96c483235c3243e27025c3e8e8e358411fd48be9'; \
-         LIBFFI_URL='http://launchpadlibrarian.net/354371408/libffi6_3.2.1-8_s390x.deb'; \
-         curl -LfsSo /tmp/libffi6.deb ${LIBFFI_URL}; \
-         echo "${LIBFFI_SUM} /tmp/libffi6.deb" | sha256sum -c -; \
-         apt-get install -y --no-install-recommends /tmp/libffi6.deb; \
-         rm -rf /tmp/libffi6.deb; \
-EOI
+				print_ubuntu_libffi_package "$1"
 			fi
 			cat >> "$1" <<-EOI
          ;; \\
@@ -406,7 +425,7 @@ EOI
 			cat >> "$1" <<-EOI
        amd64|x86_64) \\
          ESUM='$(get_shasum "${shasums}" x86_64 "${osfamily}")'; \\
-         BINARY_URL='$(get_v3_binary_url "${JAVA_URL}")'; \\
+         BINARY_URL='$(get_binary_url "${JAVA_URL}" x86_64 "${osfamily}")'; \\
          ;; \\
 		EOI
 		fi
@@ -433,6 +452,18 @@ print_java_install_post() {
 EOI
 }
 
+# Install libffi6 on s390x, see print_java_install_pre
+print_ubuntu_libffi_package() {
+	cat >> "$1" <<'EOI'
+         LIBFFI_SUM='05e456a2e8ad9f20db846ccb96c483235c3243e27025c3e8e8e358411fd48be9'; \
+         LIBFFI_URL='http://launchpadlibrarian.net/354371408/libffi6_3.2.1-8_s390x.deb'; \
+         curl -LfsSo /tmp/libffi6.deb ${LIBFFI_URL}; \
+         echo "${LIBFFI_SUM} /tmp/libffi6.deb" | sha256sum -c -; \
+         apt-get install -y --no-install-recommends /tmp/libffi6.deb; \
+         rm -rf /tmp/libffi6.deb; \
+EOI
+}
+
 # Call the script to create the slim package for Ubuntu
 # Install binutils for this phase as we need the "strip" command
 # Uninstall once done
@@ -754,6 +785,129 @@ print_tumbleweed_java_install() {
 	print_leap_java_install "$1" "$2" "$3" "$4" "$5" "$6"
 }
 
+# Image used by the shared JDK stage of multi-stage Dockerfiles, it has to be available on all the arches
+jdk_fetch_image="debian:buster-slim"
+
+# Get the base image of an OS as printed by print_${os}_ver
+get_os_image() {
+	local os=$1
+
+	print_"${os}"_ver /dev/stdout "" "" "${os}" | awk '/^FROM/ { print $2 }'
+}
+
+# Print the FROM of a named stage of a multi-stage Dockerfile
+print_stage_ver() {
+	local os=$2
+	local stage=$3
+
+	cat >> "$1" <<-EOI
+	FROM $(get_os_image "${os}") AS ${stage}
+
+	EOI
+}
+
+# Print the stage that downloads, verifies and extracts the JDK in a multi-stage Dockerfile.
+# The stage does not depend on the OS of the image, it is the same in every Dockerfile of the
+# version / vm / package / build and OS family, and the binary of each arch is pinned by its shasum.
+# BuildKit can therefore build it once and reuse it for all the OS and slim variants.
+print_java_fetch_stage() {
+	local pkg=$2
+	local bld=$3
+	local osfamily=$5
+
+	cat >> "$1" <<-EOI
+	FROM ${jdk_fetch_image} AS openjdk
+
+	RUN set -eux; \\
+	    apt-get update; \\
+	    apt-get install -y --no-install-recommends ca-certificates curl; \\
+	    rm -rf /var/lib/apt/lists/*
+
+	RUN set -eux; \\
+	    ARCH="\$(dpkg --print-architecture)"; \\
+	    case "\${ARCH}" in \\
+	EOI
+	print_java_install_pre "$1" "${pkg}" "${bld}" "" "${osfamily}" ""
+	print_java_install_post "$1"
+	echo >> "$1"
+}
+
+# Print the stage that creates the slim JDK in a multi-stage Dockerfile.
+# The slim script runs the JDK, so it runs on the OS of the image, but in a stage of its own
+# so that the final image only has the layer with the slim JDK.
+print_java_slim_stage() {
+	local osfamily=$5
+	local os=$6
+	local slim_os="${os}"
+
+	case ${os} in
+	debian|debianslim)
+		slim_os="ubuntu";
+		;;
+	clefos)
+		slim_os="centos";
+		;;
+	tumbleweed)
+		slim_os="leap";
+		;;
+	esac
+
+	print_stage_ver "$1" "${os}" openjdk-slim
+	print_lang_locale "$1" "${osfamily}"
+	print_"${os}"_pkg "$1" "${osfamily}"
+	cat >> "$1" <<-EOI
+
+COPY slim-java* /usr/local/bin/
+COPY --from=openjdk ${jhome} ${jhome}
+EOI
+	# The slim script runs java and jar, so the JDK needs libffi6 here too
+	print_java_libffi_run "$1" "${os}"
+	cat >> "$1" <<-EOI
+
+RUN set -eux; \\
+EOI
+	print_"${slim_os}"_slim_package "$1"
+	cat >> "$1" <<-EOI
+    echo "Slim phase completed";
+
+EOI
+}
+
+# Copy the JDK from the shared stage, or from the slim stage for slim builds, in a multi-stage Dockerfile
+print_java_copy() {
+	local btype=$4
+	local os=$6
+	local stage="openjdk"
+
+	if [ "${btype}" == "slim" ]; then
+		stage="openjdk-slim"
+	fi
+	cat >> "$1" <<-EOI
+COPY --from=${stage} ${jhome} ${jhome}
+EOI
+	print_java_libffi_run "$1" "${os}"
+}
+
+# Install libffi6 on ubuntu / hotspot 8 / s390x in a stage the JDK was copied into, see print_java_install_pre
+print_java_libffi_run() {
+	local os=$2
+
+	if [ "${version}" == "8" ] && [ "${vm}" == "hotspot" ] && [ "${os}" == "ubuntu" ]; then
+		cat >> "$1" <<-EOI
+
+RUN set -eux; \\
+    ARCH="\$(dpkg --print-architecture)"; \\
+    case "\${ARCH}" in \\
+       s390x) \\
+EOI
+		print_ubuntu_libffi_package "$1"
+		cat >> "$1" <<-EOI
+         ;; \\
+    esac;
+EOI
+	fi
+}
+
 # Print the JAVA_HOME and PATH.
 # Currently Java is installed at a fixed path "/opt/java/openjdk"
 print_java_env() {
@@ -781,11 +935,44 @@ EOI
 	fi
 }
 
+# Check if a HotSpot CDS archive needs to be generated for the given OS.
+# JDK 12 and later ship a default CDS archive (JEP 341), so this is only
+# needed for versions 8 and 11. The OSes are set with "CDS:" in config/${vm}.config
+# The official configs have no "CDS:" line, update_all.sh generates the official
+# Dockerfiles from them so only the unofficial images get the archive.
+is_cds_enabled() {
+	local osfamily=$1
+	local os=$2
+
+	if [ "${vm}" != "hotspot" ] || [ "${osfamily}" == "windows" ]; then
+		return;
+	fi
+	case ${version} in
+	8|11)
+		;;
+	*)
+		return;
+		;;
+	esac
+	for cds_os in $(parse_cds_entry "${vm}")
+	do
+		if [ "${cds_os}" == "${os}" ]; then
+			echo "yes"
+			return;
+		fi
+	done
+}
+
 # Turn on JVM specific optimization flags.
 # Hotspot container support = https://bugs.openjdk.java.net/browse/JDK-8189497
 # OpenJ9 container support = https://www.eclipse.org/openj9/docs/xxusecontainersupport/
 # OpenJ9 Idle tuning = https://www.eclipse.org/openj9/docs/xxidletuninggconidle/
+# Hotspot CDS = https://docs.oracle.com/javase/8/docs/technotes/guides/vm/class-data-sharing.html
 print_java_options() {
+	local osfamily=$4
+	local os=$5
+	local JOPTS=""
+
 	case ${vm} in
 	hotspot)
 		case ${version} in
@@ -793,6 +980,10 @@ print_java_options() {
 			JOPTS="-XX:+UnlockExperimentalVMOptions -XX:+UseCGroupMemoryLimitForHeap";
 			;;
 		esac
+		# The 64-bit server VM of JDK 8 does not use the CDS archive unless asked to, JDK 11 uses it by default
+		if [ "${version}" == "8" ] && [ -n "$(is_cds_enabled "${osfamily}" "${os}")" ]; then
+			JOPTS="-Xshare:auto";
+		fi
 		;;
 	openj9)
 		case ${os} in
@@ -916,6 +1107,37 @@ EOI
 	fi
 }
 
+print_cds_gen() {
+	local osfamily=$3;
+	local os=$4;
+
+	if [ -n "$(is_cds_enabled "${osfamily}" "${os}")" ]; then
+		if [ "${version}" == "8" ]; then
+			cat >> "$1" <<'EOI'
+
+# Create a HotSpot Class Data Sharing (CDS) archive for the JDK classes to improve the java startup.
+# The archive is dumped at the default location inside the JDK and enabled with -Xshare:auto,
+# the build fails if it cannot be dumped so the image never sets -Xshare:auto without an archive.
+EOI
+		else
+			cat >> "$1" <<'EOI'
+
+# Create a HotSpot Class Data Sharing (CDS) archive for the JDK classes to improve the java startup.
+# The archive is dumped at the default location inside the JDK, where the JVM uses it by default,
+# the build fails if it cannot be dumped.
+EOI
+		fi
+		cat >> "$1" <<'EOI'
+
+RUN set -eux; \
+    unset JAVA_TOOL_OPTIONS; \
+    java -Xshare:dump; \
+    echo "CDS generation phase completed";
+
+EOI
+	fi
+}
+
 # Generate the dockerfile for a given build, build_type and OS
 generate_dockerfile() {
 	local file=$1
@@ -939,7 +1161,23 @@ generate_dockerfile() {
 		copy_slim_script "${file}";
 		print_"${osfamily}"_java_install "${file}" "${pkg}" "${bld}" "${btype}" "${osfamily}" "${os}";
 		print_java_env "${file}" "${bld}" "${btype}" "${osfamily}";
-		print_java_options "${file}" "${bld}" "${btype}";
+		print_java_options "${file}" "${bld}" "${btype}" "${osfamily}" "${os}";
+		print_cmd "${file}";
+	elif [ -n "${multistage}" ]; then
+		# Download the JDK in a stage shared by all the OS and slim variants
+		print_java_fetch_stage "${file}" "${pkg}" "${bld}" "${btype}" "${osfamily}" "${os}";
+		if [ "${btype}" == "slim" ]; then
+			print_java_slim_stage "${file}" "${pkg}" "${bld}" "${btype}" "${osfamily}" "${os}";
+		fi
+		print_stage_ver "${file}" "${os}" runtime;
+		print_lang_locale "${file}" "${osfamily}";
+		print_"${os}"_pkg "${file}" "${osfamily}";
+		print_env "${file}" "${osfamily}" "${os}";
+		print_java_copy "${file}" "${pkg}" "${bld}" "${btype}" "${osfamily}" "${os}";
+		print_java_env "${file}" "${bld}" "${btype}" "${osfamily}";
+		print_java_options "${file}" "${bld}" "${btype}" "${osfamily}" "${os}";
+		print_scc_gen "${file}" "${vm}" "${osfamily}" "${os}";
+		print_cds_gen "${file}" "${vm}" "${osfamily}" "${os}";
 		print_cmd "${file}";
 	else
 		print_"${os}"_ver "${file}" "${bld}" "${btype}" "${os}";
@@ -949,8 +1187,9 @@ generate_dockerfile() {
 		copy_slim_script "${file}";
 		print_"${os}"_java_install "${file}" "${pkg}" "${bld}" "${btype}" "${osfamily}" "${os}";
 		print_java_env "${file}" "${bld}" "${btype}" "${osfamily}";
-		print_java_options "${file}" "${bld}" "${btype}";
+		print_java_options "${file}" "${bld}" "${btype}" "${osfamily}" "${os}";
 		print_scc_gen "${file}" "${vm}" "${osfamily}" "${os}";
+		print_cds_gen "${file}" "${vm}" "${osfamily}" "${os}";
 		print_cmd "${file}";
 	fi
 	echo "done"
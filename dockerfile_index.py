@@ -0,0 +1,319 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_FILE = "dockerfile_index.json"
+
+# Case arms of the install step, eg. "amd64|x86_64) \"
+ARCH_PATTERN = re.compile(r"^\s+([a-z0-9_|]+)\) \\$")
+ESUM_PATTERN = re.compile(r"^\s+ESUM='([0-9a-f]*)'")
+BINARY_URL_PATTERN = re.compile(r"^\s+BINARY_URL='([^']*)'")
+WINDOWS_ESUM_PATTERN = re.compile(r"-ne '([0-9a-f]{64})'")
+WINDOWS_URL_PATTERN = re.compile(r"curl\.exe -LfsSo \S+ (\S+)")
+
+# Arch names of the Dockerfiles
+ARCHES = ["aarch64", "armv7l", "ppc64le", "s390x", "x86_64"]
+
+# Names of the case arms, the uname names and the dpkg names of the arches, eg. "armhf)" alone for armv7l
+ARCH_ALIASES = {
+    "aarch64": "aarch64",
+    "arm64": "aarch64",
+    "armv7l": "armv7l",
+    "armhf": "armv7l",
+    "ppc64le": "ppc64le",
+    "ppc64el": "ppc64le",
+    "s390x": "s390x",
+    "x86_64": "x86_64",
+    "amd64": "x86_64"
+}
+WINDOWS_ARCH = "windows-amd"
+
+# Names of the arches in the official images
+OFFICIAL_ARCHES = {
+    "aarch64": "arm64v8",
+    "armv7l": "arm32v7",
+    "ppc64le": "ppc64le",
+    "s390x": "s390x",
+    "x86_64": "amd64",
+    WINDOWS_ARCH: "windows-amd64"
+}
+
+FIELDS = ["path", "vm", "version", "package", "os", "build", "type", "from", "java_version", "java_tool_options", "arches", "official_arches"]
+
+
+def parse_dockerfile(path, content):
+    """
+    Parse the metadata of a generated Dockerfile
+    :param path: String - Path of the Dockerfile relative to the repo, eg. 11/jdk/ubuntu/Dockerfile.hotspot.releases.full
+    :param content: String - Content of the Dockerfile
+    :return: Dict - Dockerfile entry
+    """
+    parts = path.split("/")
+    name = parts[-1].split(".")
+    if len(parts) < 4 or len(name) != 4:
+        LOGGER.error("{path} is not a generated Dockerfile".format(path=path))
+        raise ValueError("{path} is not a generated Dockerfile".format(path=path))
+
+    entry = {
+        "path": path,
+        "directory": os.path.dirname(path),
+        "version": parts[0],
+        "package": parts[1],
+        "os": parts[2],
+        "vm": name[1],
+        "build": name[2],
+        "type": name[3],
+        "stages": [],
+        "from": "",
+        "java_version": "",
+        "java_tool_options": "",
+        "arches": {}
+    }
+
+    arch = None
+    for line in content.splitlines():
+        if line.startswith("FROM "):
+            entry["stages"].append(line.split()[1])
+            # The image is built from the last stage
+            entry["from"] = entry["stages"][-1]
+        elif line.startswith("ENV JAVA_VERSION "):
+            entry["java_version"] = line.split()[2]
+        elif line.startswith("ENV JAVA_TOOL_OPTIONS="):
+            entry["java_tool_options"] = line.split("=", 1)[1].strip('"')
+        elif ARCH_PATTERN.match(line):
+            names = ARCH_PATTERN.match(line).group(1).split("|")
+            arch = next((ARCH_ALIASES[name] for name in names if name in ARCH_ALIASES), None)
+            if arch is None:
+                LOGGER.warning("WARNING: Unknown arch {names} in {path}".format(names="|".join(names), path=path))
+        elif arch and ESUM_PATTERN.match(line):
+            entry["arches"].setdefault(arch, {})["esum"] = ESUM_PATTERN.match(line).group(1)
+        elif arch and BINARY_URL_PATTERN.match(line):
+            entry["arches"].setdefault(arch, {})["binary_url"] = BINARY_URL_PATTERN.match(line).group(1)
+        elif entry["os"] == "windows" and WINDOWS_URL_PATTERN.search(line):
+            entry["arches"].setdefault(WINDOWS_ARCH, {})["binary_url"] = WINDOWS_URL_PATTERN.search(line).group(1)
+        elif entry["os"] == "windows" and WINDOWS_ESUM_PATTERN.search(line):
+            entry["arches"].setdefault(WINDOWS_ARCH, {})["esum"] = WINDOWS_ESUM_PATTERN.search(line).group(1)
+
+    return entry
+
+
+def find_dockerfiles(root_dir="."):
+    """
+    Find the generated Dockerfiles, they live in <version>/<package>/<os>[/<distro>]
+    :param root_dir: String - Root of the repo
+    :return: List - Sorted paths relative to the root
+    """
+    paths = []
+    for version in os.listdir(root_dir):
+        if not version.isdigit() or not os.path.isdir(os.path.join(root_dir, version)):
+            continue
+        for directory, _, file_names in os.walk(os.path.join(root_dir, version)):
+            for file_name in file_names:
+                if file_name.startswith("Dockerfile."):
+                    paths.append(os.path.relpath(os.path.join(directory, file_name), root_dir))
+
+    return sorted(paths)
+
+
+def load_index(file_path=INDEX_FILE):
+    """
+    Load the index, an empty index is returned if the file does not exist
+    :param file_path: String - Path of the index file
+    :return: Dict - Index
+    """
+    if not os.path.exists(file_path):
+        return {"dockerfiles": {}}
+
+    with open(file_path) as index_file:
+        return json.load(index_file)
+
+
+def save_index(index, file_path=INDEX_FILE):
+    """
+    Atomically write the index
+    :param index: Dict - Index
+    :param file_path: String - Path of the index file
+    :return: None
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=directory, prefix=".dockerfile_index.")
+    with os.fdopen(file_descriptor, "w") as tmp_file:
+        json.dump(index, tmp_file, indent=1, sort_keys=True)
+        tmp_file.write("\n")
+    os.replace(tmp_path, file_path)
+
+
+def update_index(index, root_dir="."):
+    """
+    Bring the index up to date with the Dockerfiles in a single pass. A Dockerfile is only parsed again if its
+    sha256 changed, the size and modification time are checked first so unchanged files are not even read
+    :param index: Dict - Index
+    :param root_dir: String - Root of the repo
+    :return: Dict - Counts of the unchanged, rehashed, parsed and removed Dockerfiles
+    """
+    counts = {"unchanged": 0, "rehashed": 0, "parsed": 0, "removed": 0}
+    dockerfiles = {}
+    for path in find_dockerfiles(root_dir):
+        stat = os.stat(os.path.join(root_dir, path))
+        cached = index["dockerfiles"].get(path)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            dockerfiles[path] = cached
+            counts["unchanged"] += 1
+            continue
+
+        with open(os.path.join(root_dir, path), "rb") as dockerfile:
+            content = dockerfile.read()
+        sha256 = hashlib.sha256(content).hexdigest()
+        if cached and cached["sha256"] == sha256:
+            # Touched but not changed, eg. by a git checkout
+            entry = cached
+            counts["rehashed"] += 1
+        else:
+            entry = parse_dockerfile(path, content.decode("utf-8"))
+            entry["sha256"] = sha256
+            counts["parsed"] += 1
+        entry["size"] = stat.st_size
+        entry["mtime_ns"] = stat.st_mtime_ns
+        dockerfiles[path] = entry
+
+    counts["removed"] = len(set(index["dockerfiles"]) - set(dockerfiles))
+    index["dockerfiles"] = dockerfiles
+    return counts
+
+
+def get_official_arches(entry):
+    """
+    Get the arches of a Dockerfile as named in the official images
+    :param entry: Dict - Dockerfile entry
+    :return: List - Sorted official arch names
+    """
+    return sorted(OFFICIAL_ARCHES[arch] for arch in entry["arches"])
+
+
+def query(index, **filters):
+    """
+    Get the Dockerfiles that match all the filters
+    :param index: Dict - Index
+    :param filters: Field values to match, eg. vm="hotspot", None matches any value
+    :return: List - Dockerfile entries sorted by path
+    """
+    entries = []
+    for path in sorted(index["dockerfiles"]):
+        entry = index["dockerfiles"][path]
+        if all(value is None or entry[field] == value for field, value in filters.items()):
+            entries.append(entry)
+
+    return entries
+
+
+def format_field(entry, field):
+    """
+    Format a field of a Dockerfile entry for the tab separated output
+    :param entry: Dict - Dockerfile entry
+    :param field: String - Name of the field, see FIELDS
+    :return: String - Field value, lists are space separated and empty values are printed as "-"
+    """
+    if field == "arches":
+        value = " ".join(sorted(entry["arches"]))
+    elif field == "official_arches":
+        value = ", ".join(get_official_arches(entry))
+    else:
+        value = entry[field]
+    # bash read collapses empty tab separated fields
+    return value or "-"
+
+
+def get_args():
+    """
+    Processes and handles command line arguments
+    :return: Dict of command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Indexes the metadata of all the generated Dockerfiles for the doc and config generators and the scanner")
+    parser.add_argument("--file",
+                        help="Path of the index file",
+                        type=str,
+                        default=INDEX_FILE)
+    parser.add_argument("--root",
+                        help="Root of the repo with the generated Dockerfiles",
+                        type=str,
+                        default=".")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("update", help="Parse the new and changed Dockerfiles into the index")
+
+    list_parser = subparsers.add_parser("list", help="Update the index and print the matching Dockerfiles")
+    list_parser.add_argument("--vm", help="Name of the JVM", type=str, default=None)
+    list_parser.add_argument("--version", help="Java Version", type=str, default=None)
+    list_parser.add_argument("--package", help="Name of the Package", type=str, default=None)
+    list_parser.add_argument("--os", help="Name of the OS", type=str, default=None)
+    list_parser.add_argument("--build", help="Name of the Build", type=str, default=None)
+    list_parser.add_argument("--type", help="Build type", type=str, default=None)
+    list_parser.add_argument("--fields",
+                             help="Comma separated fields of the tab separated output",
+                             type=str,
+                             default=",".join(FIELDS))
+    list_parser.add_argument("--json", help="Print the matching entries as JSON", action="store_true")
+
+    return vars(parser.parse_args())
+
+
+def run(parsed_args):
+    """
+    Main function that takes in arguments and processes them
+    :param parsed_args: Dict of command line arguments
+    :return: None
+    """
+    index = load_index(parsed_args["file"])
+    counts = update_index(index, parsed_args["root"])
+    if counts["rehashed"] or counts["parsed"] or counts["removed"]:
+        save_index(index, parsed_args["file"])
+    LOGGER.debug("Dockerfile index: {counts}".format(counts=counts))
+
+    if parsed_args["command"] == "update":
+        LOGGER.info("Indexed {total} Dockerfiles, {parsed} parsed, {removed} removed".format(total=len(index["dockerfiles"]), parsed=counts["parsed"], removed=counts["removed"]))
+        return
+
+    entries = query(index, vm=parsed_args["vm"], version=parsed_args["version"], package=parsed_args["package"], os=parsed_args["os"], build=parsed_args["build"], type=parsed_args["type"])
+    if parsed_args["json"]:
+        print(json.dumps(entries, indent=2))
+        return
+
+    fields = parsed_args["fields"].split(",")
+    for field in fields:
+        if field not in FIELDS:
+            LOGGER.error("{field} is not a valid field, choose from {fields}".format(field=field, fields=", ".join(FIELDS)))
+            raise ValueError("{field} is not a valid field, choose from {fields}".format(field=field, fields=", ".join(FIELDS)))
+    for entry in entries:
+        print("\t".join(format_field(entry, field) for field in fields))
+
+
+if __name__ == "__main__":
+    # Parse the arguments passed in
+    args = get_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
+
+    LOGGER.debug("Parsed arguments: " + str(args))
+    run(parsed_args=args)
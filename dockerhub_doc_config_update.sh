@@ -58,7 +58,6 @@ print_official_header() {
 }
 
 function generate_unofficial_image_info() {
-	full_version=$(grep "VERSION" "${file}" | awk '{ print $3 }')
 	# Replace "+" with "_" in the version info as docker does not support "+"
 	full_version=${full_version//+/_}
 
@@ -144,10 +143,7 @@ function generate_unofficial_image_info() {
 	fi
 
 	# Unofficial images support x86_64, aarch64, s390x and ppc64le
-	# Remove ppc64el, amd64 and arm64
-	# Retain ppc64le, x86_64 and aarch64
-	# shellcheck disable=SC2046,SC2005,SC1003,SC2086,SC2063 # TODO need to rewrite this
-	arches=$(echo $(grep ') \\' ${file} | sed 's/\(ppc64el\|amd64\|arm64\|armhf\)//g' | sort | grep -v "*" | sed 's/) \\//g; s/|/ /g'))
+	arches="${file_arches}"
 	if [ "${os}" == "alpine" ]; then
 		# Alpine builds are only available for x86_64 currently
 		arches="x86_64"
@@ -164,15 +160,11 @@ function generate_unofficial_image_info() {
 	do
 		print_unofficial_tags "${arch}-${os}-${vattrs}" >> "${ver}"_"${vm}".txt
 	done
-	# Remove the leading "./" from the file name
-	file=$(echo "${file}" | cut -c 3-)
 	echo "(*${file}*)](${git_repo}/${file})" >> "${ver}"_"${vm}".txt
 }
 
 function generate_official_image_tags() {
 	# Generate the tags
-	full_version=$(grep "VERSION" "${file}" | awk '{ print $3 }')
-
 	# Remove any `jdk` references in the version
 	ojdk_version=$(echo "${full_version}" | sed 's/\(jdk-\)//;s/\(jdk\)//' | awk -F '_' '{ print $1 }')
 	# Replace "+" with "_" in the version info as docker does not support "+"
@@ -243,11 +235,8 @@ function generate_official_image_arches() {
 	if [ $os == "windows" ]; then
 		arches="windows-amd64"
 	else
-		# Remove ppc64el, x86_64, armv7l and aarch64
-		# Retain ppc64le, amd64 and arm64
-		# armhf is arm32v7 and arm64 is arm64v8 for docker builds
-		# shellcheck disable=SC2046,SC2005,SC1003,SC2086,SC2063
-		arches=$(echo $(grep ') \\' ${file} | sed 's/\(ppc64el\)//;s/\(x86_64\)//;s/\(armv7l\)//;s/\(armhf\)/arm32v7/;s/\(aarch64\)//;s/\(arm64\)/arm64v8/;' | grep -v "*" | sed 's/) \\//g; s/|//g' | sort) | sed 's/ /, /g')
+		# armv7l is arm32v7, aarch64 is arm64v8 and x86_64 is amd64 for docker builds
+		arches="${file_official_arches}"
 	fi
 }
 
@@ -267,6 +256,32 @@ function print_official_image_file() {
 	} >> ${official_docker_image_file}
 }
 
+# Load the metadata of all the generated Dockerfiles from the index in a single pass,
+# keyed by the vm / version / package of the official images and by the
+# vm / version / build / os / package of the unofficial images. See dockerfile_index.py
+declare -A official_entries
+declare -A unofficial_entries
+function load_dockerfile_index() {
+	local line entry_vm entry_ver entry_pkg entry_os entry_build index_lines
+
+	# Read the whole list first, a failure in a process substitution would go unnoticed and leave the docs empty
+	if ! index_lines=$(python3 ./dockerfile_index.py list --fields path,vm,version,package,os,build,type,java_version,arches,official_arches); then
+		echo "ERROR: Failed to load the Dockerfile index, see dockerfile_index.py"
+		exit 1
+	fi
+	while IFS= read -r line
+	do
+		if [ -z "${line}" ]; then
+			continue;
+		fi
+		IFS=$'\t' read -r _ entry_vm entry_ver entry_pkg entry_os entry_build _ <<< "${line}"
+		official_entries[${entry_vm}/${entry_ver}/${entry_pkg}]+="${line}"$'\n'
+		unofficial_entries[${entry_vm}/${entry_ver}/${entry_build}/${entry_os}/${entry_pkg}]+="${line}"$'\n'
+	done <<< "${index_lines}"
+}
+
+load_dockerfile_index
+
 rm -f ${official_docker_image_file}
 print_official_header
 
@@ -316,21 +331,19 @@ do
 		for pkg in ${all_packages}
 		do
 			# Iterate through each of the Dockerfiles.
-			for file in $(find . -name "Dockerfile.*" | grep "/${ver}" | grep "${vm}" | grep "${pkg}" | sort -n)
+			# file will look like 12/jdk/debian/Dockerfile.openj9.nightly.slim
+			while IFS=$'\t' read -r file _ _ _ os build btype full_version file_arches file_official_arches
 			do
-				# file will look like ./12/jdk/debian/Dockerfile.openj9.nightly.slim
+				if [ -z "${file}" ]; then
+					continue;
+				fi
 				# dockerfile name
 				dfname=$(basename "${file}")
 				# dockerfile dir
-				dfdir=$(dirname $file | cut -c 3-)
-				os=$(echo "${file}" | awk -F '/' '{ print $4 }')
-				# build = release or nightly
-				build=$(echo "${dfname}" | awk -F "." '{ print $3 }')
-				# btype = full or slim
-				btype=$(echo "${dfname}" | awk -F "." '{ print $4 }')
+				dfdir=$(dirname "${file}")
 
 				generate_official_image_info
-			done
+			done <<< "${official_entries[${vm}/${ver}/${pkg}]}"
 		done
 	done
 done
@@ -354,21 +367,18 @@ do
 			do
 				for pkg in ${all_packages}
 				do
-					for file in $(find . -name "Dockerfile.*" | grep "/${ver}" | grep "${vm}" | grep "${build}" | grep "/${os}/" | grep "${pkg}")
+					while IFS=$'\t' read -r file _ _ _ _ _ btype full_version file_arches file_official_arches
 					do
+						if [ -z "${file}" ]; then
+							continue;
+						fi
 						echo -n "- [" >> "${ver}"_"${vm}".txt
 						dfname=$(basename "${file}")
 						# dockerfile dir
-						dfdir=$(dirname "${file}" | cut -c 3-)
-						pkg=$(echo "${file}" | awk -F '/' '{ print $3 }')
-						os=$(echo "${file}" | awk -F '/' '{ print $4 }')
-						# build = release or nightly
-						build=$(echo "${dfname}" | awk -F "." '{ print $3 }')
-						# btype = full or slim
-						btype=$(echo "${dfname}" | awk -F "." '{ print $4 }')
+						dfdir=$(dirname "${file}")
 
 						generate_unofficial_image_info
-					done
+					done <<< "${unofficial_entries[${vm}/${ver}/${build}/${os}/${pkg}]}"
 				done
 				echo >> "${ver}"_"${vm}".txt
 			done
@@ -128,6 +128,9 @@ if [ "${vm}" == "openj9" ] && [ -f openj9_shasums_latest.sh ]; then
 	available_jvms="${available_jvms} openj9"
 fi
 
+# Expand the tags for all the os / build / type combinations in one go
+load_tag_matrix --vms "${vm}" --versions "${version}" --packages "${package}"
+
 
 # Populate the script to create the manifest list
 echo "#!/usr/bin/env bash" > "${man_file}"
@@ -161,9 +164,6 @@ do
 		if [[ -z ${jrel} ]]; then
 			continue;
 		fi
-		# Docker image tags cannot have "+" in them, replace it with "_" instead.
-		rel=${jrel//+/_}
-
 		srepo=${source_repo}${version}
 		if [ "${vm}" != "hotspot" ]; then
 			srepo=${srepo}-${vm}
@@ -171,9 +171,8 @@ do
 		for btype in ${btypes}
 		do
 			echo -n "INFO: Building tag list for [${vm}]-[${package}]-[${os}]-[${build}]-[${btype}]..."
-			# Get the relevant tags for this vm / os / build / type combo from the tags.config file
-			raw_tags=$(parse_tag_entry "${os}" "${package}" "${build}" "${btype}")
-			build_tags "${vm}" "${version}" "${package}" "${rel}" "${os}" "${build}" "${raw_tags}"
+			# Get the relevant tags for this vm / os / build / type combo from the tag matrix
+			matrix_tags "${vm}" "${version}" "${package}" "${os}" "${build}" "${btype}"
 			echo "done"
 			print_tags "${srepo}"
 		done
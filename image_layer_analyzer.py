@@ -0,0 +1,416 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tarfile
+import tempfile
+
+
+LOGGER = logging.getLogger(__name__)
+
+WHITEOUT_PREFIX = ".wh."
+OPAQUE_WHITEOUT = ".wh..wh..opq"
+
+# The paths of every layer are spilled to disk so memory does not grow with the size of the image
+SCHEMA = """
+CREATE TABLE files (
+    path TEXT NOT NULL,
+    layer TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+
+CREATE TABLE whiteouts (
+    layer TEXT NOT NULL,
+    target TEXT NOT NULL,
+    opaque INTEGER NOT NULL
+);
+"""
+
+
+def normalize_path(path):
+    """
+    Normalize a path from a layer tar so that the same file compares equal across layers
+    :param path: String - Path as stored in the tar
+    :return: String - Path without any leading "./" or "/"
+    """
+    while path.startswith("./"):
+        path = path[2:]
+    return path.lstrip("/")
+
+
+def directory_prefix(path, depth):
+    """
+    Get the directory a file is accounted to in the directory summary
+    :param path: String - Normalized file path
+    :param depth: Integer - Number of leading path components to keep
+    :return: String - Directory prefix, "/" for files at the root
+    """
+    parts = path.split("/")[:-1]
+    if not parts:
+        return "/"
+    return "/".join(parts[:depth])
+
+
+def push_bounded(heap, entry, top):
+    """
+    Keep the top largest entries in a bounded min-heap so memory does not grow with the number of entries
+    :param heap: List - Min-heap
+    :param entry: Tuple - Entry, compared by its first item
+    :param top: Integer - Number of entries to keep
+    :return: None
+    """
+    if len(heap) < top:
+        heapq.heappush(heap, entry)
+    elif heap and entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+
+def new_layer_stats():
+    """
+    Create an empty stats record for a layer
+    :return: Dict - Layer stats
+    """
+    return {
+        "size": 0,
+        "files": 0,
+        "whiteouts": 0,
+        "largest": [],
+        "directories": {}
+    }
+
+
+def analyze_layer(layer_name, layer_fileobj, state, top, depth):
+    """
+    Walk a single layer tar as a stream, record its stats in the shared state and spill its paths to the database
+    :param layer_name: String - Name of the layer inside the docker save archive
+    :param layer_fileobj: File object positioned at the start of the layer tar
+    :param state: Dict - Shared analyzer state
+    :param top: Integer - Number of largest files to keep per layer
+    :param depth: Integer - Directory depth used for the directory summary
+    :return: None
+    """
+    stats = new_layer_stats()
+    database = state["database"]
+
+    try:
+        layer = tarfile.open(fileobj=layer_fileobj, mode="r|*")
+    except tarfile.ReadError:
+        # Image config blobs in the OCI layout are JSON, not tars
+        LOGGER.debug("Skipping {layer}, it is not a layer tar".format(layer=layer_name))
+        return
+
+    with layer:
+        for member in layer:
+            path = normalize_path(member.name)
+            basename = path.rsplit("/", 1)[-1]
+
+            if basename.startswith(WHITEOUT_PREFIX):
+                parent = path[:-len(basename)]
+                stats["whiteouts"] += 1
+                if basename == OPAQUE_WHITEOUT:
+                    database.execute("INSERT INTO whiteouts VALUES (?, ?, 1)", (layer_name, parent))
+                else:
+                    database.execute("INSERT INTO whiteouts VALUES (?, ?, 0)", (layer_name, parent + basename[len(WHITEOUT_PREFIX):]))
+                continue
+
+            if not member.isreg():
+                continue
+
+            stats["size"] += member.size
+            stats["files"] += 1
+            prefix = directory_prefix(path, depth)
+            stats["directories"][prefix] = stats["directories"].get(prefix, 0) + member.size
+            database.execute("INSERT INTO files VALUES (?, ?, ?)", (path, layer_name, member.size))
+
+            push_bounded(stats["largest"], (member.size, path), top)
+
+    database.commit()
+    state["layers"][layer_name] = stats
+    LOGGER.debug("Analyzed layer {layer}: {files} files, {size} bytes".format(layer=layer_name, files=stats["files"], size=stats["size"]))
+
+
+def stream_archive(archive_path, database, top=25, depth=4):
+    """
+    Read a docker save tarball as a stream and analyze every layer without extracting anything to disk.
+    The paths are spilled to the database, so memory use does not grow with the size of the archive
+    :param archive_path: String - Path to the archive, "-" to read from stdin
+    :param database: sqlite3 Connection - Empty database the paths and whiteouts are written to
+    :param top: Integer - Number of largest files to report
+    :param depth: Integer - Directory depth used for the directory summary
+    :return: Dict - Analyzer state holding the manifest, layer stats and the database
+    """
+    state = {
+        "manifest": None,
+        "layers": {},
+        "database": database
+    }
+    database.executescript(SCHEMA)
+
+    if archive_path == "-":
+        archive = tarfile.open(fileobj=sys.stdin.buffer, mode="r|*")
+    else:
+        archive = tarfile.open(archive_path, mode="r|*")
+
+    with archive:
+        for member in archive:
+            if not member.isreg():
+                continue
+            name = normalize_path(member.name)
+            if name == "manifest.json":
+                state["manifest"] = json.load(archive.extractfile(member))
+            elif name.endswith("/layer.tar") or name.startswith("blobs/"):
+                analyze_layer(name, archive.extractfile(member), state, top, depth)
+
+    if state["manifest"] is None:
+        LOGGER.error("{archive} has no manifest.json. Is it a docker save archive?".format(archive=archive_path))
+        raise ValueError("{archive} has no manifest.json. Is it a docker save archive?".format(archive=archive_path))
+
+    # Indexed once all the layers are in, inserting into an indexed table is slower
+    database.execute("CREATE INDEX files_path ON files (path)")
+    return state
+
+
+def get_hidden_files(database, target, opaque):
+    """
+    Get the files a whiteout hides
+    :param database: sqlite3 Connection - Analyzer database
+    :param target: String - Path the whiteout applies to, a directory ending in "/" for opaque whiteouts
+    :param opaque: Boolean - True if the whiteout hides the whole directory content
+    :return: Cursor - (path, layer, size) of every hidden file in every layer
+    """
+    # A plain whiteout removes either the file itself or a whole directory
+    prefix = target if opaque else target + "/"
+    if not prefix:
+        return database.execute("SELECT path, layer, size FROM files")
+
+    # Every path under the prefix sorts between the prefix and the prefix with its trailing "/" replaced by "0"
+    return database.execute("SELECT path, layer, size FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+                            (target, prefix, prefix[:-1] + "0"))
+
+
+def build_image_report(image_manifest, state, top):
+    """
+    Build the report for a single image of the archive
+    :param image_manifest: Dict - Entry of the docker save manifest.json
+    :param state: Dict - Analyzer state returned by stream_archive
+    :param top: Integer - Number of entries to report in each list
+    :return: Dict - Image report
+    """
+    layer_names = [normalize_path(layer) for layer in image_manifest.get("Layers", [])]
+    layer_index = {name: index for index, name in enumerate(layer_names)}
+
+    layers = []
+    largest = []
+    directories = {}
+    for name in layer_names:
+        stats = state["layers"].get(name, new_layer_stats())
+        layers.append({
+            "layer": name,
+            "size": stats["size"],
+            "files": stats["files"],
+            "whiteouts": stats["whiteouts"]
+        })
+        largest.extend((size, path, name) for size, path in stats["largest"])
+        for prefix, size in stats["directories"].items():
+            directories[prefix] = directories.get(prefix, 0) + size
+
+    database = state["database"]
+
+    # Files written in more than one layer ship their bytes once per layer, only the top ones and the totals are kept
+    duplicates = []
+    duplicate_count = 0
+    duplicate_bytes = 0
+    rows = database.execute("SELECT path, layer, size FROM files WHERE path IN (SELECT path FROM files GROUP BY path HAVING COUNT(*) > 1) ORDER BY path")
+    for path, group in itertools.groupby(rows, key=lambda row: row[0]):
+        entries = sorted((layer_index[layer], layer, size) for _, layer, size in group if layer in layer_index)
+        if len(entries) < 2:
+            continue
+        wasted_bytes = sum(size for _, _, size in entries[:-1])
+        duplicate_count += 1
+        duplicate_bytes += wasted_bytes
+        push_bounded(duplicates, (wasted_bytes, path, [layer for _, layer, _ in entries]), top)
+
+    # Files removed by a whiteout in an upper layer still ship in the lower layer
+    whited_out = []
+    whited_out_count = 0
+    whited_out_bytes = 0
+    for whiteout_layer, target, opaque in database.execute("SELECT layer, target, opaque FROM whiteouts"):
+        if whiteout_layer not in layer_index:
+            continue
+        for path, layer, size in get_hidden_files(database, target, bool(opaque)):
+            if layer in layer_index and layer_index[layer] < layer_index[whiteout_layer]:
+                whited_out_count += 1
+                whited_out_bytes += size
+                push_bounded(whited_out, (size, path, layer, whiteout_layer), top)
+
+    return {
+        "tags": image_manifest.get("RepoTags") or [],
+        "config": image_manifest.get("Config"),
+        "total_size": sum(layer["size"] for layer in layers),
+        "layers": layers,
+        "largest_files": [{"path": path, "size": size, "layer": layer} for size, path, layer in heapq.nlargest(top, largest)],
+        "duplicate_files": [{"path": path, "layers": layers, "wasted_bytes": wasted_bytes} for wasted_bytes, path, layers in sorted(duplicates, reverse=True)],
+        "duplicate_count": duplicate_count,
+        "duplicate_bytes": duplicate_bytes,
+        "whited_out_files": [{"path": path, "layer": layer, "size": size, "removed_by": removed_by} for size, path, layer, removed_by in sorted(whited_out, reverse=True)],
+        "whited_out_count": whited_out_count,
+        "whited_out_bytes": whited_out_bytes,
+        "directories": dict(sorted(directories.items()))
+    }
+
+
+def analyze_archive(archive_path, top=25, depth=4):
+    """
+    Analyze a docker save archive
+    :param archive_path: String - Path to the archive, "-" to read from stdin
+    :param top: Integer - Number of entries to report in each list
+    :param depth: Integer - Directory depth used for the directory summary
+    :return: Dict - Archive report with one entry per image
+    """
+    LOGGER.info("Analyzing {archive}.......".format(archive=archive_path))
+    with tempfile.TemporaryDirectory(prefix="image_layer_analyzer.") as spill_dir:
+        database = sqlite3.connect(os.path.join(spill_dir, "paths.db"))
+        try:
+            state = stream_archive(archive_path=archive_path, database=database, top=top, depth=depth)
+
+            return {
+                "archive": archive_path,
+                "images": [build_image_report(image_manifest, state, top) for image_manifest in state["manifest"]]
+            }
+        finally:
+            database.close()
+
+
+def get_variant_key(tag):
+    """
+    Get the key used to pair slim and full images of the same version/os
+    :param tag: String - Image tag, eg. adoptopenjdk/openjdk11:x86_64-ubuntu-jdk-11.0.11_9-slim
+    :return: Tuple - (Key without the slim suffix, Boolean True if slim)
+    """
+    if tag.endswith("-slim"):
+        return tag[:-len("-slim")], True
+    return tag, False
+
+
+def get_slim_full_deltas(archive_reports):
+    """
+    Compute the size delta between the slim and full variants of the same version/os
+    :param archive_reports: List - Archive reports returned by analyze_archive
+    :return: List - One delta entry per slim/full pair found
+    """
+    full_images = {}
+    slim_images = {}
+    for report in archive_reports:
+        for image in report["images"]:
+            for tag in image["tags"]:
+                key, slim = get_variant_key(tag)
+                if slim:
+                    slim_images[key] = (tag, image)
+                else:
+                    full_images[key] = (tag, image)
+
+    deltas = []
+    for key in sorted(slim_images):
+        if key not in full_images:
+            LOGGER.debug("No full image found for slim image {key}-slim".format(key=key))
+            continue
+        full_tag, full_image = full_images[key]
+        slim_tag, slim_image = slim_images[key]
+
+        directories = {}
+        for prefix in set(full_image["directories"]) | set(slim_image["directories"]):
+            delta = slim_image["directories"].get(prefix, 0) - full_image["directories"].get(prefix, 0)
+            if delta != 0:
+                directories[prefix] = delta
+
+        deltas.append({
+            "full": full_tag,
+            "slim": slim_tag,
+            "full_size": full_image["total_size"],
+            "slim_size": slim_image["total_size"],
+            "size_delta": slim_image["total_size"] - full_image["total_size"],
+            "directories": dict(sorted(directories.items(), key=lambda item: item[1]))
+        })
+
+    return deltas
+
+
+def get_args():
+    """
+    Processes and handles command line arguments
+    :return: Dict of command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Analyzes docker save archives for per layer size, largest, duplicated and whited-out files")
+    parser.add_argument("archives",
+                        help="docker save archives to analyze, '-' reads a single archive from stdin",
+                        nargs='+',
+                        type=str)
+    parser.add_argument("--top",
+                        help="Number of entries to report for the largest, duplicated and whited-out files",
+                        type=int,
+                        default=25)
+    parser.add_argument("--depth",
+                        help="Number of path components used to group files in the directory summary",
+                        type=int,
+                        default=4)
+    parser.add_argument("--output",
+                        help="File to write the JSON report to, defaults to stdout",
+                        type=str,
+                        default=None)
+    parser.add_argument("--debug",
+                        help="Enable Debug output",
+                        action="store_true",
+                        default=False)
+
+    return vars(parser.parse_args())
+
+
+def run(parsed_args):
+    """
+    Main function that takes in arguments and processes them
+    :param parsed_args: Dict of command line arguments
+    :return: None
+    """
+    archive_reports = [analyze_archive(archive_path=archive, top=parsed_args["top"], depth=parsed_args["depth"]) for archive in parsed_args["archives"]]
+
+    report = {
+        "archives": archive_reports,
+        "slim_full_deltas": get_slim_full_deltas(archive_reports)
+    }
+
+    if parsed_args["output"]:
+        with open(parsed_args["output"], "w") as output_file:
+            json.dump(report, output_file, indent=2)
+        LOGGER.info("Report written to {output}".format(output=parsed_args["output"]))
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    # Parse the arguments passed in
+    args = get_args()
+
+    # Log to stderr so the JSON report on stdout stays clean
+    logging.basicConfig(stream=sys.stderr, level=logging.DEBUG if args["debug"] else logging.INFO, format="%(message)s")
+
+    LOGGER.debug("Parsed arguments: " + str(args))
+    run(parsed_args=args)
@@ -0,0 +1,245 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import argparse
+import json
+import logging
+import sys
+
+
+LOGGER = logging.getLogger(__name__)
+
+TRACE_FILE = "pipeline_trace.json"
+
+
+def load_events(file_path):
+    """
+    Load the events of a trace file. The shell scripts only append to the file, so the closing bracket and the
+    trailing comma are allowed to be missing, like in the Chrome trace event format
+    :param file_path: String - Path of the trace file
+    :return: List - Trace events
+    """
+    with open(file_path) as trace_file:
+        content = trace_file.read().strip()
+
+    if content.startswith("{"):
+        return json.loads(content)["traceEvents"]
+
+    content = content.rstrip("]").rstrip().rstrip(",") + "]"
+    return json.loads(content)
+
+
+def new_span(event):
+    """
+    Create a span from a complete trace event
+    :param event: Dict - Trace event with ph X
+    :return: Dict - Span
+    """
+    return {
+        "name": event["name"],
+        "start": event["ts"],
+        "end": event["ts"] + event["dur"],
+        "duration": event["dur"],
+        "args": event.get("args", {}),
+        "children": []
+    }
+
+
+def build_span_tree(events):
+    """
+    Nest the spans of a trace by time, a span is the child of the innermost span that contains it
+    :param events: List - Trace events
+    :return: List - Root spans with their children
+    """
+    spans = [new_span(event) for event in events if event.get("ph") == "X"]
+    # Parents sort before their children as they start earlier or last longer
+    spans.sort(key=lambda span: (span["start"], -span["duration"]))
+
+    roots = []
+    stack = []
+    for span in spans:
+        while stack and span["start"] >= stack[-1]["end"]:
+            stack.pop()
+        if stack:
+            stack[-1]["children"].append(span)
+        else:
+            roots.append(span)
+        stack.append(span)
+
+    return roots
+
+
+def get_critical_path(roots):
+    """
+    Follow the longest span down to the longest child at every level. The pipeline runs its stages one after the
+    other, so this is where most of the time goes
+    :param roots: List - Root spans
+    :return: List - Spans on the critical path, outermost first
+    """
+    path = []
+    spans = roots
+    while spans:
+        longest = max(spans, key=lambda span: span["duration"])
+        path.append(longest)
+        spans = longest["children"]
+
+    return path
+
+
+def get_stage_stats(roots):
+    """
+    Get the total, self and maximum time of every stage. Self time excludes the time of the child spans
+    :param roots: List - Root spans
+    :return: List - Stage stats sorted by total time
+    """
+    stats = {}
+    stack = list(roots)
+    while stack:
+        span = stack.pop()
+        stack.extend(span["children"])
+        stage = stats.setdefault(span["name"], {"name": span["name"], "count": 0, "total": 0, "self": 0, "max": 0})
+        stage["count"] += 1
+        stage["total"] += span["duration"]
+        stage["self"] += span["duration"] - sum(child["duration"] for child in span["children"])
+        stage["max"] = max(stage["max"], span["duration"])
+
+    return sorted(stats.values(), key=lambda stage: stage["total"], reverse=True)
+
+
+def get_slowest_spans(roots, top):
+    """
+    Get the slowest spans that have no children, these are the individual builds, scans, pushes and tests
+    :param roots: List - Root spans
+    :param top: Integer - Number of spans
+    :return: List - Slowest spans
+    """
+    leaves = []
+    stack = list(roots)
+    while stack:
+        span = stack.pop()
+        if span["children"]:
+            stack.extend(span["children"])
+        else:
+            leaves.append(span)
+
+    return sorted(leaves, key=lambda span: span["duration"], reverse=True)[:top]
+
+
+def format_duration(microseconds):
+    """
+    Format a duration for the summary
+    :param microseconds: Integer - Duration in microseconds
+    :return: String - Duration, eg. 1h02m03s
+    """
+    seconds = microseconds / 1000000
+    if seconds < 60:
+        return "{seconds:.1f}s".format(seconds=seconds)
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return "{hours}h{minutes:02d}m{seconds:02d}s".format(hours=hours, minutes=minutes, seconds=seconds)
+    return "{minutes}m{seconds:02d}s".format(minutes=minutes, seconds=seconds)
+
+
+def format_args(args):
+    """
+    Format the attributes of a span for the summary
+    :param args: Dict - Attributes
+    :return: String - Attributes, eg. version=11 vm=hotspot
+    """
+    return " ".join("{key}={value}".format(key=key, value=value) for key, value in args.items())
+
+
+def print_summary(roots, top=10):
+    """
+    Print the critical path, the time per stage and the slowest spans of a trace
+    :param roots: List - Root spans
+    :param top: Integer - Number of slowest spans to print
+    :return: None
+    """
+    if not roots:
+        print("The trace has no spans")
+        return
+
+    total = max(span["end"] for span in roots) - min(span["start"] for span in roots)
+    print("Total time: {total}".format(total=format_duration(total)))
+
+    print("\nCritical path:")
+    for depth, span in enumerate(get_critical_path(roots)):
+        print("{name:<28} {duration:>10} {percent:5.1f}%  {args}".format(name="  " * depth + span["name"], duration=format_duration(span["duration"]), percent=100.0 * span["duration"] / total if total else 0, args=format_args(span["args"])))
+
+    print("\nStages by total time:")
+    print("{name:<20} {count:>6} {total:>10} {self:>10} {max:>10}".format(name="stage", count="count", total="total", self="self", max="max"))
+    for stage in get_stage_stats(roots):
+        print("{name:<20} {count:>6} {total:>10} {self:>10} {max:>10}".format(name=stage["name"], count=stage["count"], total=format_duration(stage["total"]), self=format_duration(stage["self"]), max=format_duration(stage["max"])))
+
+    print("\nSlowest steps:")
+    for span in get_slowest_spans(roots, top):
+        print("{name:<20} {duration:>10}  {args}".format(name=span["name"], duration=format_duration(span["duration"]), args=format_args(span["args"])))
+
+
+def close_trace(file_path):
+    """
+    Rewrite a trace file as a complete JSON document for viewers that do not accept an unterminated trace
+    :param file_path: String - Path of the trace file
+    :return: None
+    """
+    events = load_events(file_path)
+    with open(file_path, "w") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+def get_args():
+    """
+    Processes and handles command line arguments
+    :return: Dict of command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Summarizes the pipeline trace written by build_all.sh in the Chrome trace event format")
+    parser.add_argument("command",
+                        help="summary prints the critical path and the slowest stages, close turns the trace into a complete JSON document",
+                        type=str,
+                        choices=["summary", "close"])
+    parser.add_argument("file",
+                        help="Path of the trace file",
+                        type=str,
+                        nargs="?",
+                        default=TRACE_FILE)
+    parser.add_argument("--top",
+                        help="Number of slowest steps to print",
+                        type=int,
+                        default=10)
+
+    return vars(parser.parse_args())
+
+
+def run(parsed_args):
+    """
+    Main function that takes in arguments and processes them
+    :param parsed_args: Dict of command line arguments
+    :return: None
+    """
+    if parsed_args["command"] == "summary":
+        print_summary(build_span_tree(load_events(parsed_args["file"])), parsed_args["top"])
+    elif parsed_args["command"] == "close":
+        close_trace(parsed_args["file"])
+
+
+if __name__ == "__main__":
+    # Parse the arguments passed in
+    args = get_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
+
+    LOGGER.debug("Parsed arguments: " + str(args))
+    run(parsed_args=args)
@@ -0,0 +1,459 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import argparse
+import contextlib
+import json
+import logging
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# fcntl is not available on native Windows python, the state file is locked with msvcrt there
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+LOGGER = logging.getLogger(__name__)
+
+# HTTP status codes that mean the upstream wants us to slow down
+THROTTLE_STATUS_CODES = (429, 503)
+
+STATE_FILE = ".rate_limiter_state.json"
+
+
+def parse_retry_after(value, now=None):
+    """
+    Parse a Retry-After header
+    :param value: String - Header value, either seconds or an HTTP date
+    :param now: Datetime - Current UTC time, defaults to now
+    :return: Float - Seconds to wait, None if the header is missing or invalid
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        LOGGER.debug("Ignoring invalid Retry-After header: {value}".format(value=value))
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+class HostLimiter:
+    """
+    Token bucket for a single host. The refill rate and the number of requests in flight are adjusted with AIMD:
+    every successful response adds a little, every 429/503 response halves them.
+    """
+
+    def __init__(self, initial_rate=1.0, min_rate=0.1, max_rate=20.0, initial_concurrency=1.0, max_concurrency=16.0, rate_increase=0.1, decrease_factor=0.5):
+        """
+        :param initial_rate: Float - Requests per second to start with
+        :param min_rate: Float - Lowest rate the limiter backs off to
+        :param max_rate: Float - Highest rate the limiter grows to
+        :param initial_concurrency: Float - Requests in flight to start with
+        :param max_concurrency: Float - Highest number of requests in flight
+        :param rate_increase: Float - Requests per second added for each successful response
+        :param decrease_factor: Float - Factor the rate and concurrency are multiplied by on a throttled response
+        """
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.rate_increase = rate_increase
+        self.decrease_factor = decrease_factor
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.decreased = 0.0
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def _refill(self, now):
+        """
+        Add the tokens earned since the last update, the bucket holds at most one second worth of tokens
+        :param now: Float - Current monotonic time
+        :return: None
+        """
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def get_wait(self, now):
+        """
+        Get how long a request has to wait before it can be sent
+        :param now: Float - Current monotonic time
+        :return: Float - Seconds to wait, 0 if the request can be sent now
+        """
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1.0:
+            wait = max(wait, (1.0 - self.tokens) / self.rate)
+        return wait
+
+    def acquire(self):
+        """
+        Block until a request can be sent
+        :return: None
+        """
+        with self.condition:
+            while True:
+                if self.in_flight < max(1, int(self.concurrency)):
+                    wait = self.get_wait(time.monotonic())
+                    if wait <= 0:
+                        self.tokens -= 1.0
+                        self.in_flight += 1
+                        return
+                else:
+                    wait = None
+                self.condition.wait(wait)
+
+    def release(self, status_code=None, retry_after=None):
+        """
+        Record the response of a request sent after acquire
+        :param status_code: Integer - HTTP status code, None if the request failed without a response
+        :param retry_after: Float - Seconds from the Retry-After header
+        :return: None
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.update(status_code, retry_after)
+            self.condition.notify_all()
+
+    def update(self, status_code=None, retry_after=None):
+        """
+        Adjust the rate and concurrency for a response
+        :param status_code: Integer - HTTP status code, None if the request failed without a response
+        :param retry_after: Float - Seconds from the Retry-After header
+        :return: None
+        """
+        now = time.monotonic()
+        if status_code in THROTTLE_STATUS_CODES:
+            # Requests sent in the same burst are throttled together, only back off once per second
+            if now - self.decreased >= 1.0:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self.concurrency = max(1.0, self.concurrency * self.decrease_factor)
+                self.decreased = now
+            # Drop the tokens saved up so the next request waits for the new rate
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            LOGGER.debug("Throttled with HTTP status code {code}, rate is now {rate:.2f}/s".format(code=status_code, rate=self.rate))
+        elif status_code is not None and status_code < 500:
+            self.rate = min(self.max_rate, self.rate + self.rate_increase)
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+
+    def get_stats(self):
+        """
+        Get the current rate and concurrency
+        :return: Dict - Current stats
+        """
+        return {
+            "rate": round(self.rate, 3),
+            "concurrency": int(self.concurrency),
+            "in_flight": self.in_flight,
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 3)
+        }
+
+
+class RateLimiter:
+    """
+    Keeps one HostLimiter per host
+    """
+
+    def __init__(self, **host_options):
+        """
+        :param host_options: Options passed to every new HostLimiter
+        """
+        self.host_options = host_options
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def get_host_limiter(self, url):
+        """
+        Get the limiter of the host of a url
+        :param url: String - URL of the request
+        :return: HostLimiter
+        """
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostLimiter(**self.host_options)
+            return self.hosts[host]
+
+    @contextlib.contextmanager
+    def limit(self, url):
+        """
+        Context manager that waits for a free slot of the host and records the response.
+        Set the "status_code" and "retry_after" keys of the yielded dict once the response is in
+        :param url: String - URL of the request
+        :return: Dict - Response record
+        """
+        host_limiter = self.get_host_limiter(url)
+        host_limiter.acquire()
+        record = {"status_code": None, "retry_after": None}
+        try:
+            yield record
+        finally:
+            host_limiter.release(record["status_code"], record["retry_after"])
+
+    def get_rates(self):
+        """
+        Get the current stats of every host
+        :return: Dict - Stats keyed by host
+        """
+        with self.lock:
+            return {host: host_limiter.get_stats() for host, host_limiter in self.hosts.items()}
+
+
+def limited_request(rate_limiter, send, url, max_attempts=5):
+    """
+    Send a request through the rate limiter, retrying throttled responses
+    :param rate_limiter: RateLimiter
+    :param send: Function - Takes the url and returns a response with status_code and headers
+    :param url: String - URL of the request
+    :param max_attempts: Integer - Number of attempts before the throttled response is returned
+    :return: Response of the last attempt
+    """
+    for attempt in range(1, max_attempts + 1):
+        with rate_limiter.limit(url) as record:
+            response = send(url)
+            record["status_code"] = response.status_code
+            record["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
+
+        if response.status_code not in THROTTLE_STATUS_CODES:
+            return response
+        LOGGER.debug("Attempt {attempt} of {url} was throttled with HTTP status code {code}".format(attempt=attempt, url=url, code=response.status_code))
+
+    return response
+
+
+def lock_file(locked_file):
+    """
+    Take an exclusive lock of an open file, without fcntl or msvcrt the file is not locked
+    :param locked_file: File object
+    :return: None
+    """
+    if fcntl is not None:
+        fcntl.flock(locked_file, fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        # msvcrt locks a byte range from the current position and gives up after 10 seconds
+        locked_file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(locked_file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                LOGGER.debug("Waiting for the lock of {name}".format(name=locked_file.name))
+
+
+def unlock_file(locked_file):
+    """
+    Release the lock taken with lock_file
+    :param locked_file: File object
+    :return: None
+    """
+    if fcntl is not None:
+        fcntl.flock(locked_file, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        locked_file.flush()
+        locked_file.seek(0)
+        msvcrt.locking(locked_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def locked_state(state_file):
+    """
+    Load the shared limiter state of all processes, holding a lock until it is saved
+    :param state_file: String - Path of the state file
+    :return: Dict - State keyed by host, saved when the context exits
+    """
+    with open(state_file, "a+") as locked_file:
+        lock_file(locked_file)
+        try:
+            locked_file.seek(0)
+            content = locked_file.read()
+            state = json.loads(content) if content.strip() else {}
+            yield state
+            locked_file.seek(0)
+            locked_file.truncate()
+            json.dump(state, locked_file)
+        finally:
+            unlock_file(locked_file)
+
+
+def load_host_limiter(state, host, host_options):
+    """
+    Rebuild a HostLimiter from the state file. Times are stored as wall clock time as they are shared across processes
+    :param state: Dict - State keyed by host
+    :param host: String - Host name
+    :param host_options: Dict - Options for a new HostLimiter
+    :return: HostLimiter
+    """
+    host_limiter = HostLimiter(**host_options)
+    host_state = state.get(host)
+    if host_state:
+        offset = time.monotonic() - time.time()
+        host_limiter.rate = host_state["rate"]
+        host_limiter.concurrency = host_state["concurrency"]
+        host_limiter.tokens = host_state["tokens"]
+        host_limiter.updated = host_state["updated"] + offset
+        host_limiter.blocked_until = host_state["blocked_until"] + offset
+        host_limiter.decreased = host_state["decreased"] + offset
+    return host_limiter
+
+
+def save_host_limiter(state, host, host_limiter):
+    """
+    Store a HostLimiter in the state file
+    :param state: Dict - State keyed by host
+    :param host: String - Host name
+    :param host_limiter: HostLimiter
+    :return: None
+    """
+    offset = time.time() - time.monotonic()
+    state[host] = {
+        "rate": host_limiter.rate,
+        "concurrency": host_limiter.concurrency,
+        "tokens": host_limiter.tokens,
+        "updated": host_limiter.updated + offset,
+        "blocked_until": host_limiter.blocked_until + offset,
+        "decreased": host_limiter.decreased + offset
+    }
+
+
+def fetch(url, state_file=STATE_FILE, max_attempts=5, timeout=60, **host_options):
+    """
+    Fetch a url for the shell scripts, sharing the limiter state of the host with every other fetch
+    :param url: String - URL to fetch
+    :param state_file: String - Path of the state file
+    :param max_attempts: Integer - Number of attempts before giving up on throttled responses
+    :param timeout: Integer - Timeout of a request in seconds
+    :param host_options: Options for a new HostLimiter
+    :return: Tuple - (HTTP status code, body, response headers)
+    """
+    host = urlparse(url).netloc
+    status_code, body, headers = None, b"", {}
+
+    for attempt in range(1, max_attempts + 1):
+        # Reserve a token, then sleep outside the lock so other processes are not blocked
+        with locked_state(state_file) as state:
+            host_limiter = load_host_limiter(state, host, host_options)
+            wait = host_limiter.get_wait(time.monotonic())
+            host_limiter.tokens -= 1.0
+            save_host_limiter(state, host, host_limiter)
+        if wait > 0:
+            time.sleep(wait)
+
+        retry_after = None
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                status_code, body, headers = response.status, response.read(), response.headers
+        except urllib.error.HTTPError as error:
+            status_code, body, headers = error.code, error.read(), error.headers
+            retry_after = parse_retry_after(error.headers.get("Retry-After"))
+
+        with locked_state(state_file) as state:
+            host_limiter = load_host_limiter(state, host, host_options)
+            host_limiter.update(status_code, retry_after)
+            save_host_limiter(state, host, host_limiter)
+
+        if status_code not in THROTTLE_STATUS_CODES:
+            break
+        LOGGER.info("Attempt {attempt} of {url} was throttled with HTTP status code {code}".format(attempt=attempt, url=url, code=status_code))
+
+    return status_code, body, headers
+
+
+def get_args():
+    """
+    Processes and handles command line arguments
+    :return: Dict of command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Adaptive per host rate limiter shared by the scanner and the release metadata fetchers")
+    parser.add_argument("--state-file",
+                        help="File the limiter state is shared through",
+                        type=str,
+                        default=STATE_FILE)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = subparsers.add_parser("fetch", help="Fetch a url through the limiter and print the body, like curl -Ls")
+    fetch_parser.add_argument("url", help="URL to fetch", type=str)
+    fetch_parser.add_argument("--output", "-o", help="Write the body to this file instead of stdout", type=str, default=None)
+    fetch_parser.add_argument("--header", help="Print this response header instead of the body, eg. Last-Modified", type=str, default=None)
+    fetch_parser.add_argument("--initial-rate", help="Requests per second for a new host", type=float, default=1.0)
+    fetch_parser.add_argument("--max-rate", help="Highest requests per second for a host", type=float, default=20.0)
+    fetch_parser.add_argument("--max-attempts", help="Attempts before giving up on throttled responses", type=int, default=5)
+
+    subparsers.add_parser("status", help="Print the current rate of every host")
+
+    return vars(parser.parse_args())
+
+
+def run(parsed_args):
+    """
+    Main function that takes in arguments and processes them
+    :param parsed_args: Dict of command line arguments
+    :return: Integer - Exit code
+    """
+    if parsed_args["command"] == "status":
+        with locked_state(parsed_args["state_file"]) as state:
+            print(json.dumps({host: {"rate": round(host_state["rate"], 3), "concurrency": int(host_state["concurrency"])} for host, host_state in state.items()}, indent=2))
+        return 0
+
+    try:
+        status_code, body, headers = fetch(parsed_args["url"], state_file=parsed_args["state_file"], max_attempts=parsed_args["max_attempts"], initial_rate=parsed_args["initial_rate"], max_rate=parsed_args["max_rate"])
+    except (urllib.error.URLError, OSError) as error:
+        LOGGER.error("ERROR: Failed to fetch {url}: {error}".format(url=parsed_args["url"], error=error))
+        return 1
+
+    LOGGER.debug("HTTP Status Code: {code}".format(code=status_code))
+    if parsed_args["header"]:
+        print(headers.get(parsed_args["header"], ""))
+    elif parsed_args["output"]:
+        with open(parsed_args["output"], "wb") as output_file:
+            output_file.write(body)
+    else:
+        sys.stdout.buffer.write(body)
+    return 0
+
+
+if __name__ == "__main__":
+    # Parse the arguments passed in
+    args = get_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
+
+    LOGGER.debug("Parsed arguments: " + str(args))
+    sys.exit(run(parsed_args=args))
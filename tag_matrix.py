@@ -0,0 +1,342 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import argparse
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+
+import build_metadata
+
+
+LOGGER = logging.getLogger(__name__)
+
+TAGS_CONFIG_FILE = "config/tags.config"
+MATRIX_FILE = "tag_matrix.json"
+MATRIX_BASH_FILE = "tag_matrix.sh"
+
+
+def matrix_key(vm, version, package, os_name, build, btype):
+    """
+    Get the key of a combination in the tag matrix
+    :param vm: String - Name of JVM - (hotspot/openj9)
+    :param version: String - Java version
+    :param package: String - Name of package - (jdk/jre)
+    :param os_name: String - Name of OS
+    :param build: String - Name of build - (releases/nightly)
+    :param btype: String - Build type - (full/slim)
+    :return: String - Key, eg. hotspot/11/jdk/ubuntu/releases/full
+    """
+    return "/".join([vm, version, package, os_name, build, btype])
+
+
+def parse_vm_config(vm, config_dir="config"):
+    """
+    Parse the openj9.config / hotspot.config file into a list of entries
+    :param vm: String - Name of JVM
+    :param config_dir: String - Directory of the config files
+    :return: List - One dict per Directory entry of the config file
+    """
+    entries = []
+    entry = {}
+    with open(os.path.join(config_dir, "{vm}.config".format(vm=vm))) as config_file:
+        for line in config_file:
+            line = line.strip()
+            if not line or line.startswith("#") or ":" not in line:
+                continue
+            name, value = line.split(":", 1)
+            entry[name] = value.split()
+            # The Directory line closes an entry
+            if name == "Directory":
+                directory = entry["Directory"][0].split("/")
+                entries.append({
+                    "version": directory[0],
+                    "package": directory[1],
+                    "os": directory[-1],
+                    "os_family": " ".join(entry.get("OS_Family", [])),
+                    "builds": entry.get("Build", []),
+                    "types": entry.get("Type", []),
+                    "architectures": entry.get("Architectures", [])
+                })
+                entry = {}
+
+    return entries
+
+
+def parse_tags_config(file_path=TAGS_CONFIG_FILE):
+    """
+    Parse the tags.config file
+    :param file_path: String - Path of the tags.config file
+    :return: Dict - Raw tags keyed by "os-package-build-type"
+    """
+    tags = {}
+    with open(file_path) as tags_file:
+        for line in tags_file:
+            line = line.strip()
+            if line.startswith("#") or "-tags:" not in line:
+                continue
+            name, raw_tags = line.split("-tags:", 1)
+            tags[name] = raw_tags.strip()
+
+    return tags
+
+
+def expand_tags(raw_tags, release, os_name, package, build, arches, supported_arches):
+    """
+    Expand the raw tags of tags.config into the arch specific tags and the tag aliases.
+    This is the same expansion build_tags in common_functions.sh does
+    :param raw_tags: String - Space separated raw tags
+    :param release: String - Release version, eg. jdk-11.0.11_9
+    :param os_name: String - Name of OS
+    :param package: String - Name of package
+    :param build: String - Name of build
+    :param arches: List - Arches of the config file entry, in config order
+    :param supported_arches: Set - Arches that have a build available
+    :return: Tuple - (List of arch tags, List of tag aliases)
+    """
+    # For jre builds, replace the version tag to distinguish it from the jdk
+    if package == "jre":
+        release = release.replace("jdk", "jre")
+
+    tags = re.sub(r"{{ JDK_" + re.escape(build) + r"_VER }}", lambda match: release, raw_tags, flags=re.IGNORECASE)
+    tags = re.sub(r"{{ OS }}", lambda match: os_name, tags, flags=re.IGNORECASE)
+    tags = re.sub(r"{{ *ARCH *}}", "{{ARCH}}", tags, count=1)
+
+    arch_tags = []
+    tag_aliases = []
+    for tag in tags.split():
+        if "ARCH" not in tag:
+            tag_aliases.append(tag)
+            continue
+        for arch in arches:
+            if arch.startswith("windows"):
+                arch = "x86_64"
+            # Check if all the supported arches are available for this build.
+            if not any(arch in supported for supported in supported_arches):
+                continue
+            arch_tags.append(tag.replace("{{ARCH}}", arch))
+
+    return arch_tags, tag_aliases
+
+
+def get_release(metadata, vm, version, package, build, os_family, arch=None):
+    """
+    Get the release version used in the tags, the same way the scripts read it from the shasums arrays
+    :param metadata: Dict - Build metadata document
+    :param vm: String - Name of JVM
+    :param version: String - Java version
+    :param package: String - Name of package
+    :param build: String - Name of build
+    :param os_family: String - Name of OS family
+    :param arch: String - Use the version of this arch instead of the build version if set
+    :return: String - Release with "+" replaced by "_", empty if the build is unknown
+    """
+    if arch is None:
+        release = build_metadata.get_field(metadata, version, vm, package, build, "full_version")
+    else:
+        release = build_metadata.get_field(metadata, version, vm, package, build, "version", os_family, arch)
+
+    # Docker image tags cannot have "+" in them, replace it with "_" instead.
+    return release.replace("+", "_")
+
+
+def generate_matrix(metadata, vms, tags_config, config_dir="config", arch=None, versions=None, packages=None):
+    """
+    Compute the arch tags and tag aliases of every vm/version/package/os/build/type combination in one pass
+    :param metadata: Dict - Build metadata document
+    :param vms: List - Names of the JVMs
+    :param tags_config: Dict - Raw tags returned by parse_tags_config
+    :param config_dir: String - Directory of the config files
+    :param arch: String - Use the release version of this arch instead of the build version if set
+    :param versions: List - Only include these versions if set
+    :param packages: List - Only include these packages if set
+    :return: Dict - Matrix entries keyed by matrix_key
+    """
+    matrix = {}
+    for vm in vms:
+        for entry in parse_vm_config(vm, config_dir):
+            if versions and entry["version"] not in versions:
+                continue
+            if packages and entry["package"] not in packages:
+                continue
+            for build in entry["builds"]:
+                release = get_release(metadata, vm, entry["version"], entry["package"], build, entry["os_family"], arch)
+                if not release:
+                    continue
+                supported_arches = set(build_metadata.get_arches(metadata, entry["version"], vm, entry["package"], build)) & set(entry["architectures"])
+                for btype in entry["types"]:
+                    raw_tags = tags_config.get("-".join([entry["os"], entry["package"], build, btype]), "")
+                    arch_tags, tag_aliases = expand_tags(raw_tags, release, entry["os"], entry["package"], build, entry["architectures"], supported_arches)
+                    matrix[matrix_key(vm, entry["version"], entry["package"], entry["os"], build, btype)] = {
+                        "vm": vm,
+                        "version": entry["version"],
+                        "package": entry["package"],
+                        "os": entry["os"],
+                        "build": build,
+                        "type": btype,
+                        "release": release,
+                        "arch_tags": arch_tags,
+                        "tag_aliases": tag_aliases
+                    }
+
+    return matrix
+
+
+def generate_bash(matrix):
+    """
+    Generate the bash arrays the scripts source to look up the tags of a combination
+    :param matrix: Dict - Matrix entries keyed by matrix_key
+    :return: String - Bash script declaring matrix_arch_tags and matrix_tag_aliases
+    """
+    lines = []
+    for array, field in (("matrix_arch_tags", "arch_tags"), ("matrix_tag_aliases", "tag_aliases")):
+        # -g so the arrays stay global when sourced from within a function
+        lines.append("declare -gA {array}=(".format(array=array))
+        for key, entry in matrix.items():
+            lines.append("\t[{key}]=\"{tags}\"".format(key=key, tags=" ".join(entry[field])))
+        lines.append(")")
+
+    return "\n".join(lines) + "\n"
+
+
+def run_build_tags(matrix, vms, sums_dir="."):
+    """
+    Run build_tags from common_functions.sh for every combination of the matrix
+    :param matrix: Dict - Matrix entries keyed by matrix_key
+    :param vms: List - Names of the JVMs
+    :param sums_dir: String - Directory of the ${vm}_shasums_latest.sh files
+    :return: Dict - (arch tags, tag aliases) keyed by matrix_key
+    """
+    script = ["source ./common_functions.sh"]
+    for vm in vms:
+        sums_file = os.path.join(sums_dir, "{vm}_shasums_latest.sh".format(vm=vm))
+        script.append("[ -f '{sums_file}' ] && source '{sums_file}'".format(sums_file=sums_file))
+    for key, entry in matrix.items():
+        script.append("shasums={package}_{vm}_{version}_{build}_sums".format(**entry))
+        script.append("build_tags {vm} {version} {package} '{release}' {os} {build} \"$(parse_tag_entry {os} {package} {build} {type})\"".format(**entry))
+        script.append("echo \"{key}|${{arch_tags}}|${{tag_aliases}}\"".format(key=key))
+
+    output = subprocess.run(["bash", "-s"], input="\n".join(script), check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+    results = {}
+    for line in output.splitlines():
+        if line.count("|") != 2:
+            continue
+        key, arch_tags, tag_aliases = line.split("|")
+        results[key] = (arch_tags.split(), tag_aliases.split())
+
+    return results
+
+
+def verify_matrix(matrix, vms, sums_dir="."):
+    """
+    Golden check of the matrix against the output of build_tags.
+    Arch tags must match in order. awk does not keep the order of the tag aliases, so they are compared as sets
+    :param matrix: Dict - Matrix entries keyed by matrix_key
+    :param vms: List - Names of the JVMs
+    :param sums_dir: String - Directory of the ${vm}_shasums_latest.sh files
+    :return: List - Keys of the combinations that do not match
+    """
+    golden = run_build_tags(matrix, vms, sums_dir)
+
+    mismatches = []
+    for key, entry in matrix.items():
+        arch_tags, tag_aliases = golden.get(key, ([], []))
+        if entry["arch_tags"] != arch_tags or sorted(entry["tag_aliases"]) != sorted(tag_aliases):
+            LOGGER.error("Tag matrix mismatch for {key}:\n  build_tags: {golden_arch} | {golden_aliases}\n  tag_matrix: {arch} | {aliases}".format(key=key, golden_arch=" ".join(arch_tags), golden_aliases=" ".join(tag_aliases), arch=" ".join(entry["arch_tags"]), aliases=" ".join(entry["tag_aliases"])))
+            mismatches.append(key)
+
+    LOGGER.info("Verified {number} combinations, {bad} mismatches".format(number=len(matrix), bad=len(mismatches)))
+    return mismatches
+
+
+def get_args():
+    """
+    Processes and handles command line arguments
+    :return: Dict of command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Expands tags.config into the arch tags and tag aliases of every image in one pass")
+    parser.add_argument("command",
+                        help="generate writes the matrix, verify checks it against build_tags in common_functions.sh",
+                        type=str,
+                        choices=["generate", "verify"])
+    parser.add_argument("--vms",
+                        help="Name of the JVMs",
+                        nargs='+',
+                        type=str,
+                        choices=["hotspot", "openj9"],
+                        default=["hotspot", "openj9"])
+    parser.add_argument("--versions",
+                        help="Only include these Java Versions",
+                        nargs='+',
+                        type=str,
+                        default=None)
+    parser.add_argument("--packages",
+                        help="Only include these Packages",
+                        nargs='+',
+                        type=str,
+                        choices=["jdk", "jre"],
+                        default=None)
+    parser.add_argument("--arch",
+                        help="Use the release version of this arch for the tags instead of the version of the build",
+                        type=str,
+                        default=None)
+    parser.add_argument("--metadata-file",
+                        help="Path to the build metadata file",
+                        type=str,
+                        default=build_metadata.METADATA_FILE)
+    parser.add_argument("--output",
+                        help="Path to write the JSON matrix to",
+                        type=str,
+                        default=MATRIX_FILE)
+    parser.add_argument("--bash-output",
+                        help="Path to write the bash arrays to",
+                        type=str,
+                        default=MATRIX_BASH_FILE)
+
+    return vars(parser.parse_args())
+
+
+def run(parsed_args):
+    """
+    Main function that takes in arguments and processes them
+    :param parsed_args: Dict of command line arguments
+    :return: Integer - Exit code
+    """
+    metadata = build_metadata.load_metadata(parsed_args["metadata_file"])
+    matrix = generate_matrix(metadata=metadata, vms=parsed_args["vms"], tags_config=parse_tags_config(), arch=parsed_args["arch"], versions=parsed_args["versions"], packages=parsed_args["packages"])
+
+    if parsed_args["command"] == "verify":
+        return 1 if verify_matrix(matrix, parsed_args["vms"]) else 0
+
+    with open(parsed_args["output"], "w") as matrix_file:
+        json.dump({"entries": matrix}, matrix_file, indent=2)
+        matrix_file.write("\n")
+    with open(parsed_args["bash_output"], "w") as bash_file:
+        bash_file.write(generate_bash(matrix))
+    LOGGER.info("Tag matrix with {number} combinations written to {output}".format(number=len(matrix), output=parsed_args["output"]))
+    return 0
+
+
+if __name__ == "__main__":
+    # Parse the arguments passed in
+    args = get_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(message)s")
+
+    LOGGER.debug("Parsed arguments: " + str(args))
+    sys.exit(run(parsed_args=args))
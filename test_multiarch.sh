@@ -58,10 +58,12 @@ function run_tests() {
 	local img=$1
 	local rel=$2
 
+	trace_begin test_image image="${img}"
 	grep -v '^#' < "${test_buckets_file}" | while IFS= read -r test_case
 	do
 		${test_case} "${img}" "${rel}"
 	done
+	trace_end
 }
 
 # Run tests on all the alias docker tags.
@@ -154,6 +156,10 @@ if [ "${vm}" == "openj9" ] && [ -f openj9_shasums_latest.sh ]; then
 	available_jvms="${available_jvms} openj9"
 fi
 
+# Expand the tags for all the os / build / type combinations in one go,
+# using the release version of the current arch like the loop below
+load_tag_matrix --vms "${vm}" --versions "${version}" --packages "${package}" --arch "${current_arch}"
+
 # Go through each vm / os / build / type combination and build the manifest commands
 # vm    = hotspot / openj9
 # os    = alpine / ubuntu
@@ -189,10 +195,8 @@ do
 		for btype in ${btypes}
 		do
 			echo -n "INFO: Building tag list for [${vm}]-[${os}]-[${build}]-[${btype}]..."
-			# Get the relevant tags for this vm / os / build / type combo from the tags.config file.
-			raw_tags=$(parse_tag_entry "${os}" "${package}" "${build}" "${btype}")
-			# Build tags will build both the arch specific tags and the tag aliases.
-			build_tags "${vm}" "${version}" "${package}" "${rel}" "${os}" "${build}" "${raw_tags}"
+			# The tag matrix has both the arch specific tags and the tag aliases.
+			matrix_tags "${vm}" "${version}" "${package}" "${os}" "${build}" "${btype}"
 			echo "done"
 			# Test both the arch specific tags and the tag aliases.
 			test_image_types "${srepo}" "${rel}"
@@ -0,0 +1,196 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import logging
+import sqlite3
+import statistics
+
+
+LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    verify TEXT NOT NULL,
+    shard TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+
+CREATE TABLE IF NOT EXISTS tag_results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    repo TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    last_updated TEXT,
+    arches TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tag_results_repo_tag ON tag_results (repo, tag, run_id);
+CREATE INDEX IF NOT EXISTS tag_results_verdict ON tag_results (verdict, run_id);
+
+CREATE TABLE IF NOT EXISTS arch_results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    repo TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    arch TEXT NOT NULL,
+    expected INTEGER NOT NULL,
+    present INTEGER NOT NULL,
+    last_pushed TEXT
+);
+CREATE INDEX IF NOT EXISTS arch_results_repo_tag ON arch_results (repo, tag, arch, run_id);
+CREATE INDEX IF NOT EXISTS arch_results_last_pushed ON arch_results (last_pushed);
+CREATE INDEX IF NOT EXISTS arch_results_run ON arch_results (repo, tag, run_id);
+
+CREATE TABLE IF NOT EXISTS request_timings (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    repo TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    request TEXT NOT NULL,
+    status_code INTEGER,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS request_timings_run ON request_timings (run_id);
+"""
+
+
+def connect(file_path):
+    """
+    Open the history database, creating the tables and indexes if needed
+    :param file_path: String - Path of the SQLite database
+    :return: sqlite3 Connection
+    """
+    connection = sqlite3.connect(file_path)
+    connection.row_factory = sqlite3.Row
+    # WAL lets the query commands read while a scan is appending
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def record_run(connection, started_at, verify_type, shard, tag_results, arch_results, request_timings):
+    """
+    Append the results of a scan in a single transaction
+    :param connection: sqlite3 Connection
+    :param started_at: Datetime Object - UTC start time of the scan
+    :param verify_type: String - Verify value of the scan - (all/timedelta/manifests/images)
+    :param shard: String - Shard of the scan, eg. 0/1
+    :param tag_results: List of dicts with repo, tag, verdict, last_updated and arches
+    :param arch_results: List of dicts with repo, tag, arch, expected, present and last_pushed
+    :param request_timings: List of dicts with repo, tag, request, status_code and duration
+    :return: Integer - Id of the run
+    """
+    with connection:
+        cursor = connection.execute("INSERT INTO runs (started_at, verify, shard) VALUES (?, ?, ?)", (started_at.strftime("%Y-%m-%dT%H:%M:%S.%fZ"), verify_type, shard))
+        run_id = cursor.lastrowid
+        connection.executemany("INSERT INTO tag_results (run_id, repo, tag, verdict, last_updated, arches) VALUES (?, ?, ?, ?, ?, ?)",
+                               [(run_id, row["repo"], row["tag"], row["verdict"], row["last_updated"], row["arches"]) for row in tag_results])
+        connection.executemany("INSERT INTO arch_results (run_id, repo, tag, arch, expected, present, last_pushed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               [(run_id, row["repo"], row["tag"], row["arch"], row["expected"], row["present"], row["last_pushed"]) for row in arch_results])
+        connection.executemany("INSERT INTO request_timings (run_id, repo, tag, request, status_code, duration) VALUES (?, ?, ?, ?, ?, ?)",
+                               [(run_id, row["repo"], row["tag"], row["request"], row["status_code"], row["duration"]) for row in request_timings])
+
+    LOGGER.debug("Recorded run {run_id} with {tags} tags in the history".format(run_id=run_id, tags=len(tag_results)))
+    return run_id
+
+
+def get_old_tags(connection, min_runs):
+    """
+    Get the tags that have been old in every run since their last good verdict
+    :param connection: sqlite3 Connection
+    :param min_runs: Integer - Minimum number of old runs in a row
+    :return: List of dicts with repo, tag, old_runs and old_since
+    """
+    rows = connection.execute("""
+        SELECT results.repo, results.tag, COUNT(*) AS old_runs, MIN(runs.started_at) AS old_since
+        FROM tag_results AS results
+        JOIN runs ON runs.id = results.run_id
+        WHERE results.verdict = 'old'
+          AND results.run_id > COALESCE((SELECT MAX(previous.run_id) FROM tag_results AS previous
+                                         WHERE previous.repo = results.repo AND previous.tag = results.tag
+                                           AND previous.verdict != 'old'), 0)
+        GROUP BY results.repo, results.tag
+        HAVING COUNT(*) >= ?
+        ORDER BY old_runs DESC, results.repo, results.tag
+    """, (min_runs,))
+    return [dict(row) for row in rows]
+
+
+def get_publish_latency(connection, runs=100):
+    """
+    Get the median time each arch is pushed after the first arch of the same manifest update. The arches of an update
+    are the ones pushed since the manifest update seen by the previous good run of the tag, so an arch that was not
+    pushed again does not count as the first arch. Every push is only counted once, no matter in how many runs it was seen
+    :param connection: sqlite3 Connection
+    :param runs: Integer - Number of the latest runs to look at
+    :return: Dict - Median latency in seconds and the number of pushes keyed by arch
+    """
+    rows = connection.execute("""
+        WITH updates AS (
+            SELECT results.run_id, results.repo, results.tag,
+                   (SELECT previous.last_updated FROM tag_results AS previous
+                    WHERE previous.repo = results.repo AND previous.tag = results.tag AND previous.run_id < results.run_id
+                      AND previous.verdict = 'ok'
+                    ORDER BY previous.run_id DESC LIMIT 1) AS previous_update
+            FROM tag_results AS results
+            WHERE results.run_id > (SELECT COALESCE(MAX(id), 0) - ? FROM runs)
+        ),
+        pushes AS (
+            SELECT results.run_id, results.repo, results.tag, results.arch, results.last_pushed
+            FROM updates
+            JOIN arch_results AS results ON results.repo = updates.repo AND results.tag = updates.tag AND results.run_id = updates.run_id
+            WHERE julianday(results.last_pushed) > julianday(updates.previous_update)
+        ),
+        firsts AS (
+            SELECT run_id, repo, tag, MIN(julianday(last_pushed)) AS first_pushed
+            FROM pushes
+            GROUP BY run_id, repo, tag
+        )
+        SELECT pushes.arch, ROUND((julianday(pushes.last_pushed) - MIN(firsts.first_pushed)) * 86400, 3) AS latency
+        FROM pushes
+        JOIN firsts ON firsts.run_id = pushes.run_id AND firsts.repo = pushes.repo AND firsts.tag = pushes.tag
+        GROUP BY pushes.repo, pushes.tag, pushes.arch, pushes.last_pushed
+    """, (runs,))
+
+    latencies = {}
+    for row in rows:
+        latencies.setdefault(row["arch"], []).append(row["latency"])
+
+    return {arch: {"median_seconds": statistics.median(values), "pushes": len(values)} for arch, values in sorted(latencies.items())}
+
+
+def get_arch_changes(connection, repo, tag, arch):
+    """
+    Get the runs in which an arch appeared in or disappeared from a manifest
+    :param connection: sqlite3 Connection
+    :param repo: String - Name of the docker repo, eg. openjdk11
+    :param tag: String - Name of the tag
+    :param arch: String - Docker name of the arch, eg. s390x
+    :return: List of dicts with started_at, run_id and change(lost/added)
+    """
+    rows = connection.execute("""
+        SELECT results.run_id, runs.started_at, results.present
+        FROM arch_results AS results
+        JOIN runs ON runs.id = results.run_id
+        WHERE results.repo = ? AND results.tag = ? AND results.arch = ?
+        ORDER BY results.run_id
+    """, (repo, tag, arch))
+
+    changes = []
+    previous = None
+    for row in rows:
+        if previous is not None and row["present"] != previous:
+            changes.append({"run_id": row["run_id"], "started_at": row["started_at"], "change": "added" if row["present"] else "lost"})
+        previous = row["present"]
+
+    return changes
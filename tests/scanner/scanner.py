@@ -15,21 +15,86 @@
 import requests
 import json
 import copy
+import csv
+import hashlib
 import argparse
 import logging
+import os
+import shlex
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
 from logging import config
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 
+# The rate limiter is in the root of the repo as the build scripts use it too
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from rate_limiter import RateLimiter, limited_request  # noqa: E402
+import scan_history
 
-LOGGER = logging.getLogger(__name__)
 
+LOGGER = logging.getLogger(__name__)
 
-def load_logging_config(debug, file_path):
+# Shared by every DockerHub request so the rate and concurrency adapt to the throttling of the whole scan
+RATE_LIMITER = RateLimiter(initial_rate=5.0, max_rate=50.0, max_concurrency=16.0)
+
+# Upper bound of worker threads, the rate limiter decides how many requests are actually in flight
+MAX_WORKERS = 16
+
+# Timings of the DockerHub requests and the image JSON of each repo and tag, kept for the history database
+REQUEST_TIMINGS = []
+IMAGE_JSONS = {}
+
+# Tags per page of the DockerHub tags list and the number of pages read per repo before falling back to the tag endpoint
+TAGS_PAGE_SIZE = 100
+MAX_TAGS_PAGES = 5
+
+# Image options used when the images are not generated from a Dockerfile index
+DEFAULT_VERSIONS = ["8", "11", "14"]
+DEFAULT_OSS = ["alpine", "debian", "debianslim", "ubi", "ubi-minimal", "centos", "clefos", "ubuntu"]
+
+IMAGE_TEMPLATE = {
+    "version": "",
+    "jvm": "",
+    "arch": "",
+    "os": "",
+    "package": "",
+    "build": "",
+    "tag": ""
+}
+
+IMAGES_TEMPLATE = {
+    "filtered_images": [],
+    "package_and_build": [],
+    "os_and_arch": [],
+    "jvm_and_arch": [],
+    "bad_requests": [],
+    "bad_manifests": [],
+    "old_images": []
+}
+
+# Outcome of the images in each bucket for the reports
+BUCKET_STATUS = {
+    "filtered_images": "passed",
+    "package_and_build": "skipped",
+    "os_and_arch": "skipped",
+    "jvm_and_arch": "skipped",
+    "bad_requests": "failed",
+    "bad_manifests": "failed",
+    "old_images": "failed"
+}
+
+REPORT_FIELDS = ["bucket", "status", "image", "version", "jvm", "arch", "os", "package", "build", "tag", "digest", "last_updated"]
+
+
+def load_logging_config(debug, file_path, report_to_stdout=False):
     """
     Loads and configures a logging config
     :param debug: True or False if debugging for console should be turned on
     :param file_path: File path to storage the log file
+    :param report_to_stdout: True if the report is written to stdout, the console then logs to stderr
     :return: None
     """
     logging_config = {
@@ -63,7 +128,7 @@ def load_logging_config(debug, file_path):
                 "level": "DEBUG",
                 "handlers": ["file"]
             },
-            "__main__": {
+            LOGGER.name: {
                 "level": "DEBUG",
                 "handlers": ["console"],
                 "propagate": True
@@ -75,6 +140,10 @@ def load_logging_config(debug, file_path):
     if debug:
         logging_config["handlers"]["console"]["formatter"] = "debugFormater"
 
+    # Keep stdout for the report only, so it can be piped to a parser
+    if report_to_stdout:
+        logging_config["handlers"]["console"]["stream"] = "ext://sys.stderr"
+
     # If a file path is passed in then hadnle the prefix and append the file name
     if file_path:
         log_path = Path(file_path)
@@ -162,16 +231,35 @@ def enrich_list_with_image_json(image_list, docker_org="adoptopenjdk"):
     # Get a list that has only one copy each possible image to save on image checks
     manifest_list = get_manifest_list(image_list=image_list)
 
-    # Enrich the manifest list with image json
+    # Group the tags by repo so each repo is read with a few pages of its tags list instead of a request per tag
+    repo_tags = {}
     for image in manifest_list:
-        image_json = get_image_information(docker_org=docker_org, docker_repo="openjdk{version}{jvm}".format(version=image["version"], jvm=sanitize_jvm(image["jvm"])), tag_name=image["tag"])
-        image["image_json"] = image_json
+        repo_tags.setdefault("openjdk{version}{jvm}".format(version=image["version"], jvm=sanitize_jvm(image["jvm"])), set()).add(image["tag"])
+
+    def fetch_repo_tags(docker_repo):
+        return get_repo_tags(docker_org=docker_org, docker_repo=docker_repo, tag_names=repo_tags[docker_repo])
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        image_jsons = {}
+        for docker_repo, tag_jsons in zip(repo_tags, executor.map(fetch_repo_tags, repo_tags)):
+            for tag_name, image_json in tag_jsons.items():
+                image_jsons[(docker_repo, tag_name)] = image_json
+
+        # Tags that were not on the first pages, eg. old ones, are fetched one by one
+        missing = [(docker_repo, tag_name) for docker_repo, tag_names in repo_tags.items() for tag_name in tag_names if (docker_repo, tag_name) not in image_jsons]
+
+        def fetch_image_json(key):
+            return get_image_information(docker_org=docker_org, docker_repo=key[0], tag_name=key[1])
+
+        for key, image_json in zip(missing, executor.map(fetch_image_json, missing)):
+            image_jsons[key] = image_json
 
     # Enrich the full image list with image json to avoid calling the same manifest 4 or 5 times(for each arch)
     for image in image_list:
-        for enrich_image in manifest_list:
-            if image["tag"] == enrich_image["tag"] and image["jvm"] == enrich_image["jvm"]:
-                image["image_json"] = enrich_image["image_json"]
+        image["image_json"] = image_jsons[("openjdk{version}{jvm}".format(version=image["version"], jvm=sanitize_jvm(image["jvm"])), image["tag"])]
+        image["digest"] = get_image_digest(image_json=image["image_json"])
+
+    LOGGER.debug("Got {digests} unique digests for {tags} tags, {missing} tags fetched one by one".format(digests=len({image["digest"] for image in image_list}), tags=len(image_jsons), missing=len(missing)))
 
     return image_list
 
@@ -200,17 +288,77 @@ def get_image_information(docker_org, docker_repo, tag_name):
     :return: JSON of the image
     """
     LOGGER.debug("Getting image information for: {org}/{repo}:{tag}".format(org=docker_org, repo=docker_repo, tag=tag_name))
-    response = requests.get("https://hub.docker.com/v2/repositories/{org}/{repo}/tags/{tag}".format(org=docker_org, repo=docker_repo, tag=tag_name))
+    start = time.monotonic()
+    response = limited_request(RATE_LIMITER, requests.get, "https://hub.docker.com/v2/repositories/{org}/{repo}/tags/{tag}".format(org=docker_org, repo=docker_repo, tag=tag_name))
+    REQUEST_TIMINGS.append({"repo": docker_repo, "tag": tag_name, "request": "image_json", "status_code": response.status_code, "duration": time.monotonic() - start})
 
     # Checks if the response is not a 5XX or 4XX status code
     if response.ok:
-        return response.json()
+        image_json = response.json()
+        IMAGE_JSONS[(docker_repo, tag_name)] = image_json
+        return image_json
     else:
         # If "bad" status code print error
         LOGGER.error("ERROR: Something went wrong grabbing image, {org}/{repo}:{tag}. HTTP Status Code: {code}".format(org=docker_org, repo=docker_repo, tag=tag_name, code=response.status_code))
         return None
 
 
+def get_repo_tags(docker_org, docker_repo, tag_names, max_pages=MAX_TAGS_PAGES):
+    """
+    Fetch the image json of several tags of a repo from the paged DockerHub tags list. The list is sorted by the last
+    update, so the nightly and latest tags the scanner checks are usually on the first pages
+    :param docker_org: Name of docker organization
+    :param docker_repo: Name of docker repo
+    :param tag_names: Set of tag names
+    :param max_pages: Integer - Number of pages to read at most
+    :return: Dict - Image JSON keyed by tag name, tags not found on the pages read are left out
+    """
+    tag_jsons = {}
+    url = "https://hub.docker.com/v2/repositories/{org}/{repo}/tags?page_size={size}&ordering=last_updated".format(org=docker_org, repo=docker_repo, size=TAGS_PAGE_SIZE)
+
+    for page in range(1, max_pages + 1):
+        if not url or len(tag_jsons) == len(tag_names):
+            break
+        LOGGER.debug("Getting page {page} of the tags of: {org}/{repo}".format(page=page, org=docker_org, repo=docker_repo))
+        start = time.monotonic()
+        response = limited_request(RATE_LIMITER, requests.get, url)
+        REQUEST_TIMINGS.append({"repo": docker_repo, "tag": "", "request": "tags_page", "status_code": response.status_code, "duration": time.monotonic() - start})
+
+        if not response.ok:
+            LOGGER.error("ERROR: Something went wrong grabbing the tags of {org}/{repo}. HTTP Status Code: {code}".format(org=docker_org, repo=docker_repo, code=response.status_code))
+            break
+
+        page_json = response.json()
+        for image_json in page_json.get("results") or []:
+            if image_json.get("name") in tag_names:
+                tag_jsons[image_json["name"]] = image_json
+                IMAGE_JSONS[(docker_repo, image_json["name"])] = image_json
+        url = page_json.get("next")
+
+    return tag_jsons
+
+
+def get_image_digest(image_json):
+    """
+    Grab the digest of the manifest from docker image json. Alias tags of the same image share the digest
+    :param image_json: Image JSON
+    :return: String - Digest, empty if the image json has none
+    """
+    if not image_json:
+        return ""
+
+    digest = image_json.get("digest")
+    if digest:
+        return digest
+
+    # Older responses only hold the digest of each image in the manifest
+    image_digests = sorted(image.get("digest") or "" for image in image_json.get("images") or [])
+    if any(image_digests):
+        return "+".join(image_digests)
+
+    return ""
+
+
 def get_last_updated_for_image(image_json):
     """
     Grab "last_updated" timestamp from docker image json
@@ -311,6 +459,93 @@ def generate_all_image(supported_versions, supported_jvms, supported_os, support
     return master_list
 
 
+def generate_index_images(index, supported_versions, supported_jvms, supported_os, supported_packages, supported_builds, supported_archs, dict_image_template):
+    """
+    Generates the images of the nightly Dockerfiles in the index written by dockerfile_index.py, so only the
+    combinations that have a Dockerfile, with the archs of its install step, are expected on DockerHub
+    :param index: Dict - Dockerfile index
+    :param supported_versions: List of Versions, None for all the versions in the index
+    :param supported_jvms: List of JVMs
+    :param supported_os: List of OSs, None for all the Linux OSs in the index
+    :param supported_packages: List of Packages
+    :param supported_builds: List of Builds
+    :param supported_archs: List of Architectures
+    :param dict_image_template: Dict - Template Dict to store needed information about said image/tag
+    :return: List - All expected image/tag possibilities
+    """
+    master_list = []
+
+    for path in sorted(index["dockerfiles"]):
+        dockerfile = index["dockerfiles"][path]
+        # The scanner verifies the nightly tags
+        if dockerfile["build"] != "nightly" or dockerfile["os"] == "windows":
+            continue
+        if supported_versions is not None and dockerfile["version"] not in supported_versions:
+            continue
+        if supported_os is not None and dockerfile["os"] not in supported_os:
+            continue
+        if dockerfile["vm"] not in supported_jvms or dockerfile["package"] not in supported_packages or dockerfile["type"] not in supported_builds:
+            continue
+
+        for arch in sorted(dockerfile["arches"]):
+            if arch not in supported_archs:
+                continue
+            template = copy.deepcopy(dict_image_template)
+            template["version"] = dockerfile["version"]
+            template["jvm"] = dockerfile["vm"]
+            template["arch"] = arch
+            template["os"] = dockerfile["os"]
+            template["package"] = dockerfile["package"]
+            template["build"] = dockerfile["type"]
+            template["tag"] = "{package}{version}u-{os}-nightly{build}".format(package=dockerfile["package"],
+                                                                               version=dockerfile["version"],
+                                                                               os=dockerfile["os"],
+                                                                               build=sanitize_build(dockerfile["type"]))
+            master_list.append(template)
+
+    return master_list
+
+
+def parse_shard(shard):
+    """
+    Parses a shard in the form K/N
+    :param shard: String - Shard index and number of shards, index starts at 0 - (0/4)
+    :return: Tuple - Shard index and number of shards
+    """
+    try:
+        shard_index, shard_count = [int(value) for value in shard.split("/")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("{shard} is not a valid shard, expected K/N".format(shard=shard))
+
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise argparse.ArgumentTypeError("{shard} is not a valid shard, K must be between 0 and N-1".format(shard=shard))
+
+    return shard_index, shard_count
+
+
+def get_shard(image, shard_count):
+    """
+    Get the shard of an image. All the archs of a manifest land in the same shard
+    :param image: Dict - Image
+    :param shard_count: Integer - Number of shards
+    :return: Integer - Shard index
+    """
+    # Use a hash that is stable across processes and machines, the builtin hash is salted per process
+    key = "{version}/{jvm}/{tag}".format(version=image["version"], jvm=image["jvm"], tag=image["tag"])
+    return int(hashlib.sha256(key.encode("utf-8")).hexdigest(), 16) % shard_count
+
+
+def filter_shard(image_list, shard_index, shard_count):
+    """
+    Filter the image list down to the images of a shard
+    :param image_list: List of images
+    :param shard_index: Integer - Index of the shard
+    :param shard_count: Integer - Number of shards
+    :return: List of images in the shard
+    """
+    return [image for image in image_list if get_shard(image=image, shard_count=shard_count) == shard_index]
+
+
 def is_valid_package_and_build(package, build):
     """
     Returns true or false depending on the package and build are jre and slim
@@ -442,7 +677,9 @@ def is_image_exist(docker_org, docker_repo, tag_name):
     """
     # Issue GET request to get a HTTP Status code to check if it is a valid image
     # Using GET instead of HEAD because HEAD is not being treated right, thus enable stream to just get headers
-    response = requests.get("https://hub.docker.com/v2/repositories/{org}/{repo}/tags/{tag}".format(org=docker_org, repo=docker_repo, tag=tag_name),  stream=True)
+    start = time.monotonic()
+    response = limited_request(RATE_LIMITER, lambda url: requests.get(url, stream=True), "https://hub.docker.com/v2/repositories/{org}/{repo}/tags/{tag}".format(org=docker_org, repo=docker_repo, tag=tag_name))
+    REQUEST_TIMINGS.append({"repo": docker_repo, "tag": tag_name, "request": "exists", "status_code": response.status_code, "duration": time.monotonic() - start})
 
     LOGGER.debug("HTTP Status Code: {code}".format(code=response.status_code))
     # Checks if the response is not a 5XX or 4XX status code
@@ -472,10 +709,14 @@ def filter_image_exist(docker_org, image_list):
 
     removed_manifest_list = []
 
-    # Loop over all possible images
-    for image in manifest_list:
-        if is_image_exist(docker_org=docker_org, docker_repo="openjdk{version}{jvm}".format(version=image["version"], jvm=sanitize_jvm(image["jvm"])), tag_name=image["tag"]) is not True:
-            removed_manifest_list.append(image["tag"])
+    # Check all possible images, the rate limiter keeps the requests within what DockerHub allows
+    def check_image_exist(image):
+        return is_image_exist(docker_org=docker_org, docker_repo="openjdk{version}{jvm}".format(version=image["version"], jvm=sanitize_jvm(image["jvm"])), tag_name=image["tag"])
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for image, exists in zip(manifest_list, executor.map(check_image_exist, manifest_list)):
+            if exists is not True:
+                removed_manifest_list.append(image["tag"])
 
     # Filter the image list based on if the image did not exist
     for image in image_list:
@@ -519,6 +760,7 @@ def filter_arch_in_manifest(enriched_image_list, filter_images=True):
     filtered_list = []
     removed_list = []
 
+    # The image JSON was fetched by enrich_list_with_image_json, checking an arch costs no request
     for image in enriched_image_list:
         if is_arch_in_manifest(arch=image["arch"], image_json=image["image_json"]):
             filtered_list.append(image)
@@ -559,8 +801,10 @@ def filter_timedelta(enriched_image_list, delta_hours=2):
     filtered_list = []
     removed_list = []
 
+    # last_updated is set per tag, alias tags of the same digest can be pushed at different times so each tag is checked
+    current_time = datetime.utcnow()
     for image in enriched_image_list:
-        if is_timedelta(timestamp=get_last_updated_for_image(image_json=image["image_json"]), current_time=datetime.utcnow(), delta_hours=delta_hours):
+        if is_timedelta(timestamp=get_last_updated_for_image(image_json=image["image_json"]), current_time=current_time, delta_hours=delta_hours):
             filtered_list.append(image)
         else:
             removed_list.append(image)
@@ -832,6 +1076,493 @@ def output_filtered_images(image_dict, json_output):
             LOGGER.info(json.dumps(image))
 
 
+def save_results(image_dict, file_path, verify_type, shard=(0, 1)):
+    """
+    Saves the images of a run as JSON so the results of several shards can be merged
+    :param image_dict: Dictionary of images
+    :param file_path: String - Path of the results file
+    :param verify_type: String - Verify value of the run - (all/timedelta/manifests/images)
+    :param shard: Tuple - Shard index and number of shards
+    :return: None
+    """
+    results = {
+        "verify": verify_type,
+        "shard": "{index}/{count}".format(index=shard[0], count=shard[1]),
+        "images": image_dict
+    }
+
+    with open(file_path, "w") as results_file:
+        json.dump(results, results_file)
+
+
+def merge_results(results_list):
+    """
+    Merges the results of several shards into a single dictionary of images
+    :param results_list: List of results loaded from the results files
+    :return: Tuple - Verify value and the merged dictionary of images
+    """
+    verify_types = {results["verify"] for results in results_list}
+    if len(verify_types) != 1:
+        LOGGER.error("Can not merge results of different verify values: {verify}".format(verify=", ".join(sorted(verify_types))))
+        raise ValueError("Can not merge results of different verify values: {verify}".format(verify=", ".join(sorted(verify_types))))
+
+    shards = [parse_shard(results["shard"]) for results in results_list]
+    shard_counts = {shard_count for _, shard_count in shards}
+    if len(shard_counts) != 1:
+        LOGGER.error("Can not merge results of different shard counts: {counts}".format(counts=", ".join(str(count) for count in sorted(shard_counts))))
+        raise ValueError("Can not merge results of different shard counts: {counts}".format(counts=", ".join(str(count) for count in sorted(shard_counts))))
+
+    shard_indexes = [shard_index for shard_index, _ in shards]
+    if len(set(shard_indexes)) != len(shard_indexes):
+        LOGGER.error("Can not merge the same shard twice: {shards}".format(shards=", ".join(results["shard"] for results in results_list)))
+        raise ValueError("Can not merge the same shard twice: {shards}".format(shards=", ".join(results["shard"] for results in results_list)))
+
+    missing_shards = set(range(shard_counts.pop())) - set(shard_indexes)
+    if missing_shards:
+        LOGGER.warning("WARNING: Results of shards {shards} are missing, the merged results are incomplete".format(shards=", ".join(str(shard) for shard in sorted(missing_shards))))
+
+    merged_dict = copy.deepcopy(IMAGES_TEMPLATE)
+    for results in sorted(results_list, key=lambda results: parse_shard(results["shard"])[0]):
+        for bucket in merged_dict:
+            merged_dict[bucket].extend(results["images"].get(bucket, []))
+
+    return verify_types.pop(), merged_dict
+
+
+def output_results(image_dict, verify_type, parsed_args):
+    """
+    Outputs the images of a run for the given verify value
+    :param image_dict: Dictionary of images
+    :param verify_type: String - Verify value of the run - (all/timedelta/manifests/images)
+    :param parsed_args: Dict of command line arguments
+    :return: None
+    """
+    if verify_type == "all":
+        if parsed_args["debug"]:
+            output_package_and_build(image_dict=image_dict, json_output=parsed_args["json"])
+            output_os_and_arch(image_dict=image_dict, json_output=parsed_args["json"])
+            output_jvm_and_arch(image_dict=image_dict, json_output=parsed_args["json"])
+            output_bad_requests(image_dict=image_dict, json_output=parsed_args["json"], valid_images=parsed_args["show_valid"])
+            output_bad_manifests(image_dict=image_dict, json_output=parsed_args["json"])
+            output_old_images(image_dict=image_dict, json_output=parsed_args["json"], valid_images=parsed_args["show_valid"], delta_hours=parsed_args["delta_hours"])
+
+        output_filtered_images(image_dict=image_dict, json_output=parsed_args["json"])
+    elif verify_type == "timedelta":
+        output_old_images(image_dict=image_dict, json_output=parsed_args["json"], valid_images=parsed_args["show_valid"], delta_hours=parsed_args["delta_hours"])
+    elif verify_type == "manifests":
+        output_bad_manifests(image_dict=image_dict, json_output=parsed_args["json"])
+    elif verify_type == "images":
+        output_bad_requests(image_dict=image_dict, json_output=parsed_args["json"],  valid_images=parsed_args["show_valid"])
+
+
+def get_report_record(bucket, image):
+    """
+    Flattens an image of a bucket into a report record, the image JSON is reduced to its last_updated value
+    :param bucket: String - Name of the bucket
+    :param image: Dict - Image
+    :return: Dict - Report record
+    """
+    record = {
+        "bucket": bucket,
+        "status": BUCKET_STATUS.get(bucket, "failed"),
+        "image": "adoptopenjdk/openjdk{version}{jvm}:{tag}".format(version=image["version"], jvm=sanitize_jvm(image["jvm"]), tag=image["tag"])
+    }
+    for field in IMAGE_TEMPLATE:
+        record[field] = image.get(field, "")
+    record["digest"] = image.get("digest", "")
+    image_json = image.get("image_json")
+    record["last_updated"] = image_json.get("last_updated", "") if image_json else ""
+
+    return record
+
+
+def write_ndjson_report(image_dict, report_file, counts):
+    """
+    Writes a summary line with the bucket counts followed by one line per image
+    :param image_dict: Dictionary of images
+    :param report_file: File object to write to
+    :param counts: Dict - Number of images in each bucket
+    :return: None
+    """
+    lines = [json.dumps({"type": "summary", "counts": counts})]
+    for bucket, images in image_dict.items():
+        for image in images:
+            record = get_report_record(bucket=bucket, image=image)
+            record["type"] = "image"
+            lines.append(json.dumps(record))
+    lines.append("")
+    report_file.write("\n".join(lines))
+
+
+def write_csv_report(image_dict, report_file, counts):
+    """
+    Writes one row per image, the bucket counts are returned by write_report
+    :param image_dict: Dictionary of images
+    :param report_file: File object to write to
+    :param counts: Dict - Number of images in each bucket
+    :return: None
+    """
+    writer = csv.DictWriter(report_file, fieldnames=REPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(get_report_record(bucket=bucket, image=image) for bucket, images in image_dict.items() for image in images)
+
+
+def write_junit_report(image_dict, report_file, counts):
+    """
+    Writes a JUnit XML report with a test suite per bucket and a test case per image
+    :param image_dict: Dictionary of images
+    :param report_file: File object to write to
+    :param counts: Dict - Number of images in each bucket
+    :return: None
+    """
+    failures = sum(count for bucket, count in counts.items() if BUCKET_STATUS.get(bucket, "failed") == "failed")
+    skipped = sum(count for bucket, count in counts.items() if BUCKET_STATUS.get(bucket) == "skipped")
+    test_suites = ElementTree.Element("testsuites", name="adoptopenjdk_scanner", tests=str(sum(counts.values())), failures=str(failures), skipped=str(skipped))
+
+    for bucket, images in image_dict.items():
+        status = BUCKET_STATUS.get(bucket, "failed")
+        test_suite = ElementTree.SubElement(test_suites, "testsuite", name=bucket, tests=str(counts[bucket]),
+                                            failures=str(counts[bucket] if status == "failed" else 0),
+                                            skipped=str(counts[bucket] if status == "skipped" else 0))
+        for image in images:
+            record = get_report_record(bucket=bucket, image=image)
+            test_case = ElementTree.SubElement(test_suite, "testcase", classname=record["image"], name=record["arch"])
+            if status == "failed":
+                ElementTree.SubElement(test_case, "failure", message="{image} ({arch}) is in {bucket}".format(image=record["image"], arch=record["arch"], bucket=bucket))
+            elif status == "skipped":
+                ElementTree.SubElement(test_case, "skipped", message="{image} ({arch}) is not a valid combination".format(image=record["image"], arch=record["arch"]))
+
+    report_file.write(ElementTree.tostring(test_suites, encoding="unicode"))
+    report_file.write("\n")
+
+
+REPORT_WRITERS = {
+    "ndjson": write_ndjson_report,
+    "csv": write_csv_report,
+    "junit": write_junit_report
+}
+
+
+def write_report(image_dict, file_path, report_format="ndjson"):
+    """
+    Serializes all buckets of a run into a report file in one pass
+    :param image_dict: Dictionary of images
+    :param file_path: String - Path of the report file, "-" writes to stdout
+    :param report_format: String - Format of the report - (ndjson/csv/junit)
+    :return: Dict - Number of images in each bucket
+    """
+    if report_format not in REPORT_WRITERS:
+        LOGGER.error("{report_format} is an unsupported report format!".format(report_format=report_format))
+        raise ValueError("{report_format} is an unsupported report format!".format(report_format=report_format))
+
+    counts = {bucket: len(images) for bucket, images in image_dict.items()}
+
+    if file_path == "-":
+        REPORT_WRITERS[report_format](image_dict=image_dict, report_file=sys.stdout, counts=counts)
+        sys.stdout.flush()
+    else:
+        with open(file_path, "w", buffering=1024 * 1024, newline="") as report_file:
+            REPORT_WRITERS[report_format](image_dict=image_dict, report_file=report_file, counts=counts)
+
+    return counts
+
+
+def output_report(image_dict, parsed_args):
+    """
+    Writes the report instead of the per image output
+    :param image_dict: Dictionary of images
+    :param parsed_args: Dict of command line arguments
+    :return: None
+    """
+    counts = write_report(image_dict=image_dict, file_path=parsed_args["report_file"], report_format=parsed_args["report_format"])
+
+    # The console logs to stderr when the report is written to stdout, see load_logging_config
+    file_path = "stdout" if parsed_args["report_file"] == "-" else parsed_args["report_file"]
+    LOGGER.info("Wrote {report_format} report to {file_path}: {counts}".format(report_format=parsed_args["report_format"], file_path=file_path, counts=json.dumps(counts)))
+
+
+def get_history_rows(image_dict):
+    """
+    Get the tag and arch rows of a run for the history database
+    :param image_dict: Dictionary of images
+    :return: Tuple - List of tag rows and list of arch rows
+    """
+    # A manifest gets the verdict of the worst bucket any of its archs ended up in
+    verdicts = [("bad_requests", "missing"), ("bad_manifests", "bad_manifest"), ("old_images", "old"), ("filtered_images", "ok")]
+
+    tags = {}
+    for bucket, verdict in reversed(verdicts):
+        for image in image_dict[bucket]:
+            key = ("openjdk{version}{jvm}".format(version=image["version"], jvm=sanitize_jvm(image["jvm"])), image["tag"])
+            tag = tags.setdefault(key, {"verdict": verdict, "expected": set()})
+            tag["verdict"] = verdict
+            tag["expected"].add(docker_arch_names(arch=image["arch"]))
+
+    tag_rows = []
+    arch_rows = []
+    for (repo, tag_name), tag in sorted(tags.items()):
+        image_json = IMAGE_JSONS.get((repo, tag_name)) or {}
+        pushed = {image.get("architecture"): image.get("last_pushed") for image in image_json.get("images") or []}
+        tag_rows.append({"repo": repo, "tag": tag_name, "verdict": tag["verdict"], "last_updated": image_json.get("last_updated"), "arches": ",".join(sorted(pushed))})
+
+        # Without the image JSON, eg. when only verifying images, nothing is known about the archs
+        if not image_json:
+            continue
+        for arch in sorted(tag["expected"] | set(pushed)):
+            arch_rows.append({"repo": repo, "tag": tag_name, "arch": arch, "expected": int(arch in tag["expected"]), "present": int(arch in pushed), "last_pushed": pushed.get(arch)})
+
+    return tag_rows, arch_rows
+
+
+def record_history(image_dict, file_path, started_at, verify_type, shard=(0, 1)):
+    """
+    Appends the verdicts, arch sets and request timings of a run to the history database
+    :param image_dict: Dictionary of images
+    :param file_path: String - Path of the SQLite database
+    :param started_at: Datetime Object - UTC start time of the run
+    :param verify_type: String - Verify value of the run - (all/timedelta/manifests/images)
+    :param shard: Tuple - Shard index and number of shards
+    :return: Integer - Id of the run
+    """
+    tag_rows, arch_rows = get_history_rows(image_dict=image_dict)
+    connection = scan_history.connect(file_path)
+    try:
+        return scan_history.record_run(connection, started_at=started_at, verify_type=verify_type, shard="{index}/{count}".format(index=shard[0], count=shard[1]), tag_results=tag_rows, arch_results=arch_rows, request_timings=REQUEST_TIMINGS)
+    finally:
+        connection.close()
+
+
+def output_history(parsed_args):
+    """
+    Outputs the answer of a history query
+    :param parsed_args: Dict of command line arguments
+    :return: None
+    """
+    if parsed_args["history_db"] is None:
+        LOGGER.error("--history-db is required to query the history")
+        raise ValueError("--history-db is required to query the history")
+
+    connection = scan_history.connect(parsed_args["history_db"])
+    try:
+        if parsed_args["query"] == "old-tags":
+            rows = scan_history.get_old_tags(connection, min_runs=parsed_args["min_runs"])
+            LOGGER.info("\nTags Old For At Least {runs} Runs({number}):".format(runs=parsed_args["min_runs"], number=len(rows)))
+            for row in rows:
+                LOGGER.info(json.dumps(row))
+        elif parsed_args["query"] == "publish-latency":
+            latencies = scan_history.get_publish_latency(connection, runs=parsed_args["runs"])
+            LOGGER.info("\nMedian Publish Latency Per Architecture In The Last {runs} Runs({number}):".format(runs=parsed_args["runs"], number=len(latencies)))
+            for arch, latency in latencies.items():
+                LOGGER.info(json.dumps(dict(arch=arch, **latency)))
+        elif parsed_args["query"] == "arch-changes":
+            if not (parsed_args["repo"] and parsed_args["tag"] and parsed_args["arch"]):
+                LOGGER.error("--repo, --tag and --arch are required for the arch-changes query")
+                raise ValueError("--repo, --tag and --arch are required for the arch-changes query")
+            rows = scan_history.get_arch_changes(connection, repo=parsed_args["repo"], tag=parsed_args["tag"], arch=parsed_args["arch"])
+            LOGGER.info("\nArchitecture Changes Of {repo}:{tag} {arch}({number}):".format(repo=parsed_args["repo"], tag=parsed_args["tag"], arch=parsed_args["arch"], number=len(rows)))
+            for row in rows:
+                LOGGER.info(json.dumps(row))
+    finally:
+        connection.close()
+
+
+def parse_image_reference(reference):
+    """
+    Split an image reference into organization, repo and tag
+    :param reference: String - Image reference, eg. adoptopenjdk/openjdk11:jdk-11.0.11_9
+    :return: Tuple - Organization, repo and tag
+    """
+    name, _, tag = reference.rpartition(":")
+    parts = name.split("/")
+    if not tag or "/" in tag or len(parts) < 2:
+        LOGGER.error("{reference} is not a valid image reference, expected org/repo:tag".format(reference=reference))
+        raise ValueError("{reference} is not a valid image reference, expected org/repo:tag".format(reference=reference))
+
+    # Drop any registry prefix, DockerHub only knows the organization and repo
+    return parts[-2], parts[-1], tag
+
+
+def get_tag_arch(tag):
+    """
+    Get the docker arch name of an arch specific tag
+    :param tag: String - Name of tag, eg. x86_64-ubuntu-jdk-11.0.11_9
+    :return: String - Docker arch name, None if the tag is not arch specific
+    """
+    arch = tag.split("-")[0]
+    if arch in ("armv7l", "aarch64", "ppc64le", "s390x", "x86_64"):
+        return docker_arch_names(arch=arch)
+    return None
+
+
+def parse_push_commands(file_path, targets):
+    """
+    Add the images pushed by push_commands.sh to the targets, each is expected to hold the arch of its tag
+    :param file_path: String - Path of push_commands.sh
+    :param targets: Dict - Expected arch set keyed by image reference
+    :return: Dict - Targets
+    """
+    with open(file_path) as push_file:
+        for line in push_file:
+            words = shlex.split(line, comments=True)
+            if len(words) == 3 and words[:2] == ["docker", "push"]:
+                expected = targets.setdefault(words[2], set())
+                arch = get_tag_arch(tag=parse_image_reference(words[2])[2])
+                if arch:
+                    expected.add(arch)
+
+    return targets
+
+
+def parse_manifest_commands(file_path, targets):
+    """
+    Add the manifests pushed by manifest_commands.sh to the targets, each is expected to hold all of its annotated archs
+    :param file_path: String - Path of manifest_commands.sh
+    :param targets: Dict - Expected arch set keyed by image reference
+    :return: Dict - Targets
+    """
+    with open(file_path) as manifest_file:
+        for line in manifest_file:
+            words = shlex.split(line, comments=True)
+            # Works for both manifest-tool and docker: "<tool> manifest <command> <manifest> ..."
+            if len(words) < 4 or words[1] != "manifest":
+                continue
+            command, manifest = words[2], words[3]
+            if command == "create":
+                targets.setdefault(manifest, set())
+            elif command == "annotate" and "--arch" in words:
+                targets.setdefault(manifest, set()).add(words[words.index("--arch") + 1])
+
+    return targets
+
+
+def parse_images_file(file_path, targets):
+    """
+    Add the images of a list of image references to the targets, one reference per line optionally followed by the comma
+    separated docker archs it is expected to hold
+    :param file_path: String - Path of the images file
+    :param targets: Dict - Expected arch set keyed by image reference
+    :return: Dict - Targets
+    """
+    with open(file_path) as images_file:
+        for line in images_file:
+            words = line.split("#")[0].split()
+            if not words:
+                continue
+            expected = targets.setdefault(words[0], set())
+            if len(words) > 1:
+                expected.update(arch for arch in words[1].split(",") if arch)
+
+    return targets
+
+
+def get_target_status(reference, expected_archs, delta_hours=2, force_old_images=False):
+    """
+    Check if a pushed image is live on DockerHub with all of its expected archs
+    :param reference: String - Image reference
+    :param expected_archs: Set of docker arch names
+    :param delta_hours: An integer of hours to deem an image "old"
+    :param force_old_images: Skip the delta time check
+    :return: Dict - Target status with verdict(live/missing/unavailable/incomplete/old) and the missing archs
+    """
+    docker_org, docker_repo, tag_name = parse_image_reference(reference)
+    url = "https://hub.docker.com/v2/repositories/{org}/{repo}/tags/{tag}".format(org=docker_org, repo=docker_repo, tag=tag_name)
+    response = limited_request(RATE_LIMITER, requests.get, url)
+
+    status = {"image": reference, "expected_archs": sorted(expected_archs), "missing_archs": sorted(expected_archs), "last_updated": None}
+    if response.status_code == 404:
+        status["verdict"] = "missing"
+        return status
+    if not response.ok:
+        # Treat other errors as not live yet, the next poll will retry
+        LOGGER.debug("HTTP Status Code {code} for {image}".format(code=response.status_code, image=reference))
+        status["verdict"] = "unavailable"
+        return status
+
+    image_json = response.json()
+    present = {image.get("architecture") for image in image_json.get("images") or []}
+    status["missing_archs"] = sorted(set(expected_archs) - present)
+    status["last_updated"] = image_json.get("last_updated")
+
+    if status["missing_archs"]:
+        status["verdict"] = "incomplete"
+    elif force_old_images is not True and not is_timedelta(timestamp=get_last_updated_for_image(image_json=image_json), current_time=datetime.utcnow(), delta_hours=delta_hours):
+        status["verdict"] = "old"
+    else:
+        status["verdict"] = "live"
+
+    return status
+
+
+def verify_targets(targets, deadline_minutes=30, not_found_grace_minutes=5, initial_backoff=5, max_backoff=120, delta_hours=2, force_old_images=False):
+    """
+    Poll only the given images with exponential backoff until each is live with its expected archs or the deadline passes
+    :param targets: Dict - Expected arch set keyed by image reference
+    :param deadline_minutes: Integer - Minutes to keep polling for
+    :param not_found_grace_minutes: Integer - Minutes after which the images that still do not exist are not polled anymore
+    :param initial_backoff: Integer - Seconds to wait after the first poll
+    :param max_backoff: Integer - Most seconds to wait between two polls
+    :param delta_hours: An integer of hours to deem an image "old"
+    :param force_old_images: Skip the delta time check
+    :return: List - Final status of every target
+    """
+    start = time.monotonic()
+    deadline = start + deadline_minutes * 60
+    backoff = initial_backoff
+    pending = dict(targets)
+    results = {}
+
+    def check_target(reference):
+        return get_target_status(reference=reference, expected_archs=pending[reference], delta_hours=delta_hours, force_old_images=force_old_images)
+
+    while pending:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            statuses = list(executor.map(check_target, sorted(pending)))
+
+        for status in statuses:
+            results[status["image"]] = status
+            if status["verdict"] == "live":
+                del pending[status["image"]]
+
+        # A failed push never shows up on DockerHub, there is no point in waiting the whole deadline for it
+        if time.monotonic() - start >= not_found_grace_minutes * 60:
+            for reference in [reference for reference in sorted(pending) if results[reference]["verdict"] == "missing"]:
+                LOGGER.warning("WARNING: {image} still does not exist after {grace} minutes, giving up on it".format(image=reference, grace=not_found_grace_minutes))
+                del pending[reference]
+
+        remaining = deadline - time.monotonic()
+        if not pending or remaining <= 0:
+            break
+
+        LOGGER.info("{pending} of {total} images are not live yet, checking again in {backoff} seconds".format(pending=len(pending), total=len(targets), backoff=round(min(backoff, remaining))))
+        time.sleep(min(backoff, remaining))
+        backoff = min(backoff * 2, max_backoff)
+
+    return [results[reference] for reference in sorted(results)]
+
+
+def output_targets(statuses, json_output):
+    """
+    Outputs the images that are not live after a post push verification
+    :param statuses: List of target statuses
+    :param json_output: Boolean for Json output verse printed
+    :return: None
+    """
+    failed = [status for status in statuses if status["verdict"] != "live"]
+    LOGGER.info("\nPost Push Image Issues({number} of {total}):".format(number=len(failed), total=len(statuses)))
+    for status in failed:
+        if json_output is False:
+            if status["verdict"] == "incomplete":
+                LOGGER.info("Image {image} is missing the architectures: {archs}".format(image=status["image"], archs=", ".join(status["missing_archs"])))
+            elif status["verdict"] == "old":
+                LOGGER.info("Image {image} was last updated at {last_updated}".format(image=status["image"], last_updated=status["last_updated"]))
+            elif status["verdict"] == "unavailable":
+                LOGGER.info("Image {image} could not be checked".format(image=status["image"]))
+            else:
+                LOGGER.info("Image {image} does not exist".format(image=status["image"]))
+        else:
+            LOGGER.info(json.dumps(status))
+
+
 def get_args():
     """
     Processes and handles command line arguments
@@ -842,14 +1573,12 @@ def get_args():
                         help="Name of the attribute you want to verify",
                         type=str,
                         choices=["all", "timedelta", "manifests", "images"],
-                        default=None,
-                        required=True)
+                        default=None)
     parser.add_argument("--versions",
-                        help="Java Versions",
+                        help="Java Versions, defaults to {versions} or to all the versions in the Dockerfile index".format(versions=" ".join(DEFAULT_VERSIONS)),
                         nargs='+',
                         type=str,
-                        choices=["8", "11", "14"],
-                        default=["8", "11", "14"])
+                        default=None)
     parser.add_argument("--jvms",
                         help="Name of the JVMs",
                         nargs='+',
@@ -857,11 +1586,11 @@ def get_args():
                         choices=["hotspot", "openj9"],
                         default=["hotspot", "openj9"])
     parser.add_argument("--oss",
-                        help="Names of the OSs",
+                        help="Names of the OSs, defaults to {oss} or to all the OSs in the Dockerfile index".format(oss=" ".join(DEFAULT_OSS)),
                         nargs='+',
                         type=str,
-                        choices=["alpine", "debian", "debianslim", "ubi", "ubi-minimal", "centos", "clefos", "ubuntu"],
-                        default=["alpine", "debian", "debianslim", "ubi", "ubi-minimal", "centos", "clefos", "ubuntu"])
+                        choices=DEFAULT_OSS + ["leap", "tumbleweed"],
+                        default=None)
     parser.add_argument("--packages",
                         help="Names of the Packages",
                         nargs='+',
@@ -880,6 +1609,10 @@ def get_args():
                         type=str,
                         choices=["slim", "full"],
                         default=["slim", "full"])
+    parser.add_argument("--index-file",
+                        help="Path to the Dockerfile index written by dockerfile_index.py, the expected images are generated from it",
+                        type=str,
+                        default=None)
     parser.add_argument("--filter-bad-manifests",
                         help="Filter out bad manifest images",
                         action="store_true",
@@ -908,62 +1641,185 @@ def get_args():
                         help="Prints valid objects in addition to the problematic objects. Only works for certain verify values",
                         action="store_true",
                         default=False)
+    parser.add_argument("--shard",
+                        help="Only scan shard K of N shards, in the form K/N with K starting at 0. Images are split by a stable hash of the manifest",
+                        type=parse_shard,
+                        default=(0, 1))
+    parser.add_argument("--results-file",
+                        help="Path to a JSON file the results are saved to, used to merge the results of several shards",
+                        type=str,
+                        default=None)
 
-    return vars(parser.parse_args())
+    parser.add_argument("--report-file",
+                        help="Path to a report file that holds all images instead of the per image output, use - for stdout",
+                        type=str,
+                        default=None)
+    parser.add_argument("--report-format",
+                        help="Format of the report file",
+                        type=str,
+                        choices=sorted(REPORT_WRITERS),
+                        default="ndjson")
+    parser.add_argument("--history-db",
+                        help="Path to a SQLite database every run is appended to, also used by the history command",
+                        type=str,
+                        default=None)
+
+    subparsers = parser.add_subparsers(dest="command")
+    merge_parser = subparsers.add_parser("merge", help="Merge the results files of several shards and output them like a single run")
+    merge_parser.add_argument("files",
+                              help="Results files of the shards",
+                              nargs="+",
+                              type=str)
+
+    post_push_parser = subparsers.add_parser("post-push", help="Poll only the images just pushed until they are live with all their archs")
+    post_push_parser.add_argument("--push-commands",
+                                  help="Path to push_commands.sh",
+                                  type=str,
+                                  default=None)
+    post_push_parser.add_argument("--manifest-commands",
+                                  help="Path to manifest_commands.sh",
+                                  type=str,
+                                  default=None)
+    post_push_parser.add_argument("--images-file",
+                                  help="Path to a file with one image reference per line, optionally followed by the comma separated archs it should hold",
+                                  type=str,
+                                  default=None)
+    post_push_parser.add_argument("--deadline",
+                                  help="Minutes to keep polling for",
+                                  type=int,
+                                  default=30)
+    post_push_parser.add_argument("--not-found-grace",
+                                  help="Minutes after which the images that still do not exist are not polled anymore",
+                                  type=int,
+                                  default=5)
+    post_push_parser.add_argument("--initial-backoff",
+                                  help="Seconds to wait after the first poll, doubled after every poll",
+                                  type=int,
+                                  default=5)
+    post_push_parser.add_argument("--max-backoff",
+                                  help="Most seconds to wait between two polls",
+                                  type=int,
+                                  default=120)
+
+    history_parser = subparsers.add_parser("history", help="Query the history database")
+    history_parser.add_argument("query",
+                                help="Name of the query",
+                                type=str,
+                                choices=["old-tags", "publish-latency", "arch-changes"])
+    history_parser.add_argument("--min-runs",
+                                help="Minimum number of runs in a row a tag has been old for the old-tags query",
+                                type=int,
+                                default=3)
+    history_parser.add_argument("--runs",
+                                help="Number of the latest runs the publish-latency query looks at",
+                                type=int,
+                                default=100)
+    history_parser.add_argument("--repo",
+                                help="Name of the docker repo for the arch-changes query, eg. openjdk11",
+                                type=str,
+                                default=None)
+    history_parser.add_argument("--tag",
+                                help="Name of the tag for the arch-changes query",
+                                type=str,
+                                default=None)
+    history_parser.add_argument("--arch",
+                                help="Docker name of the architecture for the arch-changes query, eg. s390x",
+                                type=str,
+                                default=None)
+
+    args = parser.parse_args()
+
+    # --verify is only optional when merging results
+    if args.command is None and args.verify is None:
+        parser.error("the following arguments are required: --verify")
+
+    return vars(args)
 
 
 def run(parsed_args):
     """
     Main function that takes in arguments and processes them
     :param parsed_args: Dict of command line arguments
-    :return: None
+    :return: Integer - Exit code, 1 if a post push verification failed
     """
     docker_organization = "adoptopenjdk"
 
-    image_template = {
-        "version": "",
-        "jvm": "",
-        "arch": "",
-        "os": "",
-        "package": "",
-        "build": "",
-        "tag": ""
-    }
+    if parsed_args["command"] == "post-push":
+        # A failed build does not write its commands file, there is nothing to verify then
+        for option in ("push_commands", "manifest_commands", "images_file"):
+            if parsed_args[option] and not os.path.isfile(parsed_args[option]):
+                LOGGER.error("ERROR: {file} does not exist, nothing was pushed".format(file=parsed_args[option]))
+                return 1
+
+        targets = {}
+        if parsed_args["push_commands"]:
+            parse_push_commands(file_path=parsed_args["push_commands"], targets=targets)
+        if parsed_args["manifest_commands"]:
+            parse_manifest_commands(file_path=parsed_args["manifest_commands"], targets=targets)
+        if parsed_args["images_file"]:
+            parse_images_file(file_path=parsed_args["images_file"], targets=targets)
+
+        LOGGER.info("Verifying {number} pushed images.......".format(number=len(targets)))
+        statuses = verify_targets(targets=targets, deadline_minutes=parsed_args["deadline"], not_found_grace_minutes=parsed_args["not_found_grace"], initial_backoff=parsed_args["initial_backoff"], max_backoff=parsed_args["max_backoff"], delta_hours=parsed_args["delta_hours"], force_old_images=parsed_args["force_old_images"])
+        output_targets(statuses=statuses, json_output=parsed_args["json"])
+        return 0 if all(status["verdict"] == "live" for status in statuses) else 1
+
+    if parsed_args["command"] == "history":
+        output_history(parsed_args=parsed_args)
+        return
+
+    if parsed_args["command"] == "merge":
+        results_list = []
+        for file_path in parsed_args["files"]:
+            with open(file_path) as results_file:
+                results_list.append(json.load(results_file))
+
+        verify_type, processed_dict = merge_results(results_list=results_list)
+        if parsed_args["results_file"]:
+            save_results(image_dict=processed_dict, file_path=parsed_args["results_file"], verify_type=verify_type)
+        if parsed_args["report_file"]:
+            output_report(image_dict=processed_dict, parsed_args=parsed_args)
+        else:
+            output_results(image_dict=processed_dict, verify_type=verify_type, parsed_args=parsed_args)
+        return
 
-    images_template = {
-        "filtered_images": [],
-        "package_and_build": [],
-        "os_and_arch": [],
-        "jvm_and_arch": [],
-        "bad_requests": [],
-        "bad_manifests": [],
-        "old_images": []
-    }
+    images_template = copy.deepcopy(IMAGES_TEMPLATE)
+    started_at = datetime.utcnow()
 
-    LOGGER.info("Generating All Possible Images.......")
-    all_images = generate_all_image(supported_versions=parsed_args["versions"], supported_jvms=parsed_args["jvms"], supported_os=parsed_args["oss"], supported_packages=parsed_args["packages"], supported_builds=parsed_args["builds"], supported_archs=parsed_args["archs"], dict_image_template=image_template)
+    if parsed_args["index_file"]:
+        LOGGER.info("Generating Images From The Dockerfile Index.......")
+        with open(parsed_args["index_file"]) as index_file:
+            index = json.load(index_file)
+        all_images = generate_index_images(index=index, supported_versions=parsed_args["versions"], supported_jvms=parsed_args["jvms"], supported_os=parsed_args["oss"], supported_packages=parsed_args["packages"], supported_builds=parsed_args["builds"], supported_archs=parsed_args["archs"], dict_image_template=IMAGE_TEMPLATE)
+    else:
+        LOGGER.info("Generating All Possible Images.......")
+        all_images = generate_all_image(supported_versions=parsed_args["versions"] or DEFAULT_VERSIONS, supported_jvms=parsed_args["jvms"], supported_os=parsed_args["oss"] or DEFAULT_OSS, supported_packages=parsed_args["packages"], supported_builds=parsed_args["builds"], supported_archs=parsed_args["archs"], dict_image_template=IMAGE_TEMPLATE)
+
+    shard_index, shard_count = parsed_args["shard"]
+    if shard_count > 1:
+        all_images = filter_shard(image_list=all_images, shard_index=shard_index, shard_count=shard_count)
+        LOGGER.info("Scanning shard {index}/{count} with {number} images.......".format(index=shard_index, count=shard_count, number=len(all_images)))
 
     LOGGER.info("Processing images.......")
     if parsed_args["verify"] == "all":
         processed_dict = verify(image_list=all_images, dict_images_template=images_template, docker_org=docker_organization, filter_bad_manifests=parsed_args["filter_bad_manifests"], delta_hours=parsed_args["delta_hours"], force_old_images=parsed_args["force_old_images"])
-        if parsed_args["debug"]:
-            output_package_and_build(image_dict=processed_dict, json_output=parsed_args["json"])
-            output_os_and_arch(image_dict=processed_dict, json_output=parsed_args["json"])
-            output_jvm_and_arch(image_dict=processed_dict, json_output=parsed_args["json"])
-            output_bad_requests(image_dict=processed_dict, json_output=parsed_args["json"], valid_images=parsed_args["show_valid"])
-            output_bad_manifests(image_dict=processed_dict, json_output=parsed_args["json"])
-            output_old_images(image_dict=processed_dict, json_output=parsed_args["json"], valid_images=parsed_args["show_valid"], delta_hours=parsed_args["delta_hours"])
-
-        output_filtered_images(image_dict=processed_dict, json_output=parsed_args["json"])
     elif parsed_args["verify"] == "timedelta":
         processed_dict = verify_timedelta(image_list=all_images, dict_images_template=images_template, docker_org=docker_organization, filter_bad_manifests=parsed_args["filter_bad_manifests"], delta_hours=parsed_args["delta_hours"], force_old_images=parsed_args["force_old_images"])
-        output_old_images(image_dict=processed_dict, json_output=parsed_args["json"], valid_images=parsed_args["show_valid"], delta_hours=parsed_args["delta_hours"])
     elif parsed_args["verify"] == "manifests":
         processed_dict = verify_manifests(image_list=all_images, dict_images_template=images_template, docker_org=docker_organization, filter_bad_manifests=parsed_args["filter_bad_manifests"])
-        output_bad_manifests(image_dict=processed_dict, json_output=parsed_args["json"])
     elif parsed_args["verify"] == "images":
         processed_dict = verify_images(image_list=all_images, dict_images_template=images_template, docker_org=docker_organization)
-        output_bad_requests(image_dict=processed_dict, json_output=parsed_args["json"],  valid_images=parsed_args["show_valid"])
+
+    if parsed_args["results_file"]:
+        save_results(image_dict=processed_dict, file_path=parsed_args["results_file"], verify_type=parsed_args["verify"], shard=parsed_args["shard"])
+    if parsed_args["history_db"]:
+        record_history(image_dict=processed_dict, file_path=parsed_args["history_db"], started_at=started_at, verify_type=parsed_args["verify"], shard=parsed_args["shard"])
+    if parsed_args["report_file"]:
+        output_report(image_dict=processed_dict, parsed_args=parsed_args)
+    else:
+        output_results(image_dict=processed_dict, verify_type=parsed_args["verify"], parsed_args=parsed_args)
+
+    LOGGER.debug("Rate limiter stats: " + json.dumps(RATE_LIMITER.get_rates()))
 
 
 if __name__ == "__main__":
@@ -971,7 +1827,7 @@ if __name__ == "__main__":
     args = get_args()
 
     # Configure logging
-    load_logging_config(args["debug"], args["log_path"])
+    load_logging_config(args["debug"], args["log_path"], args["report_file"] == "-")
 
     LOGGER.debug("Parsed arguments: " + str(args))
-    run(parsed_args=args)
+    sys.exit(run(parsed_args=args))
@@ -0,0 +1,158 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import hashlib
+import http.server
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import binary_mirror
+
+BINARIES = {
+    "/jdk-a.tar.gz": b"a" * 100,
+    "/jdk-b.tar.gz": b"b" * 100,
+}
+
+
+class UpstreamHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the binaries and counts the requests for each of them
+    """
+    requests = {}
+
+    def do_GET(self):
+        UpstreamHandler.requests[self.path] = UpstreamHandler.requests.get(self.path, 0) + 1
+        body = BINARIES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start(httpd):
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return "http://127.0.0.1:{port}".format(port=httpd.server_port)
+
+
+def stop(httpd):
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def upstream():
+    UpstreamHandler.requests = {}
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), UpstreamHandler)
+    yield start(httpd)
+    stop(httpd)
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    # Room for one binary, a second one evicts the least recently used
+    mirror = binary_mirror.BinaryMirror(str(tmp_path / "cache"), max_bytes=150)
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), binary_mirror.MirrorRequestHandler)
+    httpd.mirror = mirror
+    mirror.url = start(httpd)
+    yield mirror
+    stop(httpd)
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.status, response.read()
+
+
+def mirror_url(mirror, upstream, path, sha256=None):
+    sha256 = sha256 or hashlib.sha256(BINARIES[path]).hexdigest()
+    return "{mirror}/sha256/{sha256}/{upstream}{path}".format(mirror=mirror.url, sha256=sha256, upstream=upstream, path=path)
+
+
+def get_metrics(mirror):
+    return json.loads(get(mirror.url + "/metrics")[1])
+
+
+def test_miss_then_hit(mirror, upstream):
+    assert get(mirror_url(mirror, upstream, "/jdk-a.tar.gz")) == (200, BINARIES["/jdk-a.tar.gz"])
+    assert get(mirror_url(mirror, upstream, "/jdk-a.tar.gz")) == (200, BINARIES["/jdk-a.tar.gz"])
+
+    assert UpstreamHandler.requests == {"/jdk-a.tar.gz": 1}
+    metrics = get_metrics(mirror)
+    assert (metrics["misses"], metrics["hits"], metrics["hit_ratio"]) == (1, 1, 0.5)
+    assert metrics["bytes_fetched"] == 100
+    assert metrics["bytes_served"] == 200
+    assert mirror.fill_locks == {}
+
+
+def test_cached_binary_without_url(mirror, upstream):
+    sha256 = hashlib.sha256(BINARIES["/jdk-a.tar.gz"]).hexdigest()
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get("{mirror}/sha256/{sha256}/".format(mirror=mirror.url, sha256=sha256))
+    assert error.value.code == 404
+
+    get(mirror_url(mirror, upstream, "/jdk-a.tar.gz"))
+    assert get("{mirror}/sha256/{sha256}/".format(mirror=mirror.url, sha256=sha256)) == (200, BINARIES["/jdk-a.tar.gz"])
+
+
+def test_checksum_mismatch(mirror, upstream):
+    sha256 = hashlib.sha256(b"something else").hexdigest()
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(mirror_url(mirror, upstream, "/jdk-a.tar.gz", sha256))
+    assert error.value.code == 502
+
+    assert get_metrics(mirror)["fill_failures"] == 1
+    # Neither the binary nor the partial download are kept
+    assert [files for _, _, files in os.walk(mirror.cache_dir) if files] == []
+    assert mirror.fill_locks == {}
+
+
+def test_invalid_sha256(mirror, upstream):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(mirror_url(mirror, upstream, "/jdk-a.tar.gz", "abc"))
+    assert error.value.code == 400
+    assert UpstreamHandler.requests == {}
+
+
+def test_eviction(mirror, upstream):
+    get(mirror_url(mirror, upstream, "/jdk-a.tar.gz"))
+    get(mirror_url(mirror, upstream, "/jdk-b.tar.gz"))
+
+    assert [entry["sha256"] for entry in mirror.get_entries()] == [hashlib.sha256(BINARIES["/jdk-b.tar.gz"]).hexdigest()]
+    metrics = get_metrics(mirror)
+    assert (metrics["evictions"], metrics["bytes_evicted"], metrics["cache_bytes"]) == (1, 100, 100)
+
+    # The evicted binary is downloaded again
+    assert get(mirror_url(mirror, upstream, "/jdk-a.tar.gz")) == (200, BINARIES["/jdk-a.tar.gz"])
+    assert UpstreamHandler.requests == {"/jdk-a.tar.gz": 2, "/jdk-b.tar.gz": 1}
+
+
+def test_evicted_while_open(mirror, upstream):
+    sha256 = hashlib.sha256(BINARIES["/jdk-a.tar.gz"]).hexdigest()
+    with mirror.open(sha256, upstream + "/jdk-a.tar.gz") as binary:
+        mirror.max_bytes = 0
+        assert mirror.evict() == 1
+        assert binary.read() == BINARIES["/jdk-a.tar.gz"]
@@ -0,0 +1,81 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import os
+import subprocess
+
+import pytest
+
+import build_metadata
+
+
+@pytest.fixture
+def metadata():
+    metadata = build_metadata.load_metadata("/nonexistent/build_metadata.json")
+    build_metadata.set_build(metadata, "11", "hotspot", "jdk", "releases", "jdk-11.0.11+9")
+    build_metadata.add_arch(metadata, "11", "hotspot", "jdk", "releases", "linux", "x86_64", "a" * 64, "1618833600", "jdk-11.0.11+9")
+    build_metadata.add_arch(metadata, "11", "hotspot", "jdk", "releases", "linux", "aarch64", "b" * 64, "1618837200", "jdk-11.0.11+9")
+    # An empty shasum means the arch has no binary
+    build_metadata.add_arch(metadata, "11", "hotspot", "jdk", "releases", "linux", "s390x", "", "", "")
+    build_metadata.add_arch(metadata, "11", "hotspot", "jdk", "releases", "windows", "windows-amd", "c" * 64, "1618840800", "jdk-11.0.11+9.1")
+    build_metadata.set_build(metadata, "11", "openj9", "jdk", "releases", "jdk-11.0.11+9_openj9-0.26.0")
+    return metadata
+
+
+def test_get_arches(metadata):
+    assert build_metadata.get_arches(metadata, "11", "hotspot", "jdk", "releases") == ["aarch64", "windows-amd", "x86_64"]
+    assert build_metadata.get_arches(metadata, "11", "hotspot", "jdk", "releases", "linux") == ["aarch64", "x86_64"]
+    assert build_metadata.get_arches(metadata, "11", "openj9", "jdk", "releases") == []
+    assert build_metadata.get_arches(metadata, "16", "hotspot", "jdk", "releases") == []
+
+
+def test_get_field(metadata):
+    assert build_metadata.get_field(metadata, "11", "hotspot", "jdk", "releases", "full_version") == "jdk-11.0.11+9"
+    assert build_metadata.get_field(metadata, "11", "hotspot", "jdk", "releases", "sha256", "linux", "aarch64") == "b" * 64
+    assert build_metadata.get_field(metadata, "11", "hotspot", "jdk", "releases", "version", "windows", "windows-amd") == "jdk-11.0.11+9.1"
+    assert build_metadata.get_field(metadata, "11", "hotspot", "jdk", "releases", "sha256", "linux", "ppc64le") == ""
+    assert build_metadata.get_field(metadata, "16", "hotspot", "jdk", "releases", "full_version") == ""
+
+
+def test_set_build_resets_arches(metadata):
+    build_metadata.set_build(metadata, "11", "hotspot", "jdk", "releases", "jdk-11.0.12+7")
+    assert build_metadata.get_arches(metadata, "11", "hotspot", "jdk", "releases") == []
+
+
+def test_add_arch_unknown_build(metadata):
+    with pytest.raises(ValueError):
+        build_metadata.add_arch(metadata, "16", "hotspot", "jdk", "releases", "linux", "x86_64", "a" * 64, "", "")
+
+
+def test_save_and_load(metadata, tmp_path):
+    file_path = str(tmp_path / "build_metadata.json")
+    build_metadata.save_metadata(metadata, file_path)
+    assert build_metadata.load_metadata(file_path) == metadata
+    assert os.listdir(str(tmp_path)) == ["build_metadata.json"]
+
+
+def test_export_bash(metadata, tmp_path):
+    sums_file = str(tmp_path / "hotspot_shasums_latest.sh")
+    build_time_file = str(tmp_path / "hotspot_build_time_latest.sh")
+    build_metadata.export_bash(metadata, "hotspot", sums_file, build_time_file)
+
+    # The files are sourced by the build scripts, read them back the same way
+    script = "source {sums}; source {times}; " \
+             "echo ${{jdk_hotspot_11_releases_sums[version]}} ${{jdk_hotspot_11_releases_sums[linux_aarch64]}} " \
+             "${{jdk_hotspot_11_releases_sums[version-windows_windows-amd]}} ${{jdk_hotspot_11_releases_build_time[linux_x86_64]}}"
+    output = subprocess.run(["bash", "-c", script.format(sums=sums_file, times=build_time_file)], check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    assert output.split() == ["jdk-11.0.11+9", "b" * 64, "jdk-11.0.11+9.1", "1618833600"]
+    # Only the arrays of the given VM are exported
+    with open(sums_file) as bash_file:
+        assert "openj9" not in bash_file.read()
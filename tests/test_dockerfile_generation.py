@@ -0,0 +1,107 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+# Multi-stage Dockerfiles generate_dockerfile writes for fixed shasums and binary links.
+# Regenerate them with "python3 tests/test_dockerfile_generation.py" after changing dockerfile_functions.sh
+GOLDEN_DIR = os.path.join(TESTS_DIR, "fixtures", "multistage")
+
+# version, vm, package, build, build type, OS family and OS of each golden Dockerfile
+DOCKERFILES = [
+    ("8", "hotspot", "jdk", "releases", "slim", "linux", "ubuntu"),
+    ("11", "hotspot", "jre", "nightly", "full", "alpine-linux", "alpine"),
+    ("11", "openj9", "jdk", "releases", "full", "linux", "ubi")
+]
+
+# The adoptopenjdk api is replaced by a link made of the version and arch, the shasums by a fixed value per arch
+GENERATE_SCRIPT = """
+source ./common_functions.sh
+source ./dockerfile_functions.sh
+
+fetch_url() {
+	local arch=${1##*architecture=}
+	echo "[{\\"binaries\\":[{\\"package\\":{\\"link\\":\\"https://github.com/AdoptOpenJDK/openjdk${version}-binaries/${arch%%&*}.tar.gz\\"}}]}]" > "$2"
+}
+
+version=$1; vm=$2; package=$3; build=$4; btype=$5; osfamily=$6; os=$7
+current_arch="x86_64"
+multistage=1
+shasums="${package}_${vm}_${version}_${build}_sums"
+declare -A "${shasums}"
+declare -n sums="${shasums}"
+sums[version]="jdk-${version}-fixture"
+for arch in aarch64 ppc64le s390x x86_64
+do
+	sums[${osfamily}_${arch}]=$(echo "${version} ${vm} ${package} ${arch}" | sha256sum | cut -d' ' -f1)
+done
+generate_dockerfile "$8" "${package}" "${build}" "${btype}" "${osfamily}" "${os}" > /dev/null
+"""
+
+
+def get_golden_path(dockerfile):
+    return os.path.join(GOLDEN_DIR, "Dockerfile.{version}.{vm}.{package}.{build}.{btype}.{os}".format(
+        version=dockerfile[0], vm=dockerfile[1], package=dockerfile[2], build=dockerfile[3], btype=dockerfile[4], os=dockerfile[6]))
+
+
+def generate(dockerfile, file_path):
+    """
+    Generate a multi-stage Dockerfile with the functions of dockerfile_functions.sh
+    :param dockerfile: Tuple - version, vm, package, build, build type, OS family and OS
+    :param file_path: String - Path of the Dockerfile to write
+    :return: String - Content of the Dockerfile
+    """
+    # common_functions.sh reads the configs relative to the repo
+    subprocess.run(["bash", "-c", GENERATE_SCRIPT, "generate"] + list(dockerfile) + [file_path], cwd=REPO_DIR, check=True)
+    with open(file_path) as generated_file:
+        return generated_file.read()
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="generate_dockerfile needs bash")
+@pytest.mark.parametrize("dockerfile", DOCKERFILES, ids=lambda dockerfile: os.path.basename(get_golden_path(dockerfile)))
+def test_multistage_matches_golden_dockerfile(dockerfile, tmp_path):
+    generated = generate(dockerfile, str(tmp_path / "Dockerfile"))
+
+    with open(get_golden_path(dockerfile)) as golden_file:
+        assert generated == golden_file.read()
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="generate_dockerfile needs bash")
+def test_multistage_stages(tmp_path):
+    generated = generate(DOCKERFILES[0], str(tmp_path / "Dockerfile"))
+
+    # build_latest.sh keeps the cache of the openjdk stage only, the slim stage runs java so it needs libffi6 on s390x
+    stages = [line.split()[-1] for line in generated.splitlines() if line.startswith("FROM ")]
+    assert stages == ["openjdk", "openjdk-slim", "runtime"]
+    assert generated.count("libffi6.deb ${LIBFFI_URL}") == 2
+    assert "COPY --from=openjdk-slim /opt/java/openjdk /opt/java/openjdk" in generated
+
+
+if __name__ == "__main__":
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for dockerfile in DOCKERFILES:
+            content = generate(dockerfile, os.path.join(tmp_dir, "Dockerfile"))
+            with open(get_golden_path(dockerfile), "w") as golden_file:
+                golden_file.write(content)
+    sys.stdout.write("{number} golden Dockerfiles written to {golden}\n".format(number=len(DOCKERFILES), golden=GOLDEN_DIR))
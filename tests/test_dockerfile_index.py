@@ -0,0 +1,137 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import logging
+import os
+
+import pytest
+
+import dockerfile_index
+
+DOCKERFILE = """FROM ubuntu:20.04
+
+ENV JAVA_VERSION jdk-12.0.2+10
+
+RUN set -eux; \\
+    ARCH="$(dpkg --print-architecture)"; \\
+    case "${{ARCH}}" in \\
+       aarch64|arm64) \\
+         ESUM='{sum_a}'; \\
+         BINARY_URL='https://github.com/aarch64.tar.gz'; \\
+         ;; \\
+       {arm_arm}) \\
+         ESUM='{sum_b}'; \\
+         BINARY_URL='https://github.com/arm.tar.gz'; \\
+         ;; \\
+       ppc64el) \\
+         ESUM='{sum_c}'; \\
+         BINARY_URL='https://github.com/ppc64le.tar.gz'; \\
+         ;; \\
+       amd64) \\
+         ESUM='{sum_d}'; \\
+         BINARY_URL='https://github.com/x64.tar.gz'; \\
+         ;; \\
+       *) \\
+         echo "Unsupported arch: ${{ARCH}}"; \\
+         exit 1; \\
+         ;; \\
+    esac;
+
+ENV JAVA_TOOL_OPTIONS="-XX:+UseContainerSupport"
+"""
+
+
+def make_dockerfile(arm_arm="armhf"):
+    return DOCKERFILE.format(arm_arm=arm_arm, sum_a="a" * 64, sum_b="b" * 64, sum_c="c" * 64, sum_d="d" * 64)
+
+
+def test_parse_dockerfile():
+    entry = dockerfile_index.parse_dockerfile("12/jdk/ubuntu/Dockerfile.hotspot.releases.full", make_dockerfile())
+
+    assert (entry["version"], entry["package"], entry["os"], entry["vm"], entry["build"], entry["type"]) == ("12", "jdk", "ubuntu", "hotspot", "releases", "full")
+    assert entry["from"] == "ubuntu:20.04"
+    assert entry["java_version"] == "jdk-12.0.2+10"
+    assert entry["java_tool_options"] == "-XX:+UseContainerSupport"
+    # The dpkg names of the arches are indexed under the names of the Dockerfiles
+    assert entry["arches"] == {
+        "aarch64": {"esum": "a" * 64, "binary_url": "https://github.com/aarch64.tar.gz"},
+        "armv7l": {"esum": "b" * 64, "binary_url": "https://github.com/arm.tar.gz"},
+        "ppc64le": {"esum": "c" * 64, "binary_url": "https://github.com/ppc64le.tar.gz"},
+        "x86_64": {"esum": "d" * 64, "binary_url": "https://github.com/x64.tar.gz"}
+    }
+    assert dockerfile_index.get_official_arches(entry) == ["amd64", "arm32v7", "arm64v8", "ppc64le"]
+
+
+def test_parse_dockerfile_unknown_arch(caplog):
+    with caplog.at_level(logging.WARNING):
+        entry = dockerfile_index.parse_dockerfile("12/jdk/ubuntu/Dockerfile.hotspot.releases.full", make_dockerfile("riscv64"))
+
+    assert sorted(entry["arches"]) == ["aarch64", "ppc64le", "x86_64"]
+    assert "Unknown arch riscv64" in caplog.text
+
+
+def test_parse_dockerfile_windows():
+    content = "\n".join([
+        "FROM mcr.microsoft.com/windows/servercore:ltsc2019",
+        "RUN Write-Host ('Downloading https://github.com/x64.msi ...'); \\",
+        "    curl.exe -LfsSo openjdk.msi https://github.com/x64.msi ; \\",
+        "    if ((Get-FileHash openjdk.msi -Algorithm sha256).Hash -ne '{esum}') {{ \\".format(esum="e" * 64),
+    ])
+    entry = dockerfile_index.parse_dockerfile("11/jdk/windows/windowsservercore-ltsc2019/Dockerfile.hotspot.releases.full", content)
+
+    assert entry["directory"] == "11/jdk/windows/windowsservercore-ltsc2019"
+    assert entry["arches"] == {"windows-amd": {"esum": "e" * 64, "binary_url": "https://github.com/x64.msi"}}
+
+
+def test_parse_dockerfile_invalid_path():
+    with pytest.raises(ValueError):
+        dockerfile_index.parse_dockerfile("12/jdk/Dockerfile", "")
+
+
+def write(root_dir, path, content):
+    os.makedirs(os.path.join(root_dir, os.path.dirname(path)), exist_ok=True)
+    with open(os.path.join(root_dir, path), "w") as dockerfile:
+        dockerfile.write(content)
+
+
+def test_update_index(tmp_path):
+    root_dir = str(tmp_path)
+    full = "12/jdk/ubuntu/Dockerfile.hotspot.releases.full"
+    slim = "12/jdk/ubuntu/Dockerfile.hotspot.releases.slim"
+    write(root_dir, full, make_dockerfile())
+    write(root_dir, slim, make_dockerfile())
+    write(root_dir, "docs/Dockerfile.hotspot.releases.full", "not indexed")
+
+    index = dockerfile_index.load_index(os.path.join(root_dir, "missing.json"))
+    assert dockerfile_index.update_index(index, root_dir) == {"unchanged": 0, "rehashed": 0, "parsed": 2, "removed": 0}
+    assert sorted(index["dockerfiles"]) == [full, slim]
+
+    index_file = os.path.join(root_dir, "dockerfile_index.json")
+    dockerfile_index.save_index(index, index_file)
+    index = dockerfile_index.load_index(index_file)
+    assert dockerfile_index.update_index(index, root_dir) == {"unchanged": 2, "rehashed": 0, "parsed": 0, "removed": 0}
+
+    # A touched file is hashed again but not parsed, a changed one is parsed
+    stat = os.stat(os.path.join(root_dir, full))
+    os.utime(os.path.join(root_dir, full), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    write(root_dir, slim, make_dockerfile("armhf|armv7l").replace("jdk-12.0.2+10", "jdk-12.0.3+1"))
+    os.utime(os.path.join(root_dir, slim), ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+    assert dockerfile_index.update_index(index, root_dir) == {"unchanged": 0, "rehashed": 1, "parsed": 1, "removed": 0}
+    assert index["dockerfiles"][full]["mtime_ns"] == stat.st_mtime_ns + 10 ** 9
+    assert index["dockerfiles"][slim]["java_version"] == "jdk-12.0.3+1"
+
+    os.remove(os.path.join(root_dir, full))
+    assert dockerfile_index.update_index(index, root_dir) == {"unchanged": 1, "rehashed": 0, "parsed": 0, "removed": 1}
+    assert [entry["path"] for entry in dockerfile_index.query(index, vm="hotspot", type="slim")] == [slim]
+    assert dockerfile_index.query(index, type="full") == []
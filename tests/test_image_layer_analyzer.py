@@ -0,0 +1,135 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import io
+import json
+import tarfile
+
+import pytest
+
+import image_layer_analyzer
+
+
+def add_file(archive, name, content):
+    """
+    Add a regular file to a tar
+    :param archive: TarFile - Tar opened for writing
+    :param name: String - Path of the file
+    :param content: Bytes - Content of the file
+    :return: None
+    """
+    info = tarfile.TarInfo(name)
+    info.size = len(content)
+    archive.addfile(info, io.BytesIO(content))
+
+
+def make_layer(files):
+    """
+    Build a layer tar in memory
+    :param files: Dict - Path to content, None for an empty whiteout file
+    :return: Bytes - Layer tar
+    """
+    layer = io.BytesIO()
+    with tarfile.open(fileobj=layer, mode="w") as archive:
+        for name, content in files.items():
+            add_file(archive, name, content or b"")
+    return layer.getvalue()
+
+
+def make_archive(path, images):
+    """
+    Write a docker save archive
+    :param path: Path - Archive to write
+    :param images: List - (tags, list of layers) of every image, a layer is a dict of path to content
+    :return: None
+    """
+    manifest = []
+    with tarfile.open(str(path), mode="w") as archive:
+        for image_number, (tags, layers) in enumerate(images):
+            layer_names = []
+            for layer_number, files in enumerate(layers):
+                name = "{image}{layer}/layer.tar".format(image=image_number, layer=layer_number)
+                add_file(archive, name, make_layer(files))
+                layer_names.append(name)
+            manifest.append({"Config": "{image}.json".format(image=image_number), "RepoTags": tags, "Layers": layer_names})
+        add_file(archive, "manifest.json", json.dumps(manifest).encode())
+
+
+def test_layers_duplicates_and_whiteouts(tmp_path):
+    archive = tmp_path / "image.tar"
+    make_archive(archive, [(["test:full"], [
+        {"./opt/java/lib/modules": b"m" * 100, "opt/java/bin/java": b"j" * 10, "tmp/cache/a": b"a" * 30, "tmp/cache/b": b"b" * 20},
+        {"opt/java/lib/modules": b"M" * 80, "tmp/.wh.cache": None},
+        {"opt/java/.wh..wh..opq": None, "opt/java/release": b"r" * 5}
+    ])])
+
+    image = image_layer_analyzer.analyze_archive(str(archive), top=2)["images"][0]
+
+    assert image["tags"] == ["test:full"]
+    assert [layer["size"] for layer in image["layers"]] == [160, 80, 5]
+    assert [layer["whiteouts"] for layer in image["layers"]] == [0, 1, 1]
+    assert image["total_size"] == 245
+    assert image["largest_files"] == [{"path": "opt/java/lib/modules", "size": 100, "layer": "00/layer.tar"},
+                                      {"path": "opt/java/lib/modules", "size": 80, "layer": "01/layer.tar"}]
+
+    assert image["duplicate_count"] == 1
+    assert image["duplicate_bytes"] == 100
+    assert image["duplicate_files"] == [{"path": "opt/java/lib/modules", "layers": ["00/layer.tar", "01/layer.tar"], "wasted_bytes": 100}]
+
+    # tmp/cache hides both cache files, the opaque whiteout hides everything under opt/java in the lower layers
+    assert image["whited_out_count"] == 5
+    assert image["whited_out_bytes"] == 240
+    assert image["whited_out_files"] == [{"path": "opt/java/lib/modules", "layer": "00/layer.tar", "size": 100, "removed_by": "02/layer.tar"},
+                                         {"path": "opt/java/lib/modules", "layer": "01/layer.tar", "size": 80, "removed_by": "02/layer.tar"}]
+
+
+def test_whiteout_does_not_match_sibling_prefix(tmp_path):
+    archive = tmp_path / "image.tar"
+    make_archive(archive, [(["test:full"], [
+        {"usr/lib/a": b"a" * 10, "usr/lib64/b": b"b" * 10, "usr/lib.so": b"c" * 10},
+        {"usr/.wh.lib": None}
+    ])])
+
+    image = image_layer_analyzer.analyze_archive(str(archive))["images"][0]
+
+    assert [entry["path"] for entry in image["whited_out_files"]] == ["usr/lib/a"]
+
+
+def test_slim_full_deltas(tmp_path):
+    archive = tmp_path / "images.tar"
+    make_archive(archive, [
+        (["test:jdk"], [{"opt/java/lib/modules": b"m" * 100, "opt/java/jmods/java.base.jmod": b"j" * 50}]),
+        (["test:jdk-slim"], [{"opt/java/lib/modules": b"m" * 60}])
+    ])
+
+    report = image_layer_analyzer.analyze_archive(str(archive), depth=2)
+    deltas = image_layer_analyzer.get_slim_full_deltas([report])
+
+    assert deltas == [{
+        "full": "test:jdk",
+        "slim": "test:jdk-slim",
+        "full_size": 150,
+        "slim_size": 60,
+        "size_delta": -90,
+        "directories": {"opt/java": -90}
+    }]
+
+
+def test_archive_without_manifest(tmp_path):
+    archive = tmp_path / "image.tar"
+    with tarfile.open(str(archive), mode="w") as tar:
+        add_file(tar, "0/layer.tar", make_layer({"a": b"a"}))
+
+    with pytest.raises(ValueError, match="no manifest.json"):
+        image_layer_analyzer.analyze_archive(str(archive))
@@ -0,0 +1,80 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import json
+import os
+import subprocess
+
+import pipeline_trace
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def event(name, ts, dur, **args):
+    return {"name": name, "cat": "pipeline", "ph": "X", "ts": ts, "dur": dur, "pid": 1, "tid": 1, "args": args}
+
+
+def test_trace_functions(tmp_path):
+    trace_file = str(tmp_path / "pipeline_trace.json")
+    # The spans are closed in the reverse order, an unmatched trace_end is ignored
+    script = "source ./common_functions.sh; trace_init; " \
+             "trace_begin build_all; trace_begin docker_build image='a\"b'; trace_end status=failure; " \
+             "trace_begin docker_push; trace_end; trace_end; trace_end"
+    subprocess.run(["bash", "-c", script], cwd=REPO_DIR, env={"trace_file": trace_file, "PATH": "/usr/bin:/bin"}, check=True)
+
+    events = pipeline_trace.load_events(trace_file)
+    assert [(item["name"], item["ph"]) for item in events] == [("process_name", "M"), ("docker_build", "X"), ("docker_push", "X"), ("build_all", "X")]
+    assert events[1]["args"] == {"image": "a\"b", "status": "failure"}
+    assert events[2]["args"] == {}
+
+    roots = pipeline_trace.build_span_tree(events)
+    assert [span["name"] for span in roots] == ["build_all"]
+    assert [span["name"] for span in roots[0]["children"]] == ["docker_build", "docker_push"]
+
+    # The closed trace is a complete JSON document with the same events
+    pipeline_trace.close_trace(trace_file)
+    with open(trace_file) as closed_file:
+        assert json.load(closed_file)["traceEvents"] == events
+    assert pipeline_trace.load_events(trace_file) == events
+
+
+def test_trace_functions_without_trace_file(tmp_path):
+    output = subprocess.run(["bash", "-c", "source ./common_functions.sh; trace_init; trace_begin build_all; trace_end; echo done"],
+                            cwd=REPO_DIR, env={"PATH": "/usr/bin:/bin"}, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    assert output == "done\n"
+
+
+def test_span_tree_and_stats():
+    events = [
+        event("build_all", 0, 100),
+        event("docker_build", 10, 40, image="a"),
+        event("docker_build", 50, 30, image="b"),
+        event("snyk", 60, 15, image="b"),
+        event("test_all", 200, 20)
+    ]
+    roots = pipeline_trace.build_span_tree(events)
+
+    assert [span["name"] for span in roots] == ["build_all", "test_all"]
+    assert [span["name"] for span in pipeline_trace.get_critical_path(roots)] == ["build_all", "docker_build"]
+    assert pipeline_trace.get_critical_path(roots)[1]["args"] == {"image": "a"}
+    stats = {stage["name"]: stage for stage in pipeline_trace.get_stage_stats(roots)}
+    assert stats["build_all"] == {"name": "build_all", "count": 1, "total": 100, "self": 30, "max": 100}
+    assert stats["docker_build"] == {"name": "docker_build", "count": 2, "total": 70, "self": 55, "max": 40}
+    assert [(span["name"], span["duration"]) for span in pipeline_trace.get_slowest_spans(roots, 2)] == [("docker_build", 40), ("test_all", 20)]
+
+
+def test_format_duration():
+    assert pipeline_trace.format_duration(1500000) == "1.5s"
+    assert pipeline_trace.format_duration(62000000) == "1m02s"
+    assert pipeline_trace.format_duration(3723000000) == "1h02m03s"
@@ -0,0 +1,104 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import http.server
+import json
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+import rate_limiter
+
+
+class ThrottlingHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers the first request with a 429 and every later one with the body and a Last-Modified header
+    """
+    requests = 0
+
+    def do_GET(self):
+        ThrottlingHandler.requests += 1
+        if ThrottlingHandler.requests == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        body = b"3f2a sha256\n"
+        self.send_response(200)
+        self.send_header("Last-Modified", "Thu, 22 Apr 2021 03:05:28 GMT")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    ThrottlingHandler.requests = 0
+    httpd = http.server.HTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{port}".format(port=httpd.server_port)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_parse_retry_after():
+    now = datetime(2021, 4, 22, 3, 5, 0, tzinfo=timezone.utc)
+
+    assert rate_limiter.parse_retry_after("120") == 120.0
+    assert rate_limiter.parse_retry_after("Thu, 22 Apr 2021 03:05:30 GMT", now) == 30.0
+    assert rate_limiter.parse_retry_after("soon") is None
+    assert rate_limiter.parse_retry_after(None) is None
+
+
+def test_host_limiter_aimd():
+    host_limiter = rate_limiter.HostLimiter(initial_rate=4.0, initial_concurrency=4.0)
+
+    host_limiter.update(200)
+    assert host_limiter.rate == pytest.approx(4.1)
+
+    host_limiter.update(429, retry_after=5.0)
+    assert host_limiter.rate == pytest.approx(2.05)
+    assert host_limiter.concurrency == pytest.approx(2.125)
+    assert host_limiter.get_wait(host_limiter.updated) > 4.0
+
+    # Responses of the same burst only back off once
+    host_limiter.update(503)
+    assert host_limiter.rate == pytest.approx(2.05)
+
+
+def test_fetch_retries_and_shares_state(server, tmp_path):
+    state_file = str(tmp_path / "state.json")
+
+    status_code, body, headers = rate_limiter.fetch(server + "/sums.txt", state_file=state_file, initial_rate=100.0, max_rate=200.0)
+
+    assert status_code == 200
+    assert body == b"3f2a sha256\n"
+    assert headers["Last-Modified"] == "Thu, 22 Apr 2021 03:05:28 GMT"
+    assert ThrottlingHandler.requests == 2
+    with open(state_file) as state:
+        # Backed off once from the initial rate, then one successful response
+        assert json.load(state)[server[len("http://"):]]["rate"] == pytest.approx(50.1)
+
+
+def test_fetch_header_command(server, tmp_path, capsys):
+    args = {"state_file": str(tmp_path / "state.json"), "command": "fetch", "url": server + "/sums.txt", "output": None,
+            "header": "Last-Modified", "initial_rate": 100.0, "max_rate": 200.0, "max_attempts": 5}
+
+    assert rate_limiter.run(args) == 0
+    assert capsys.readouterr().out == "Thu, 22 Apr 2021 03:05:28 GMT\n"
@@ -0,0 +1,116 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import copy
+from datetime import datetime, timedelta
+
+import pytest
+
+import scan_history
+import scanner
+
+STARTED_AT = datetime(2021, 4, 22, 3, 0, 0)
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = scan_history.connect(str(tmp_path / "history.db"))
+    yield connection
+    connection.close()
+
+
+def record(connection, run, verdict, arches):
+    """
+    Record a run with a single tag, amd64 and s390x are expected and every pushed arch is present
+    :param connection: sqlite3 Connection
+    :param run: Integer - Number of the run, the runs are an hour apart
+    :param verdict: String - Verdict of the tag
+    :param arches: Dict - Last push of each present arch
+    :return: Integer - Id of the run
+    """
+    tag_results = [{"repo": "openjdk11", "tag": "latest", "verdict": verdict, "last_updated": max(arches.values()), "arches": ",".join(sorted(arches))}]
+    arch_results = [{"repo": "openjdk11", "tag": "latest", "arch": arch, "expected": int(arch in ("amd64", "s390x")), "present": int(arch in arches), "last_pushed": arches.get(arch)}
+                    for arch in sorted(set(arches) | {"amd64", "s390x"})]
+    request_timings = [{"repo": "openjdk11", "tag": "latest", "request": "tag", "status_code": 200, "duration": 0.25}]
+    return scan_history.record_run(connection, STARTED_AT + timedelta(hours=run), "all", "0/1", tag_results, arch_results, request_timings)
+
+
+def test_record_run(connection):
+    run_id = record(connection, 0, "ok", {"amd64": "2021-04-22T01:00:00.000000Z", "s390x": "2021-04-22T01:30:00Z"})
+
+    assert dict(connection.execute("SELECT * FROM runs").fetchone()) == {"id": run_id, "started_at": "2021-04-22T03:00:00.000000Z", "verify": "all", "shard": "0/1"}
+    assert [dict(row) for row in connection.execute("SELECT run_id, verdict, arches FROM tag_results")] == [{"run_id": run_id, "verdict": "ok", "arches": "amd64,s390x"}]
+    assert connection.execute("SELECT COUNT(*) FROM arch_results WHERE run_id = ?", (run_id,)).fetchone()[0] == 2
+    assert connection.execute("SELECT duration FROM request_timings").fetchone()[0] == 0.25
+
+
+def test_record_run_is_atomic(connection):
+    with pytest.raises(KeyError):
+        scan_history.record_run(connection, STARTED_AT, "all", "0/1", [{"repo": "openjdk11", "tag": "latest"}], [], [])
+
+    assert connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 0
+
+
+def test_old_tags(connection):
+    record(connection, 0, "ok", {"amd64": "2021-04-22T01:00:00Z"})
+    record(connection, 1, "old", {"amd64": "2021-04-22T01:00:00Z"})
+    record(connection, 2, "old", {"amd64": "2021-04-22T01:00:00Z"})
+
+    assert [(row["tag"], row["old_runs"], row["old_since"]) for row in scan_history.get_old_tags(connection, 2)] == [("latest", 2, "2021-04-22T04:00:00.000000Z")]
+    assert scan_history.get_old_tags(connection, 3) == []
+
+
+def test_publish_latency(connection):
+    # ppc64le was never pushed again, s390x of the second update is pushed after the manifest was first updated without it
+    stale = "2021-03-01T00:00:00Z"
+    record(connection, 0, "ok", {"amd64": "2021-04-22T01:00:00Z", "s390x": "2021-04-22T01:30:00.500000Z", "ppc64le": stale})
+    record(connection, 1, "bad_manifest", {"amd64": "2021-04-22T05:00:00.000000Z", "ppc64le": stale})
+    record(connection, 2, "ok", {"amd64": "2021-04-22T05:00:00.000000Z", "s390x": "2021-04-22T06:00:00Z", "ppc64le": stale})
+    record(connection, 3, "ok", {"amd64": "2021-04-22T05:00:00.000000Z", "s390x": "2021-04-22T06:00:00Z", "ppc64le": stale})
+
+    # The amd64 push seen in three runs is only counted once, the first run has no previous update to compare with
+    expected = {
+        "amd64": {"median_seconds": 0.0, "pushes": 1},
+        "s390x": {"median_seconds": 3600.0, "pushes": 1}
+    }
+    assert scan_history.get_publish_latency(connection) == expected
+    assert scan_history.get_publish_latency(connection, runs=2) == expected
+    assert scan_history.get_publish_latency(connection, runs=1) == {}
+    assert [(change["run_id"], change["change"]) for change in scan_history.get_arch_changes(connection, "openjdk11", "latest", "s390x")] == [(2, "lost"), (3, "added")]
+
+
+def test_publish_latency_uses_the_join_index(connection):
+    plan = " ".join(row["detail"] for row in connection.execute("EXPLAIN QUERY PLAN SELECT * FROM arch_results WHERE repo = ? AND tag = ? AND run_id = ?", ("openjdk11", "latest", 1)))
+    assert "USING INDEX arch_results_run" in plan
+
+
+def test_record_history(tmp_path, monkeypatch):
+    image_dict = copy.deepcopy(scanner.IMAGES_TEMPLATE)
+    image = dict(scanner.IMAGE_TEMPLATE, version="11", jvm="hotspot", os="ubuntu", package="jdk", build="full", tag="latest")
+    image_dict["filtered_images"].append(dict(image, arch="x86_64"))
+    image_dict["old_images"].append(dict(image, arch="s390x"))
+    monkeypatch.setattr(scanner, "IMAGE_JSONS", {("openjdk11", "latest"): {"last_updated": "2021-04-22T01:00:00Z", "images": [{"architecture": "amd64", "last_pushed": "2021-04-22T01:00:00Z"}]}})
+    monkeypatch.setattr(scanner, "REQUEST_TIMINGS", [])
+
+    file_path = str(tmp_path / "history.db")
+    run_id = scanner.record_history(image_dict, file_path, STARTED_AT, "all", (1, 2))
+
+    connection = scan_history.connect(file_path)
+    try:
+        # The tag gets the worst verdict of its archs, the missing s390x is expected but not present
+        assert [dict(row) for row in connection.execute("SELECT run_id, repo, tag, verdict, arches FROM tag_results")] == [{"run_id": run_id, "repo": "openjdk11", "tag": "latest", "verdict": "old", "arches": "amd64"}]
+        assert [(row["arch"], row["expected"], row["present"]) for row in connection.execute("SELECT * FROM arch_results ORDER BY arch")] == [("amd64", 1, 1), ("s390x", 1, 0)]
+        assert connection.execute("SELECT shard FROM runs").fetchone()[0] == "1/2"
+    finally:
+        connection.close()
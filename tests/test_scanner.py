@@ -0,0 +1,334 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import copy
+import csv
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import types
+from datetime import datetime, timedelta
+from xml.etree import ElementTree
+
+import pytest
+
+import scanner
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeResponse:
+    """
+    Response of the fake DockerHub API
+    """
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = {}
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def make_image(tag, arch="x86_64", version="11", jvm="hotspot"):
+    """
+    Make an image of the scanner image list
+    :param tag: String - Tag of the image
+    :param arch: String - Arch of the image
+    :param version: String - Java version
+    :param jvm: String - Name of the JVM
+    :return: Dict - Image
+    """
+    return dict(scanner.IMAGE_TEMPLATE, version=version, jvm=jvm, arch=arch, os="ubuntu", package="jdk", build="full", tag=tag)
+
+
+def make_tag_json(name, digest, last_updated, architectures=("amd64",)):
+    """
+    Make the DockerHub JSON of a tag
+    :param name: String - Tag name
+    :param digest: String - Manifest digest
+    :param last_updated: Datetime - Last push of the tag
+    :param architectures: Tuple - Docker arch names in the manifest
+    :return: Dict - Tag JSON
+    """
+    return {
+        "name": name,
+        "digest": digest,
+        "last_updated": last_updated.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "images": [{"architecture": architecture, "digest": digest + architecture} for architecture in architectures]
+    }
+
+
+@pytest.fixture
+def dockerhub(monkeypatch):
+    """
+    Fake DockerHub with one page of recent tags per repo and the single tag endpoint for the rest
+    """
+    now = datetime.utcnow()
+    tags = {
+        "jdk11u-ubuntu-nightly": make_tag_json("jdk11u-ubuntu-nightly", "sha256:a", now, ("amd64", "s390x")),
+        "jdk11u-nightly": make_tag_json("jdk11u-nightly", "sha256:a", now - timedelta(hours=5), ("amd64", "s390x")),
+        "jdk11u-centos-nightly": make_tag_json("jdk11u-centos-nightly", "sha256:b", now)
+    }
+    old_tag = make_tag_json("jdk11u-clefos-nightly", "sha256:c", now - timedelta(days=30))
+    requested = []
+
+    def get(url):
+        requested.append(url)
+        if "/tags?" in url:
+            return FakeResponse(200, {"results": list(tags.values()), "next": None})
+        if url.endswith("/tags/jdk11u-clefos-nightly"):
+            return FakeResponse(200, old_tag)
+        return FakeResponse(404)
+
+    monkeypatch.setattr(scanner.requests, "get", get)
+    monkeypatch.setattr(scanner, "REQUEST_TIMINGS", [])
+    monkeypatch.setattr(scanner, "IMAGE_JSONS", {})
+    return requested
+
+
+def test_enrich_reads_the_tags_list_once_per_repo(dockerhub):
+    image_list = [make_image("jdk11u-ubuntu-nightly"), make_image("jdk11u-ubuntu-nightly", arch="s390x"),
+                  make_image("jdk11u-nightly"), make_image("jdk11u-centos-nightly"), make_image("jdk11u-clefos-nightly")]
+
+    enriched = scanner.enrich_list_with_image_json(image_list)
+
+    # One page for the repo, the old tag is not on it and is fetched on its own
+    assert len(dockerhub) == 2
+    assert dockerhub[1].endswith("/openjdk11/tags/jdk11u-clefos-nightly")
+    assert [image["digest"] for image in enriched] == ["sha256:a", "sha256:a", "sha256:a", "sha256:b", "sha256:c"]
+
+
+def test_alias_tags_cost_no_extra_requests(dockerhub):
+    image_list = scanner.enrich_list_with_image_json([make_image("jdk11u-ubuntu-nightly", arch="s390x"), make_image("jdk11u-nightly", arch="s390x"),
+                                                      make_image("jdk11u-centos-nightly", arch="s390x")])
+
+    filtered, removed = scanner.filter_arch_in_manifest(image_list)
+
+    # The two alias tags of sha256:a and the third tag are all read from the single page of tags
+    assert len(dockerhub) == 1
+    assert [image["tag"] for image in filtered] == ["jdk11u-ubuntu-nightly", "jdk11u-nightly"]
+    assert [image["tag"] for image in removed] == ["jdk11u-centos-nightly"]
+
+
+def test_timedelta_is_checked_per_tag(dockerhub):
+    # Both tags share a digest, but the alias was pushed 5 hours ago
+    image_list = scanner.enrich_list_with_image_json([make_image("jdk11u-nightly"), make_image("jdk11u-ubuntu-nightly"), make_image("jdk11u-clefos-nightly")])
+
+    filtered, removed = scanner.filter_timedelta(image_list, delta_hours=2)
+
+    assert [image["tag"] for image in filtered] == ["jdk11u-ubuntu-nightly"]
+    assert [image["tag"] for image in removed] == ["jdk11u-nightly", "jdk11u-clefos-nightly"]
+
+
+def test_post_push_targets(tmp_path):
+    push_commands = tmp_path / "push_commands.sh"
+    push_commands.write_text("docker push adoptopenjdk/openjdk11:x86_64-ubuntu-jdk-11.0.11_9\ndocker push adoptopenjdk/openjdk11:s390x-ubuntu-jdk-11.0.11_9\n")
+    manifest_commands = tmp_path / "manifest_commands.sh"
+    manifest_commands.write_text("manifest-tool manifest create adoptopenjdk/openjdk11:latest adoptopenjdk/openjdk11:x86_64-ubuntu-jdk-11.0.11_9\n"
+                                 "manifest-tool manifest annotate adoptopenjdk/openjdk11:latest adoptopenjdk/openjdk11:x86_64-ubuntu-jdk-11.0.11_9 --os linux --arch amd64\n")
+
+    targets = scanner.parse_push_commands(str(push_commands), {})
+    targets = scanner.parse_manifest_commands(str(manifest_commands), targets)
+
+    assert targets == {
+        "adoptopenjdk/openjdk11:x86_64-ubuntu-jdk-11.0.11_9": {"amd64"},
+        "adoptopenjdk/openjdk11:s390x-ubuntu-jdk-11.0.11_9": {"s390x"},
+        "adoptopenjdk/openjdk11:latest": {"amd64"}
+    }
+
+
+def test_post_push_without_commands_file(tmp_path):
+    args = {"command": "post-push", "push_commands": str(tmp_path / "push_commands.sh"), "manifest_commands": None, "images_file": None}
+
+    assert scanner.run(args) == 1
+
+
+def test_run_push_commands(tmp_path):
+    # The second manifest is not created so its push is not verified, the manifest tool path is quoted
+    (tmp_path / "manifest_commands.sh").write_text("#!/usr/bin/env bash\n\n"
+                                                   "\"true\" manifest create adoptopenjdk/openjdk11:latest adoptopenjdk/openjdk11:x86_64-ubuntu-jdk-11.0.11_9\n"
+                                                   "\"true\" manifest push adoptopenjdk/openjdk11:latest\n\n"
+                                                   "\"false\" manifest create adoptopenjdk/openjdk11:jdk11u adoptopenjdk/openjdk11:x86_64-ubuntu-jdk-11.0.11_9\n"
+                                                   "\"true\" manifest push adoptopenjdk/openjdk11:jdk11u\n")
+    script = "source {common}; run_push_commands manifest_commands.sh pushed_manifest_commands.sh".format(common=os.path.join(REPO_DIR, "common_functions.sh"))
+    process = subprocess.run(["bash", "-c", script], cwd=str(tmp_path), stdout=subprocess.PIPE, universal_newlines=True)
+
+    assert process.returncode == 1
+    assert "Not verifying adoptopenjdk/openjdk11:jdk11u" in process.stdout
+    assert scanner.parse_manifest_commands(str(tmp_path / "pushed_manifest_commands.sh"), {}) == {"adoptopenjdk/openjdk11:latest": set()}
+
+
+def test_verify_targets_gives_up_on_missing_images(dockerhub, monkeypatch):
+    clock = types.SimpleNamespace(now=0)
+    monkeypatch.setattr(scanner, "time", types.SimpleNamespace(monotonic=lambda: clock.now, sleep=lambda seconds: setattr(clock, "now", clock.now + seconds)))
+    targets = {"adoptopenjdk/openjdk11:jdk11u-clefos-nightly": {"amd64"}, "adoptopenjdk/openjdk11:never-pushed": {"amd64"}}
+
+    statuses = scanner.verify_targets(targets, deadline_minutes=30, not_found_grace_minutes=5, force_old_images=True)
+
+    assert [(status["image"], status["verdict"]) for status in statuses] == [("adoptopenjdk/openjdk11:jdk11u-clefos-nightly", "live"), ("adoptopenjdk/openjdk11:never-pushed", "missing")]
+    # Polled at 0, 5, 15, 35, 75, 155, 275 and 395 seconds instead of until the deadline
+    assert clock.now == 395
+    assert len([url for url in dockerhub if url.endswith("/never-pushed")]) == 8
+
+
+def test_shards_keep_manifests_together():
+    image_list = [make_image("jdk-11.0.11_9-{number}".format(number=number), arch) for number in range(50) for arch in ("x86_64", "s390x")]
+    shards = [scanner.filter_shard(image_list, shard_index, 4) for shard_index in range(4)]
+
+    assert all(shards)
+    assert sum(len(shard) for shard in shards) == len(image_list)
+    for shard_index, shard in enumerate(shards):
+        # Both archs of a tag are in the same shard
+        assert {image["tag"] for image in shard if image["arch"] == "x86_64"} == {image["tag"] for image in shard if image["arch"] == "s390x"}
+        assert all(scanner.get_shard(image, 4) == shard_index for image in shard)
+    # The shard does not depend on the process, shards of the same run on several machines do not overlap
+    assert scanner.get_shard(make_image("jdk-11.0.11_9"), 4) == 2
+    assert scanner.filter_shard(image_list, 0, 1) == image_list
+
+
+def make_results(shard, verify="all", tag="jdk-11.0.11_9"):
+    image_dict = dict(scanner.IMAGES_TEMPLATE, filtered_images=[make_image(tag)])
+    return {"verify": verify, "shard": shard, "images": image_dict}
+
+
+def test_merge_results():
+    verify, merged = scanner.merge_results([make_results("1/2", tag="b"), make_results("0/2", tag="a")])
+
+    assert verify == "all"
+    assert [image["tag"] for image in merged["filtered_images"]] == ["a", "b"]
+    assert merged["old_images"] == []
+    # The template is not shared with the merged results
+    assert scanner.IMAGES_TEMPLATE["filtered_images"] == []
+
+
+@pytest.mark.parametrize("results_list", [
+    [make_results("0/2", verify="all"), make_results("1/2", verify="timedelta")],
+    [make_results("0/2"), make_results("1/3")],
+    [make_results("0/2"), make_results("0/2")]
+])
+def test_merge_results_invalid(results_list):
+    with pytest.raises(ValueError):
+        scanner.merge_results(results_list)
+
+
+def test_merge_results_missing_shard(caplog):
+    verify, merged = scanner.merge_results([make_results("0/3"), make_results("2/3")])
+
+    assert len(merged["filtered_images"]) == 2
+    assert "shards 1 are missing" in caplog.text
+
+
+@pytest.fixture
+def report_images():
+    image_dict = copy.deepcopy(scanner.IMAGES_TEMPLATE)
+    passed = make_image("jdk-11.0.11_9")
+    passed["image_json"] = {"last_updated": "2021-04-22T03:05:28.000000Z"}
+    passed["digest"] = "sha256:a"
+    image_dict["filtered_images"].append(passed)
+    image_dict["os_and_arch"].append(make_image("jdk-11.0.11_9", "armv7l"))
+    image_dict["old_images"].append(make_image("jdk-11.0.11_9-openj9", jvm="openj9"))
+    return image_dict
+
+
+def test_ndjson_report(report_images, tmp_path):
+    report_file = tmp_path / "report.ndjson"
+    counts = scanner.write_report(report_images, str(report_file), "ndjson")
+
+    lines = [json.loads(line) for line in report_file.read_text().splitlines()]
+    assert lines[0] == {"type": "summary", "counts": counts}
+    assert counts["filtered_images"] == 1 and counts["old_images"] == 1 and counts["bad_requests"] == 0
+    assert [(line["bucket"], line["status"], line["image"]) for line in lines[1:]] == [
+        ("filtered_images", "passed", "adoptopenjdk/openjdk11:jdk-11.0.11_9"),
+        ("os_and_arch", "skipped", "adoptopenjdk/openjdk11:jdk-11.0.11_9"),
+        ("old_images", "failed", "adoptopenjdk/openjdk11-openj9:jdk-11.0.11_9-openj9")
+    ]
+    # The image JSON is reduced to its last_updated value
+    assert (lines[1]["digest"], lines[1]["last_updated"]) == ("sha256:a", "2021-04-22T03:05:28.000000Z")
+    assert "image_json" not in lines[1]
+
+
+def test_csv_report(report_images, tmp_path):
+    report_file = tmp_path / "report.csv"
+    scanner.write_report(report_images, str(report_file), "csv")
+
+    with open(str(report_file), newline="") as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert list(rows[0]) == scanner.REPORT_FIELDS
+    assert [(row["status"], row["arch"], row["last_updated"]) for row in rows] == [
+        ("passed", "x86_64", "2021-04-22T03:05:28.000000Z"),
+        ("skipped", "armv7l", ""),
+        ("failed", "x86_64", "")
+    ]
+
+
+def test_junit_report(report_images, tmp_path):
+    report_file = tmp_path / "report.xml"
+    scanner.write_report(report_images, str(report_file), "junit")
+
+    test_suites = ElementTree.parse(str(report_file)).getroot()
+    assert (test_suites.get("tests"), test_suites.get("failures"), test_suites.get("skipped")) == ("3", "1", "1")
+    suites = {suite.get("name"): suite for suite in test_suites}
+    assert list(suites) == list(scanner.IMAGES_TEMPLATE)
+    assert suites["old_images"].find("testcase/failure") is not None
+    assert suites["os_and_arch"].find("testcase/skipped") is not None
+    assert suites["filtered_images"].find("testcase").get("name") == "x86_64"
+    assert list(suites["filtered_images"].find("testcase")) == []
+
+
+def test_report_unsupported_format(report_images, tmp_path):
+    with pytest.raises(ValueError):
+        scanner.write_report(report_images, str(tmp_path / "report.txt"), "txt")
+
+
+@pytest.fixture
+def stdout_report(monkeypatch, tmp_path):
+    """
+    Run the scanner with the report on stdout and the existence checks faked
+    """
+    root_logger = logging.getLogger()
+    handlers = (list(root_logger.handlers), list(scanner.LOGGER.handlers))
+    monkeypatch.setattr(scanner, "is_image_exist", lambda docker_org, docker_repo, tag_name: True)
+
+    def run(report_format):
+        monkeypatch.setattr(sys, "argv", ["scanner.py", "--verify", "images", "--versions", "11", "--jvms", "hotspot", "--oss", "ubuntu", "--packages", "jdk",
+                                          "--archs", "x86_64", "s390x", "--builds", "full", "--log-path", str(tmp_path), "--report-file", "-", "--report-format", report_format])
+        args = scanner.get_args()
+        scanner.load_logging_config(args["debug"], args["log_path"], args["report_file"] == "-")
+        scanner.run(args)
+
+    yield run
+    for handler in root_logger.handlers + scanner.LOGGER.handlers:
+        handler.close()
+    root_logger.handlers, scanner.LOGGER.handlers = handlers
+
+
+@pytest.mark.parametrize("report_format", ["ndjson", "csv"])
+def test_stdout_report_has_no_logs(stdout_report, capsys, report_format):
+    stdout_report(report_format)
+
+    output = capsys.readouterr()
+    if report_format == "ndjson":
+        records = [json.loads(line) for line in output.out.splitlines()]
+        assert records[0]["type"] == "summary"
+        images = records[1:]
+    else:
+        images = list(csv.DictReader(io.StringIO(output.out)))
+    assert len(images) == 2 and {image["status"] for image in images} == {"passed"}
+    assert "Processing images......." in output.err
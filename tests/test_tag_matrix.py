@@ -0,0 +1,97 @@
+# ------------------------------------------------------------------------------
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+import build_metadata
+import tag_matrix
+
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+METADATA_FIXTURE = os.path.join(TESTS_DIR, "fixtures", "tag_matrix_metadata.json")
+# Tags build_tags in common_functions.sh expands for the metadata fixture and the checked-in configs.
+# Regenerate it with "PYTHONPATH=. python3 tests/test_tag_matrix.py" after changing tags.config or the vm configs
+GOLDEN_FIXTURE = os.path.join(TESTS_DIR, "fixtures", "tag_matrix_golden.json")
+VMS = ["hotspot", "openj9"]
+
+
+def generate_fixture_matrix():
+    """
+    Generate the tag matrix of the metadata fixture
+    :return: Dict - Matrix entries keyed by matrix_key
+    """
+    metadata = build_metadata.load_metadata(METADATA_FIXTURE)
+    tags_config = tag_matrix.parse_tags_config(os.path.join(REPO_DIR, tag_matrix.TAGS_CONFIG_FILE))
+    return tag_matrix.generate_matrix(metadata, VMS, tags_config, config_dir=os.path.join(REPO_DIR, "config"))
+
+
+def export_fixture_sums(sums_dir):
+    """
+    Write the ${vm}_shasums_latest.sh files of the metadata fixture for build_tags
+    :param sums_dir: String - Directory to write the files to
+    :return: None
+    """
+    metadata = build_metadata.load_metadata(METADATA_FIXTURE)
+    for vm in VMS:
+        build_metadata.export_bash(metadata, vm, os.path.join(sums_dir, "{vm}_shasums_latest.sh".format(vm=vm)), os.path.join(sums_dir, "{vm}_build_time_latest.sh".format(vm=vm)))
+
+
+def test_expand_tags():
+    raw_tags = "{{ JDK_releases_VER }}-{{ OS }}-{{ ARCH }} {{ JDK_releases_VER }}-{{ OS }} latest"
+
+    arch_tags, tag_aliases = tag_matrix.expand_tags(raw_tags, "jdk-11.0.11_9", "ubuntu", "jre", "releases", ["x86_64", "s390x", "windows-amd"], {"x86_64"})
+
+    # jre images get their own version tag, windows arches are tagged as x86_64 and unavailable arches are skipped
+    assert arch_tags == ["jre-11.0.11_9-ubuntu-x86_64", "jre-11.0.11_9-ubuntu-x86_64"]
+    assert tag_aliases == ["jre-11.0.11_9-ubuntu", "latest"]
+
+
+def test_matrix_matches_golden_fixture():
+    matrix = generate_fixture_matrix()
+    with open(GOLDEN_FIXTURE) as golden_file:
+        golden = json.load(golden_file)
+
+    assert sorted(matrix) == sorted(golden)
+    for key, entry in matrix.items():
+        assert entry["arch_tags"] == golden[key]["arch_tags"], key
+        # awk does not keep the order of the tag aliases
+        assert sorted(entry["tag_aliases"]) == golden[key]["tag_aliases"], key
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="build_tags needs bash")
+def test_matrix_matches_build_tags(tmp_path, monkeypatch):
+    matrix = generate_fixture_matrix()
+    export_fixture_sums(str(tmp_path))
+    # common_functions.sh reads the configs relative to the repo
+    monkeypatch.chdir(REPO_DIR)
+
+    assert tag_matrix.verify_matrix(matrix, VMS, str(tmp_path)) == []
+
+
+if __name__ == "__main__":
+    os.chdir(REPO_DIR)
+    with tempfile.TemporaryDirectory() as sums_dir:
+        export_fixture_sums(sums_dir)
+        results = tag_matrix.run_build_tags(generate_fixture_matrix(), VMS, sums_dir)
+    with open(GOLDEN_FIXTURE, "w") as golden_file:
+        json.dump({key: {"arch_tags": arch_tags, "tag_aliases": sorted(tag_aliases)} for key, (arch_tags, tag_aliases) in sorted(results.items())}, golden_file, indent=1)
+        golden_file.write("\n")
+    sys.stdout.write("Golden tags of {number} combinations written to {golden}\n".format(number=len(results), golden=GOLDEN_FIXTURE))
@@ -21,6 +21,16 @@ if [ ! -z "$1" ]; then
 	supported_versions="$1"
 fi
 
+# Trace where the time goes, summarized with pipeline_trace.py at the end
+export trace_file="${trace_file:-${PWD}/manifest_trace.json}"
+trace_init
+
+# The manifest commands of every iteration, the pushed manifests are verified once at the end
+pushed_manifest_commands_file="${PWD}/pushed_manifest_commands.sh"
+rm -f "${pushed_manifest_commands_file}"
+# Set when a push failed or the pushed manifests are not live, the script then exits with 1
+push_err=0
+
 for ver in ${supported_versions}
 do
 	for vm in ${all_jvms}
@@ -32,16 +42,19 @@ do
 			cleanup_manifest
 
 			# Remove any temporary files
-			rm -f hotspot_*_latest.sh openj9_*_latest.sh manifest_commands.sh
+			rm -f hotspot_*_latest.sh openj9_*_latest.sh build_metadata.json tag_matrix.json tag_matrix.sh manifest_commands.sh
 
+			trace_begin update_manifest_all version="${ver}" vm="${vm}" package="${package}"
 			echo "==============================================================================="
 			echo "                                                                               "
 			echo "                 Generating Manifest Entries for Version ${ver}                "
 			echo "                                                                               "
 			echo "==============================================================================="
+			trace_begin manifest_generate version="${ver}" vm="${vm}" package="${package}"
 			./generate_manifest_script.sh "${ver}" "${vm}" "${package}"
 
 			err=$?
+			trace_end status="${err}"
 			if [ ${err} != 0 ] || [ ! -f ./manifest_commands.sh ]; then
 				echo "#############################################"
 				echo
@@ -62,10 +75,18 @@ do
 			echo "                                                                               "
 			echo "==============================================================================="
 			cat manifest_commands.sh
-			./manifest_commands.sh
+
+			# Collect the pushed manifests, they are verified once everything is pushed
+			trace_begin manifest_push version="${ver}" vm="${vm}" package="${package}"
+			if [ -f ./manifest_commands.sh ] && ! run_push_commands manifest_commands.sh "${pushed_manifest_commands_file}"; then
+				push_err=1
+				trace_end status=failure
+			else
+				trace_end status=success
+			fi
 
 			# Remove any temporary files
-			rm -f hotspot_*_latest.sh openj9_*_latest.sh manifest_commands.sh
+			rm -f hotspot_*_latest.sh openj9_*_latest.sh build_metadata.json tag_matrix.json tag_matrix.sh manifest_commands.sh
 
 			# Now test the images from hub.docker.com
 			echo "==============================================================================="
@@ -75,11 +96,30 @@ do
 			echo "==============================================================================="
 			# We will test all image types
 			cp "${test_image_types_all_file}" "${test_image_types_file}"
+			trace_begin test version="${ver}" vm="${vm}" package="${package}"
 			./test_multiarch.sh "${ver}" "${vm}" "${package}"
+			trace_end
+			trace_end
 		done
 	done
 done
 
+# Confirm just the pushed manifests are live on hub.docker.com with all their architectures
+if [ -s "${pushed_manifest_commands_file}" ]; then
+	trace_begin verify_push
+	if ! python3 tests/scanner/scanner.py post-push --manifest-commands "${pushed_manifest_commands_file}" --deadline 10; then
+		echo "ERROR: Not all pushed manifests are live on hub.docker.com"
+		push_err=1
+	fi
+	trace_end
+fi
+rm -f "${pushed_manifest_commands_file}"
+
+# Print the critical path and the slowest stages of the run
+python3 ./pipeline_trace.py summary "${trace_file}"
+
 # Cleanup any old containers, images and manifest entries.
 cleanup_images
 cleanup_manifest
+
+exit ${push_err}